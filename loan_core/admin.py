@@ -1,10 +1,207 @@
-from django.contrib import admin
-from .models import LoanApplication
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ORDER_VAR, ChangeList
+from django.core.handlers.asgi import ASGIRequest
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from .decisions import bulk_decide
+from .exports import EXPORT_COLUMNS, FORMATS, aiter_blocks, export_filename, export_stream
+from .models import LoanApplication, LoanProduct
+
+
+class AmountRangeFilter(admin.SimpleListFilter):
+    title = 'amount'
+    parameter_name = 'amount_range'
+    RANGES = {
+        'lt500k': ('Under 500,000', None, 500000),
+        '500k-2m': ('500,000 – 2,000,000', 500000, 2000000),
+        '2m-5m': ('2,000,000 – 5,000,000', 2000000, 5000000),
+        'gte5m': ('5,000,000 and above', 5000000, None),
+    }
+
+    def lookups(self, request, model_admin):
+        return [(key, label) for key, (label, _, _) in self.RANGES.items()]
+
+    def queryset(self, request, queryset):
+        if self.value() not in self.RANGES:
+            return queryset
+        _, low, high = self.RANGES[self.value()]
+        if low is not None:
+            queryset = queryset.filter(amount__gte=low)
+        if high is not None:
+            queryset = queryset.filter(amount__lt=high)
+        return queryset
+
+
+class ApplicationAgeFilter(admin.SimpleListFilter):
+    title = 'age'
+    parameter_name = 'older_than'
+    DAYS = (7, 30, 90)
+
+    def lookups(self, request, model_admin):
+        return [(str(days), f'Older than {days} days') for days in self.DAYS]
+
+    def queryset(self, request, queryset):
+        if self.value() and self.value().isdigit():
+            return queryset.filter(created_at__lt=timezone.now() - timedelta(days=int(self.value())))
+        return queryset
+
+
+CURSOR_VAR = 'cursor'
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that trusts the PostgreSQL planner's row estimate, which comes
+    from the table statistics, instead of running COUNT(*) once the result
+    is large enough that an exact figure is both slow and beside the point.
+    """
+    is_estimate = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql':
+            sql, params = queryset.order_by().query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+                estimate = int(cursor.fetchone()[0][0]['Plan']['Plan Rows'])
+            if estimate >= getattr(settings, 'ADMIN_ESTIMATED_COUNT_THRESHOLD', 100000):
+                self.is_estimate = True
+                return estimate
+        return super().count
+
+
+class KeysetChangeList(ChangeList):
+    """
+    Pages through the default ``(-created_at, -id)`` ordering with a cursor
+    instead of OFFSET, so deep pages cost the same as the first one. Sorting
+    by another column falls back to ordinary numbered pages.
+    """
+
+    @staticmethod
+    def _after(cursor):
+        created_at, pk = cursor
+        return Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk)
+
+    @staticmethod
+    def _decode(cursor):
+        try:
+            created_at, pk = cursor.rsplit('_', 1)
+            return datetime.fromisoformat(created_at), int(pk)
+        except ValueError:
+            raise IncorrectLookupParameters
+
+    is_keyset = False
+
+    def get_results(self, request):
+        cursor = getattr(request, 'keyset_cursor', None)
+        if ORDER_VAR in self.params or self.show_all:
+            return super().get_results(request)
+
+        paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        page = self.queryset
+        if cursor:
+            page = page.filter(self._after(self._decode(cursor)))
+        result_list = page[:self.list_per_page]
+        rows = list(result_list)
+
+        self.next_cursor = None
+        if len(rows) == self.list_per_page:
+            last = (rows[-1].created_at, rows[-1].pk)
+            if self.queryset.filter(self._after(last)).exists():
+                self.next_cursor = f'{last[0].isoformat()}_{last[1]}'
+
+        self.result_count = paginator.count
+        self.count_is_estimate = paginator.is_estimate
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.full_result_count = None
+        self.result_list = result_list
+        self.can_show_all = False
+        self.multi_page = bool(cursor) or self.next_cursor is not None
+        self.paginator = paginator
+        self.is_keyset = True
+        self.keyset_cursor = cursor
+        self.first_page_url = self.get_query_string(remove=[CURSOR_VAR])
+        self.next_page_url = self.next_cursor and self.get_query_string({CURSOR_VAR: self.next_cursor})
+
 
 @admin.register(LoanApplication)
 class LoanApplicationAdmin(admin.ModelAdmin):
-    list_display = ('user', 'amount', 'monthly_income', 'status', 'created_at')
-    list_filter = ('status', 'created_at')
+    list_display = ('user', 'amount', 'monthly_income', 'risk_score', 'recommended_tier', 'status', 'created_at')
+    list_filter = ('status', 'recommended_tier', AmountRangeFilter, ApplicationAgeFilter, 'created_at')
+    readonly_fields = ('risk_score', 'recommended_tier')
     search_fields = ('user__username', 'user__email')
-    ordering = ('-created_at',)
+    ordering = ('-created_at', '-id')
     list_editable = ('status',)
+    list_select_related = ('user',)
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+    actions = ('approve_pending', 'reject_pending', 'export_csv', 'export_csv_gzip', 'export_jsonl')
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+    def changelist_view(self, request, extra_context=None):
+        # The cursor is not a field lookup, keep it away from the filters.
+        request.keyset_cursor = request.GET.get(CURSOR_VAR)
+        if request.keyset_cursor is not None:
+            request.GET = request.GET.copy()
+            del request.GET[CURSOR_VAR]
+        return super().changelist_view(request, extra_context)
+
+    def _bulk_decide(self, request, queryset, status):
+        result = bulk_decide(queryset, status)
+        self.message_user(
+            request,
+            f"{result.updated} pending application(s) {status} in {result.elapsed:.2f}s "
+            f"({result.chunks} chunk(s)).",
+            messages.SUCCESS,
+        )
+
+    @admin.action(description="Approve selected pending applications")
+    def approve_pending(self, request, queryset):
+        self._bulk_decide(request, queryset, 'approved')
+
+    @admin.action(description="Reject selected pending applications")
+    def reject_pending(self, request, queryset):
+        self._bulk_decide(request, queryset, 'rejected')
+
+    def _export(self, request, queryset, fmt, compress=False):
+        blocks = export_stream(queryset, list(EXPORT_COLUMNS), fmt, compress)
+        response = StreamingHttpResponse(
+            aiter_blocks(blocks) if isinstance(request, ASGIRequest) else blocks,
+            content_type='application/gzip' if compress else FORMATS[fmt],
+        )
+        response['Content-Disposition'] = f'attachment; filename="{export_filename(fmt, compress)}"'
+        return response
+
+    @admin.action(description="Export selected applications as CSV")
+    def export_csv(self, request, queryset):
+        return self._export(request, queryset, 'csv')
+
+    @admin.action(description="Export selected applications as gzipped CSV")
+    def export_csv_gzip(self, request, queryset):
+        return self._export(request, queryset, 'csv', compress=True)
+
+    @admin.action(description="Export selected applications as JSON lines")
+    def export_jsonl(self, request, queryset):
+        return self._export(request, queryset, 'jsonl')
+
+
+@admin.register(LoanProduct)
+class LoanProductAdmin(admin.ModelAdmin):
+    list_display = ('name', 'min_score', 'max_score', 'max_amount', 'interest_rate', 'term_months',
+                    'priority', 'is_active')
+    list_filter = ('is_active',)
+    prepopulated_fields = {'slug': ('name',)}
@@ -0,0 +1,182 @@
+"""
+Amortization schedules for fixed-rate annuity loans.
+
+``schedule_arrays`` computes full schedules for many (amount, rate, term)
+triples in one array computation using the closed-form balance after ``m``
+payments::
+
+    B(m) = P (1 + r)^m - A ((1 + r)^m - 1) / r,    A = P r / (1 - (1 + r)^-n)
+
+so no month depends on the previous one. Values are carried in float64 and
+rounded to kobo only for presentation; ``decimal_schedule`` is the slow,
+exact reference they are tested against.
+
+``get_schedules`` serves schedules from a per-process LRU keyed by
+(amount, rate, term) and computes all misses of a call together.
+"""
+from collections import OrderedDict
+from dataclasses import dataclass
+from decimal import ROUND_HALF_UP, Decimal, localcontext
+import threading
+
+import numpy as np
+from django.conf import settings
+
+CENT = Decimal('0.01')
+# Longest term, in months, a schedule or scenario may ask for.
+MAX_SCHEDULE_TERM = 360
+
+
+def _key(amount, annual_rate, term):
+    return Decimal(amount).quantize(CENT), Decimal(annual_rate).normalize(), int(term)
+
+
+def payment_arrays(amounts, annual_rates, terms):
+    """Monthly annuity payment for each loan; ``annual_rates`` in percent."""
+    principal = np.asarray(amounts, dtype=np.float64)
+    rate = np.asarray(annual_rates, dtype=np.float64) / 1200
+    terms = np.asarray(terms, dtype=np.int64)
+    growth = (1 + rate) ** terms
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(rate == 0, principal / terms, principal * rate * growth / (growth - 1))
+
+
+def schedule_arrays(amounts, annual_rates, terms):
+    """
+    Schedules for every loan at once.
+
+    Returns ``(payment, principal, interest, balance)``: ``payment`` has one
+    entry per loan, the others are ``(loans, max(terms))`` matrices whose
+    months past a loan's own term are zero.
+    """
+    amounts = np.asarray(amounts, dtype=np.float64)
+    rate = (np.asarray(annual_rates, dtype=np.float64) / 1200)[:, None]
+    terms = np.asarray(terms, dtype=np.int64)
+    payment = payment_arrays(amounts, annual_rates, terms)
+
+    months = np.arange(1, terms.max(initial=0) + 1)
+    growth = (1 + rate) ** months
+    pay, amount = payment[:, None], amounts[:, None]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        balance = np.where(rate == 0, amount - pay * months, amount * growth - pay * (growth - 1) / rate)
+    opening = np.hstack([amount, balance[:, :-1]])
+    interest = opening * rate
+    principal = pay - interest
+
+    live = months <= terms[:, None]
+    # The closed form leaves float dust where the balance should be exactly zero.
+    balance = np.where(live & (np.abs(balance) >= 0.005), balance, 0.0)
+    return payment, np.where(live, principal, 0.0), np.where(live, interest, 0.0), balance
+
+
+def decimal_schedule(amount, annual_rate, term):
+    """Reference schedule in exact Decimal arithmetic, rounded to kobo."""
+    with localcontext() as ctx:
+        ctx.prec = 40
+        amount, rate = Decimal(amount), Decimal(annual_rate) / 1200
+        payment = amount / term if rate == 0 else amount * rate / (1 - (1 + rate) ** -term)
+        balance = amount
+        rows = []
+        for month in range(1, term + 1):
+            interest = balance * rate
+            principal = payment - interest
+            balance -= principal
+            closing = max(balance, Decimal(0))
+            rows.append(tuple(v.quantize(CENT, ROUND_HALF_UP) for v in (principal, interest, closing)))
+        return payment.quantize(CENT, ROUND_HALF_UP), rows
+
+
+@dataclass(frozen=True)
+class Schedule:
+    amount: Decimal
+    annual_rate: Decimal
+    term: int
+    payment: float
+    principal: np.ndarray
+    interest: np.ndarray
+    balance: np.ndarray
+
+    @property
+    def total_interest(self):
+        return round(float(self.interest.sum()), 2)
+
+    def rows(self, start=0, stop=None):
+        """``{'month', 'payment', 'principal', 'interest', 'balance'}`` dicts for months ``start``..``stop``."""
+        stop = self.term if stop is None else min(stop, self.term)
+        return [
+            {'month': month + 1, 'payment': self.payment, 'principal': principal,
+             'interest': interest, 'balance': balance}
+            for month, principal, interest, balance in zip(
+                range(start, stop),
+                self.principal[start:stop].tolist(),
+                self.interest[start:stop].tolist(),
+                self.balance[start:stop].tolist(),
+            )
+        ]
+
+
+def _frozen(array):
+    array = np.round(array, 2)
+    array.flags.writeable = False
+    return array
+
+
+def compute_schedules(keys):
+    """Build ``Schedule`` objects for normalized (amount, rate, term) keys in one pass."""
+    amounts, rates, terms = zip(*keys)
+    payment, principal, interest, balance = schedule_arrays(amounts, rates, terms)
+    return [
+        Schedule(amount, rate, term, round(float(payment[i]), 2),
+                 _frozen(principal[i, :term]), _frozen(interest[i, :term]), _frozen(balance[i, :term]))
+        for i, (amount, rate, term) in enumerate(keys)
+    ]
+
+
+class ScheduleCache:
+    """Per-process LRU of schedules; misses of one call are computed together."""
+
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries or getattr(settings, 'AMORTIZATION_CACHE_SIZE', 4096)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.counters = {'hits': 0, 'misses': 0}
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, size=len(self._entries))
+
+    def get_many(self, keys):
+        keys = [_key(*key) for key in keys]
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    found[key] = self._entries[key]
+            self.counters['hits'] += len(found)
+        missing = list(dict.fromkeys(key for key in keys if key not in found))
+        if not missing:
+            return [found[key] for key in keys]
+        computed = dict(zip(missing, compute_schedules(missing)))
+        with self._lock:
+            self.counters['misses'] += len(computed)
+            self._entries.update(computed)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return [found.get(key) or computed[key] for key in keys]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+schedule_cache = ScheduleCache()
+
+
+def get_schedules(keys):
+    """Schedules for an iterable of ``(amount, annual_rate, term)``."""
+    return schedule_cache.get_many(keys)
+
+
+def get_schedule(amount, annual_rate, term):
+    return schedule_cache.get_many([(amount, annual_rate, term)])[0]
@@ -0,0 +1,77 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.db.models.functions import Lower
+
+
+def _user_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def invalidate_cached_user(user_id):
+    cache.delete(_user_key(user_id))
+
+
+class CachedUserMixin:
+    """
+    Serve ``get_user``, the lookup ``AuthenticationMiddleware`` makes on
+    every authenticated request, from the cache for ``USER_CACHE_TIMEOUT``
+    seconds (0 turns it off). Saving or deleting the user and logging out
+    drop the entry (see ``signals.py``); a password change therefore ends
+    other sessions on their next request, as without the cache.
+    """
+
+    def get_user(self, user_id):
+        timeout = getattr(settings, 'USER_CACHE_TIMEOUT', 0)
+        if not timeout:
+            return super().get_user(user_id)
+        user = cache.get(_user_key(user_id))
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                cache.set(_user_key(user_id), user, timeout)
+        return user
+
+    async def aget_user(self, user_id):
+        timeout = getattr(settings, 'USER_CACHE_TIMEOUT', 0)
+        if not timeout:
+            return await super().aget_user(user_id)
+        user = await cache.aget(_user_key(user_id))
+        if user is None:
+            user = await super().aget_user(user_id)
+            if user is not None:
+                await cache.aset(_user_key(user_id), user, timeout)
+        return user
+
+
+class EmailBackend(CachedUserMixin, ModelBackend):
+    """
+    Authenticate with ``email`` and ``password`` in a single query.
+
+    The lookup compares ``LOWER(email)`` and repeats the ``email <> ''``
+    predicate so it is served by the partial unique
+    ``auth_user_email_lower_uniq`` index. Calls without ``email`` are left to
+    the next backend.
+    """
+
+    def authenticate(self, request, email=None, password=None, **kwargs):
+        if not email or password is None:
+            return None
+        UserModel = get_user_model()
+        try:
+            user = (
+                UserModel._default_manager.alias(email_lower=Lower('email'))
+                .exclude(email='').get(email_lower=email.lower())
+            )
+        except UserModel.DoesNotExist:
+            # Hash anyway so a missing account takes as long as a wrong password.
+            UserModel().set_password(password)
+            return None
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
+
+
+class UsernameBackend(CachedUserMixin, ModelBackend):
+    """Django's username backend (the admin login) with the cached ``get_user``."""
@@ -0,0 +1,1286 @@
+"""
+Benchmarks for loan_core, run with ``python manage.py benchmark <name>``.
+
+Each benchmark is a function registered with ``@benchmark`` that takes the
+requested row counts and returns a list of result dicts, one per measured
+case.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass, field
+from decimal import Decimal
+from io import BytesIO
+import logging
+from types import SimpleNamespace
+import time
+import tracemalloc
+
+import numpy as np
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from .events import InProcessBroker
+from .scoring import EMPLOYMENT_SCORES, calculate_risk_score
+
+BENCHMARKS = {}
+
+
+def benchmark(name, default_rows=(1000,)):
+    def register(func):
+        func.default_rows = default_rows
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+
+def timed(func, *args, **kwargs):
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+def latency_summary(latencies, elapsed):
+    latencies = np.sort(np.asarray(latencies))
+    return {
+        'requests': len(latencies),
+        'req_per_sec': round(len(latencies) / elapsed),
+        'p50_ms': round(float(np.percentile(latencies, 50)) * 1000, 2),
+        'p99_ms': round(float(np.percentile(latencies, 99)) * 1000, 2),
+    }
+
+
+@contextmanager
+def test_database():
+    """Run the benchmark against a throwaway test database."""
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    # Point replicas that mirror the primary at the test database too, as
+    # the test runner does, so routed reads see the seeded rows.
+    mirrors = {alias: dict(connections[alias].settings_dict) for alias in connections
+               if connections[alias].settings_dict['TEST'].get('MIRROR') == DEFAULT_DB_ALIAS}
+    for alias in mirrors:
+        connections[alias].close()
+        connections[alias].creation.set_as_test_mirror(connection.settings_dict)
+    try:
+        yield
+    finally:
+        for alias, settings_dict in mirrors.items():
+            connections[alias].close()
+            connections[alias].settings_dict.update(settings_dict)
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def session_cookie(user):
+    client = Client()
+    client.force_login(user)
+    return f"{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}"
+
+
+@contextmanager
+def count_queries():
+    """A one-item list counting the SQL statements this thread runs on any database."""
+    counter = [0]
+
+    def count(execute, sql, params, many, context):
+        counter[0] += 1
+        return execute(sql, params, many, context)
+
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(count))
+        yield counter
+
+
+def run_wsgi(paths, cookie, concurrency):
+    """Serve ``paths`` through the WSGI handler from ``concurrency`` threads."""
+    handler = WSGIHandler()
+
+    def request(path):
+        environ = {
+            'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': '',
+            'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'HTTP_HOST': 'localhost',
+            'HTTP_COOKIE': cookie, 'wsgi.input': BytesIO(), 'wsgi.url_scheme': 'http',
+        }
+        started = time.perf_counter()
+        response = handler(environ, lambda status, headers: None)
+        b''.join(response)
+        response.close()
+        return time.perf_counter() - started
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        started = time.perf_counter()
+        latencies = list(pool.map(request, paths))
+    return latency_summary(latencies, time.perf_counter() - started)
+
+
+def run_asgi(paths, cookie, concurrency):
+    """Serve ``paths`` through the ASGI handler with ``concurrency`` in flight."""
+    handler = ASGIHandler()
+
+    async def request(path, limit):
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+            'method': 'GET', 'scheme': 'http', 'path': path, 'raw_path': path.encode(),
+            'query_string': b'', 'root_path': '', 'server': ('localhost', 80),
+            'headers': [(b'host', b'localhost'), (b'cookie', cookie.encode())],
+        }
+        sent = asyncio.Event()
+
+        async def receive():
+            if not sent.is_set():
+                sent.set()
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            await asyncio.Future()  # never disconnect
+
+        async def send(message):
+            pass
+
+        async with limit:
+            started = time.perf_counter()
+            await handler(scope, receive, send)
+            return time.perf_counter() - started
+
+    async def main():
+        limit = asyncio.Semaphore(concurrency)
+        started = time.perf_counter()
+        latencies = await asyncio.gather(*(request(path, limit) for path in paths))
+        return latency_summary(latencies, time.perf_counter() - started)
+
+    return asyncio.run(main())
+
+
+def synthetic_columns(rows, seed=0):
+    """Random application columns shaped like real data (cents for money)."""
+    rng = np.random.default_rng(seed)
+    employment_types = list(EMPLOYMENT_SCORES) + ['full-time', 'part-time']
+    return {
+        'employment_type': rng.choice(employment_types, size=rows),
+        'income_cents': rng.integers(0, 100_000_000, size=rows),
+        'amount_cents': rng.integers(1, 1_000_000_000, size=rows),
+        'existing_debt': rng.random(rows) < 0.3,
+    }
+
+
+@benchmark('scoring', default_rows=(100_000, 1_000_000))
+def scoring_benchmark(rows, sample=20_000):
+    """
+    Rows/sec of re-scoring ``rows`` stored applications the way
+    ``rescore_applications`` does: ``iter_scored_chunks`` streaming them out
+    of the database and ``store_scores`` writing the results back, in one
+    process and across the process pool. The per-row baseline loads model
+    instances, calls ``calculate_risk_score`` and runs one UPDATE per row,
+    timed on the first ``sample`` rows. ``score_arrays`` on the same values
+    already in memory shows what the database round trips cost.
+    """
+    import os
+
+    from django.db import transaction
+
+    from .models import LoanApplication
+    from .scoring import (
+        SCORING_FIELDS, iter_scored_chunks, recommendation_tier, score_rows, store_scores,
+    )
+
+    def rescore(queryset, workers):
+        total = 0
+        for pks, scores in iter_scored_chunks(queryset, workers=workers, parallel_threshold=0):
+            store_scores(queryset, pks, scores)
+            total += len(pks)
+        return total
+
+    def per_row(applications):
+        with transaction.atomic():
+            for application in applications:
+                score = calculate_risk_score(application)
+                LoanApplication.objects.filter(pk=application.pk).update(
+                    risk_score=score, recommended_tier=recommendation_tier(score),
+                )
+
+    workers = os.cpu_count() or 1
+    rng = np.random.default_rng(0)
+    results = []
+    with test_database():
+        seeded = 0
+        for n in sorted(rows):
+            seed_applications(n - seeded, prefix=f'score{seeded}-', rng=rng)
+            seeded = n
+            queryset = LoanApplication.objects.all()
+            cases = [('iter_scored_chunks + store_scores, 1 process', lambda: rescore(queryset, 1))]
+            if workers > 1:
+                cases.append((f'iter_scored_chunks + store_scores, {workers} processes',
+                              lambda: rescore(queryset, workers)))
+            for label, func in cases:
+                scored, elapsed = timed(func)
+                assert scored == n, (label, scored, n)
+                results.append({'rows': n, 'path': label, 'rows_per_sec': round(n / elapsed)})
+
+            in_memory = list(queryset.order_by('pk').values_list(*SCORING_FIELDS))
+            _, elapsed = timed(score_rows, in_memory)
+            results.append({'rows': n, 'path': 'score_rows (in memory)', 'rows_per_sec': round(n / elapsed)})
+            del in_memory
+
+            applications = list(queryset.order_by('pk')[:min(n, sample)])
+            _, elapsed = timed(per_row, applications)
+            results.append({'rows': n, 'path': f'calculate_risk_score + UPDATE per row ({len(applications)} sampled)',
+                            'rows_per_sec': round(len(applications) / elapsed)})
+    return results
+
+
+async def _idle_streams(n, heartbeat):
+    from .views import event_stream
+
+    broker = InProcessBroker()
+    received = asyncio.Event()
+    remaining = n
+
+    async def client(user_id):
+        nonlocal remaining
+        async for frame in event_stream(broker.subscribe(user_id), heartbeat=heartbeat):
+            if frame.startswith('event:'):
+                remaining -= 1
+                if not remaining:
+                    received.set()
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    tasks = [asyncio.create_task(client(user_id)) for user_id in range(n)]
+    while broker.subscriber_count() < n:
+        await asyncio.sleep(0.01)
+    connect_time = time.perf_counter() - started
+    await asyncio.sleep(heartbeat * 2.5)  # let every stream send heartbeats while idle
+    per_stream = (tracemalloc.get_traced_memory()[0] - before) / n
+    tracemalloc.stop()
+
+    started = time.perf_counter()
+    for user_id in range(n):
+        broker.publish(user_id, {'type': 'status', 'status': 'approved'})
+    await received.wait()
+    fanout_time = time.perf_counter() - started
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return {
+        'streams': n,
+        'connect_sec': round(connect_time, 3),
+        'bytes_per_stream': round(per_stream),
+        'fanout_ms': round(fanout_time * 1000, 1),
+        'leaked_subscriptions': broker.subscriber_count(),
+    }
+
+
+@benchmark('sse', default_rows=(1000, 5000, 10000))
+def sse_benchmark(rows):
+    """Thousands of idle event streams on one event loop, then one event to each."""
+    return [asyncio.run(_idle_streams(n, heartbeat=0.5)) for n in rows]
+
+
+@benchmark('asgi', default_rows=(2000,))
+def asgi_benchmark(rows, concurrency=32):
+    """Sync WSGI serving vs async ASGI serving for the polling endpoints."""
+    from django.contrib.auth.models import User
+    from .models import LoanApplication
+
+    results = []
+    with test_database():
+        user = User.objects.create(username='bench@example.com', email='bench@example.com')
+        LoanApplication.objects.create(user=user, employment_type='employed', duration=12,
+                                       monthly_income=Decimal('250000'), amount=Decimal('500000'))
+        cookie = session_cookie(user)
+        for path in ('/realtime_data/', '/check-application-status/'):
+            for n in rows:
+                for server, run in (('wsgi', run_wsgi), ('asgi', run_asgi)):
+                    results.append({'path': path, 'server': server, 'concurrency': concurrency,
+                                    **run([path] * n, cookie, concurrency)})
+    return results
+
+
+@benchmark('idempotency', default_rows=(300,))
+def idempotency_benchmark(rows):
+    """Cost of the Idempotency-Key layer on first-time (non-retry) submits."""
+    from unittest import mock
+
+    from django.contrib.auth.models import User
+    from django.urls import reverse
+    from .idempotency import DatabaseIdempotencyStore, LocalIdempotencyStore
+    from .models import LoanApplication
+
+    data = {'employment_type': 'full-time', 'monthly_income': '250000', 'amount': '400000',
+            'duration': 12, 'total_savings': '0', 'existing_debt': 'False'}
+    results = []
+    with test_database():
+        for n in rows:
+            clients = []
+            for i in range(n):
+                client = Client()
+                client.force_login(User.objects.create(username=f'idem{n}-{i}@example.com'))
+                clients.append(client)
+
+            baseline = None
+            for mode, store in (('no-key', None), ('local', LocalIdempotencyStore()),
+                                ('database', DatabaseIdempotencyStore())):
+                LoanApplication.objects.all().delete()
+                latencies = []
+                with mock.patch('loan_core.idempotency.get_store', return_value=store):
+                    started = time.perf_counter()
+                    for i, client in enumerate(clients):
+                        headers = {'Idempotency-Key': f'{mode}-{i}'} if store is not None else {}
+                        t0 = time.perf_counter()
+                        client.post(reverse('submit_loan_api'), data, headers=headers)
+                        latencies.append(time.perf_counter() - t0)
+                    summary = latency_summary(latencies, time.perf_counter() - started)
+                mean_ms = float(np.mean(latencies)) * 1000
+                baseline = baseline or mean_ms
+                results.append({'mode': mode, **summary, 'mean_ms': round(mean_ms, 3),
+                                 'overhead_pct': round((mean_ms / baseline - 1) * 100, 1),
+                                 **(store.stats() if store is not None else {})})
+    return results
+
+
+def seed_users(n, prefix='user', batch_size=10000):
+    """Bulk-insert ``n`` users named ``{prefix}{i}@example.com`` with unusable passwords."""
+    from django.contrib.auth.models import User
+
+    for start in range(0, n, batch_size):
+        User.objects.bulk_create(
+            User(username=f'{prefix}{i}@example.com', email=f'{prefix}{i}@example.com', password='!')
+            for i in range(start, min(n, start + batch_size))
+        )
+
+
+def seed_applications(n, prefix='loan', batch_size=10_000, rng=None):
+    """
+    Bulk-insert ``n`` applications for ``n // 10`` new users named like
+    ``seed_users``, created over the last two years and approved when the
+    monthly income exceeds a fifth of the amount.
+    """
+    from datetime import timedelta
+    import itertools
+
+    from django.contrib.auth.models import User
+    from django.utils import timezone
+
+    from .models import LoanApplication
+
+    rng = rng or np.random.default_rng(0)
+    employment = [choice for choice, _ in LoanApplication.EMPLOYMENT_CHOICES]
+    now = timezone.now()
+    seed_users(max(1, n // 10), prefix=prefix, batch_size=batch_size)
+    user_ids = itertools.cycle(User.objects.filter(username__startswith=prefix).values_list('pk', flat=True))
+    for start in range(0, n, batch_size):
+        size = min(batch_size, n - start)
+        LoanApplication.objects.bulk_create(
+            LoanApplication(
+                user_id=next(user_ids), employment_type=employment[kind], duration=24,
+                monthly_income=Decimal(int(income)), amount=Decimal(int(amount)),
+                status='approved' if income > amount / 5 else 'rejected',
+                created_at=now - timedelta(days=int(days)),
+            )
+            for kind, income, amount, days in zip(
+                rng.integers(0, len(employment), size=size), rng.integers(20_000, 2_000_000, size=size),
+                rng.integers(50_000, 5_000_000, size=size), rng.integers(0, 730, size=size))
+        )
+
+
+@benchmark('login', default_rows=(100_000, 1_000_000))
+def login_benchmark(rows, repeats=200):
+    """
+    User lookup cost of a login: the old ``get(email=)`` + ``authenticate(username=)``
+    pair against the single-query email backend. A fast hasher keeps PBKDF2
+    out of the numbers.
+    """
+    from django.contrib.auth import authenticate
+    from django.contrib.auth.models import User
+    from django.test.utils import CaptureQueriesContext, override_settings
+
+    results = []
+    with test_database(), override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher']):
+        seeded = 0
+        for n in sorted(rows):
+            seed_users(n - seeded, prefix=f'seed{seeded}-')
+            seeded = n
+            with connection.cursor() as cursor:
+                if connection.vendor == 'postgresql':
+                    cursor.execute('ANALYZE auth_user')
+            user = User.objects.create_user('target@example.com', 'target@example.com', 'pw')
+
+            def old_path():
+                found = User.objects.get(email='target@example.com')
+                return authenticate(None, username=found.username, password='pw')
+
+            def new_path():
+                return authenticate(None, email='Target@Example.com', password='pw')
+
+            for name, login in (('get+authenticate', old_path), ('email-backend', new_path)):
+                with CaptureQueriesContext(connection) as queries:
+                    assert login() == user
+                latencies = []
+                for _ in range(repeats):
+                    started = time.perf_counter()
+                    login()
+                    latencies.append(time.perf_counter() - started)
+                results.append({'users': n, 'path': name, 'queries': len(queries),
+                                **latency_summary(latencies, sum(latencies))})
+            user.delete()
+    return results
+
+
+@benchmark('login_throttle', default_rows=(100,))
+def login_throttle_benchmark(rows):
+    """
+    Worker CPU spent serving a credential-stuffing burst of ``rows`` login
+    POSTs from one address, with and without the credential throttle.
+    """
+    from django.core.cache import cache
+    from django.test.utils import override_settings
+
+    from .throttling import get_throttle
+
+    # Every refusal would otherwise log a "Too Many Requests" warning.
+    request_logger = logging.getLogger('django.request')
+    level, request_logger.level = request_logger.level, logging.ERROR
+    results = []
+    with test_database():
+        for n in rows:
+            for enabled in (False, True):
+                cache.clear()
+                get_throttle.cache_clear()
+                client = Client()
+                with override_settings(LOGIN_THROTTLE_ENABLED=enabled):
+                    cpu_started, started = time.process_time(), time.perf_counter()
+                    for i in range(n):
+                        client.post('/login/', {'email': f'victim{i}@example.com', 'password': 'hunter2'},
+                                    REMOTE_ADDR='203.0.113.7')
+                    cpu, elapsed = time.process_time() - cpu_started, time.perf_counter() - started
+                results.append({
+                    'attempts': n, 'throttle': 'on' if enabled else 'off',
+                    **get_throttle().stats(),
+                    'cpu_s': round(cpu, 2), 'cpu_ms_per_attempt': round(cpu / n * 1000, 2),
+                    'wall_s': round(elapsed, 2),
+                })
+    request_logger.setLevel(level)
+    return results
+
+
+@benchmark('db_pool', default_rows=(2000,))
+def db_pool_benchmark(rows, concurrency=8):
+    """
+    Per-request latency of ``/check-application-status/`` (session lookup plus
+    one query) with a new PostgreSQL connection per request versus a
+    connection pool. ``rows`` is the number of requests per mode.
+    """
+    from django.contrib.auth.models import User
+    from django.core.management.base import CommandError
+    from django.db import connections
+
+    from .dbpool import pool_stats
+
+    if connection.vendor != 'postgresql':
+        raise CommandError("The db_pool benchmark needs the PostgreSQL backend.")
+    results = []
+    with test_database():
+        cookie = session_cookie(User.objects.create(username='pool@example.com', email='pool@example.com'))
+        # Worker threads build their connections from this same dict.
+        options = connections.settings['default']['OPTIONS']
+        for n in rows:
+            for pooled in (False, True):
+                connection.close()
+                if pooled:
+                    options['pool'] = {'min_size': concurrency, 'max_size': concurrency}
+                results.append({
+                    'requests': n, 'pool': 'on' if pooled else 'off', 'concurrency': concurrency,
+                    **run_wsgi(['/check-application-status/'] * n, cookie, concurrency),
+                    **({'connections_opened': pool_stats()['connections_opened']} if pooled else {}),
+                })
+                if pooled:
+                    connection.close_pool()
+                    del options['pool']
+    return results
+
+
+def _legacy_cards(products):
+    """What ``view_recommendations`` built per request before the product index."""
+    cards = []
+    for i, product in enumerate(products):
+        level, badge, rating = ("Best Match", "badge-best", "best")
+        if i == 1:
+            level, badge, rating = ("Good Option", "badge-good", "good")
+        elif i > 1:
+            level, badge, rating = ("Basic Option", "badge-basic", "basic")
+        cards.append({
+            'productId': f"loan-{i+1}", 'productName': product.name, 'loanAmount': product.max_amount,
+            'interestRate': product.interest_rate, 'termMonths': product.term_months,
+            'monthlyPayment': product.max_amount * (1 + product.interest_rate / 100) / product.term_months,
+            'processingFeePercentage': 1.5,
+            'recommendationLevel': level, 'badgeClass': badge, 'ratingClass': rating, 'isBestRate': i == 0,
+            'features': ["Quick approval process", "No collateral required",
+                         "Flexible repayment options", "No hidden charges"],
+            'eligibilityRequirements': ["Nigerian citizen or resident", "Aged 18 years and above",
+                                        "Steady source of income", "Valid government ID"],
+        })
+    return cards
+
+
+def _allocated(func, repeats):
+    """Blocks and bytes allocated per call, keeping every result alive."""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        kept = [func() for _ in range(repeats)]
+        stats = tracemalloc.take_snapshot().compare_to(before, 'filename')
+    finally:
+        tracemalloc.stop()
+    del kept
+    return (sum(stat.count_diff for stat in stats) / repeats, sum(stat.size_diff for stat in stats) / repeats)
+
+
+@benchmark('products', default_rows=(5, 100, 1000))
+def products_benchmark(rows, lookups=100_000):
+    """
+    Score -> ranked products lookup cost for catalogs of ``rows`` products:
+    the bisect index against a linear scan of the same products, plus the
+    memory allocated per request building recommendation cards.
+    """
+    from .products import Product, ProductIndex
+
+    rng = np.random.default_rng(0)
+    scores = rng.integers(1, 101, size=lookups).tolist()
+    results = []
+    for n in rows:
+        low = rng.integers(1, 101, size=n)
+        products = [
+            Product(slug=f'p{i}', name=f'Product {i}', min_score=int(lo), max_score=int(rng.integers(lo, 101)),
+                    max_amount=Decimal(int(rng.integers(1, 500)) * 10000), interest_rate=Decimal(int(rng.integers(3, 30))),
+                    term_months=int(rng.integers(3, 60)), processing_fee_percentage=Decimal('1.5'),
+                    features=(), eligibility_requirements=(), priority=0)
+            for i, lo in enumerate(low)
+        ]
+        (index, build_time) = timed(ProductIndex, products)
+        ranked = sorted(products, key=lambda p: p.rank_key)
+
+        _, index_time = timed(lambda: [index.cards(score) for score in scores])
+        _, scan_time = timed(lambda: [
+            _legacy_cards([p for p in ranked if p.min_score <= score <= p.max_score][:index.limit])
+            for score in scores
+        ])
+        new_blocks, new_bytes = _allocated(lambda: index.cards(85), 1000)
+        old_blocks, old_bytes = _allocated(
+            lambda: _legacy_cards([p for p in ranked if p.min_score <= 85 <= p.max_score][:index.limit]), 1000)
+        results.append({
+            'products': n,
+            'build_ms': round(build_time * 1000, 2),
+            'index_us_per_lookup': round(index_time / lookups * 1e6, 3),
+            'scan_us_per_lookup': round(scan_time / lookups * 1e6, 3),
+            'index_blocks_per_request': round(new_blocks, 1),
+            'index_bytes_per_request': round(new_bytes),
+            'scan_blocks_per_request': round(old_blocks, 1),
+            'scan_bytes_per_request': round(old_bytes),
+        })
+    return results
+
+
+@benchmark('amortization', default_rows=(10_000,))
+def amortization_benchmark(rows):
+    """
+    Generate ``rows`` full schedules (terms up to 360 months) with the array
+    engine, against the Decimal reference on a sample, plus a cached rerun.
+    """
+    from .amortization import ScheduleCache, _key, compute_schedules, decimal_schedule
+
+    rng = np.random.default_rng(0)
+    results = []
+    for n in rows:
+        keys = [
+            _key(Decimal(int(amount)).scaleb(-2), Decimal(int(rate)).scaleb(-2), int(term))
+            for amount, rate, term in zip(rng.integers(10_000_00, 100_000_000_00, size=n),
+                                          rng.integers(0, 4000, size=n), rng.integers(1, 361, size=n))
+        ]
+        schedules, vector_time = timed(compute_schedules, keys)
+        sample = keys[:min(n, 500)]
+        _, decimal_time = timed(lambda: [decimal_schedule(*key) for key in sample])
+        cache = ScheduleCache(max_entries=n)
+        cache.get_many(keys)
+        _, cached_time = timed(cache.get_many, keys)
+        results.append({
+            'schedules': n,
+            'months': sum(s.term for s in schedules),
+            'vectorized_ms': round(vector_time * 1000, 1),
+            'vectorized_us_per_schedule': round(vector_time / n * 1e6, 2),
+            'decimal_us_per_schedule': round(decimal_time / len(sample) * 1e6, 2),
+            'cached_us_per_schedule': round(cached_time / n * 1e6, 2),
+        })
+    return results
+
+
+@benchmark('what_if', default_rows=(50,))
+def what_if_benchmark(rows, repeats=50):
+    """
+    Latency of ``/what-if/`` for a ``rows`` x ``rows`` income x amount grid
+    (one duration), end to end and for the scoring alone, against scoring
+    the same cells one ``calculate_risk_score`` call at a time.
+    """
+    import json
+
+    from django.contrib.auth.models import User
+    from django.test.utils import override_settings
+
+    from .whatif import score_scenarios
+
+    results = []
+    with test_database():
+        client = Client()
+        client.force_login(User.objects.create(username='whatif@example.com', email='whatif@example.com'))
+        for n in rows:
+            data = {
+                'employment_type': 'full-time', 'existing_debt': False, 'duration': 24,
+                'monthly_income': {'min': 20000, 'max': 2000000, 'steps': n},
+                'amount': {'min': 50000, 'max': 5000000, 'steps': n},
+            }
+            body = json.dumps(data)
+            with override_settings(WHAT_IF_MAX_CELLS=max(n * n, 2500)):
+                latencies = []
+                for _ in range(repeats):
+                    started = time.perf_counter()
+                    response = client.post('/what-if/', body, content_type='application/json')
+                    latencies.append(time.perf_counter() - started)
+                    assert response.status_code == 200, response.content
+                _, compute_time = timed(score_scenarios, data)
+            grid = score_scenarios(data, max_cells=n * n)
+            apps = [
+                SimpleNamespace(employment_type='full-time', existing_debt=False,
+                                monthly_income=cell['monthly_income'], amount=cell['amount'])
+                for cell in grid['cells']
+            ]
+            _, scalar_time = timed(lambda: [calculate_risk_score(a) for a in apps])
+            results.append({
+                'grid': f'{n}x{n}',
+                'cells': len(grid['cells']),
+                **latency_summary(latencies, sum(latencies)),
+                'scoring_ms': round(compute_time * 1000, 2),
+                'per_cell_scoring_ms': round(scalar_time * 1000, 2),
+            })
+    return results
+
+
+@benchmark('export', default_rows=(100_000, 1_000_000))
+def export_benchmark(rows, batch_size=10_000):
+    """
+    Rows/sec and peak traced memory of streaming ``rows`` applications
+    through ``export_stream`` (CSV, gzipped CSV, JSONL), against building the
+    whole CSV in memory from a list of rows.
+    """
+    import csv
+    import io
+    import itertools
+
+    from django.contrib.auth.models import User
+
+    from .exports import EXPORT_COLUMNS, export_stream
+    from .models import LoanApplication
+
+    def peak(func):
+        tracemalloc.start()
+        try:
+            result, elapsed = timed(func)
+            return result, elapsed, tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    def stream(fmt, compress):
+        return sum(len(block) for block in export_stream(LoanApplication.objects.all(), list(EXPORT_COLUMNS),
+                                                         fmt, compress))
+
+    def naive():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_COLUMNS)
+        writer.writerows(list(LoanApplication.objects.values_list(*EXPORT_COLUMNS.values())))
+        return len(buffer.getvalue().encode())
+
+    rng = np.random.default_rng(0)
+    results = []
+    with test_database():
+        seeded = 0
+        for n in sorted(rows):
+            users = max(1, (n - seeded) // 10)
+            seed_users(users, prefix=f'export{seeded}-', batch_size=batch_size)
+            user_ids = itertools.cycle(
+                User.objects.filter(username__startswith=f'export{seeded}-').values_list('pk', flat=True)
+            )
+            for start in range(seeded, n, batch_size):
+                size = min(batch_size, n - start)
+                LoanApplication.objects.bulk_create(
+                    LoanApplication(
+                        user_id=next(user_ids), employment_type='full-time', employer_name='Acme',
+                        monthly_income=Decimal(int(income)), amount=Decimal(int(amount)), duration=24,
+                        status='approved' if income > amount / 5 else 'rejected', risk_score=50,
+                    )
+                    for income, amount in zip(rng.integers(20_000, 2_000_000, size=size),
+                                              rng.integers(50_000, 5_000_000, size=size))
+                )
+            seeded = n
+            cases = [('csv', lambda: stream('csv', False)), ('csv.gz', lambda: stream('csv', True)),
+                     ('jsonl', lambda: stream('jsonl', False)), ('csv (in memory)', naive)]
+            for label, func in cases:
+                size, elapsed, peak_bytes = peak(func)
+                results.append({
+                    'rows': n,
+                    'export': label,
+                    'rows_per_sec': round(n / elapsed),
+                    'megabytes': round(size / 2**20, 1),
+                    'peak_traced_mb': round(peak_bytes / 2**20, 1),
+                })
+    return results
+
+
+@benchmark('import', default_rows=(100_000,))
+def import_benchmark(rows, workers=4):
+    """
+    Rows/sec of ``import_applications`` for a ``rows``-line CSV (with 1% bad
+    rows), validating inline and in ``workers`` processes, against saving a
+    sample one ``LoanApplicationForm`` at a time.
+    """
+    import csv
+    import os
+    import tempfile
+
+    from django.contrib.auth.models import User
+
+    from .forms import LoanApplicationForm
+    from .imports import import_applications
+    from .models import LoanApplication
+
+    columns = ['user_email', 'employment_type', 'monthly_income', 'amount', 'duration', 'total_savings',
+               'existing_debt', 'status', 'created_at']
+    rng = np.random.default_rng(0)
+    results = []
+    with test_database(), tempfile.TemporaryDirectory() as tmp:
+        seed_users(max(rows) // 10 or 1, prefix='import')
+        for n in rows:
+            users = max(n // 10, 1)
+            path = os.path.join(tmp, f'{n}.csv')
+            with open(path, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(columns)
+                for i, (income, amount) in enumerate(zip(rng.integers(20_000, 2_000_000, size=n),
+                                                         rng.integers(50_000, 5_000_000, size=n))):
+                    writer.writerow([
+                        f'import{i % users}@example.com', 'full-time', 'n/a' if i % 100 == 99 else income,
+                        amount, 24, 0, i % 3 == 0, 'approved' if income > amount / 5 else 'rejected',
+                        '2024-01-15 09:30',
+                    ])
+            for label, count in (('inline', 1), (f'{workers} workers', workers)):
+                LoanApplication.objects.all().delete()
+                with open(os.devnull, 'w') as rejects:
+                    result = import_applications(path, workers=count, rejects=rejects)
+                results.append({
+                    'rows': n, 'validation': label, 'created': result.created, 'rejected': result.rejected,
+                    'seconds': round(result.elapsed, 2), 'rows_per_sec': round(result.rate),
+                })
+
+            sample = min(n, 1000)
+            user = User.objects.get(username='import0@example.com')
+            data = {'employment_type': 'full-time', 'monthly_income': '150000', 'amount': '500000',
+                    'duration': '24', 'total_savings': '0', 'existing_debt': 'False'}
+
+            def one_by_one():
+                for _ in range(sample):
+                    form = LoanApplicationForm(data)
+                    assert form.is_valid(), form.errors
+                    application = form.save(commit=False)
+                    application.user, application.status = user, 'approved'
+                    application.save()
+
+            _, elapsed = timed(one_by_one)
+            results.append({'rows': sample, 'validation': 'form + save() per row', 'created': sample,
+                            'rejected': 0, 'seconds': round(elapsed, 2), 'rows_per_sec': round(sample / elapsed)})
+    return results
+
+
+@benchmark('provision', default_rows=(64,))
+def provision_benchmark(rows):
+    """
+    Users/sec of ``provision_users`` for ``rows`` new accounts with the
+    configured password hasher, as the hashing pool grows from one process
+    to the CPU count, against ``UserRegistrationForm.save()`` per user.
+    """
+    import csv
+    import os
+    import tempfile
+
+    from django.contrib.auth.hashers import get_hasher
+
+    from .forms import UserRegistrationForm
+    from .provisioning import provision_users
+
+    cores = os.cpu_count() or 1
+    counts = sorted({1, 2, 4, 8, cores} & set(range(1, cores + 1)))
+    results = []
+    with test_database(), tempfile.TemporaryDirectory() as tmp:
+        for n in rows:
+            for workers in counts:
+                path = os.path.join(tmp, f'{n}-{workers}.csv')
+                with open(path, 'w', newline='') as f:
+                    writer = csv.writer(f)
+                    writer.writerow(['full_name', 'email', 'password'])
+                    writer.writerows([f'Partner User {i}', f'p{workers}-{i}@example.com', f'Passw0rd-{i}']
+                                     for i in range(n))
+                with open(os.devnull, 'w') as rejects:
+                    result = provision_users(path, workers=workers, rejects=rejects)
+                results.append({'users': n, 'method': f'provision_users, {workers} process(es)',
+                                'seconds': round(result.elapsed, 2), 'users_per_sec': round(result.rate, 1)})
+
+            sample = min(n, 16)
+
+            def one_by_one():
+                for i in range(sample):
+                    form = UserRegistrationForm({'full_name': f'Form User {i}', 'email': f'form{n}-{i}@example.com',
+                                                 'password1': 'Passw0rd-xyz', 'password2': 'Passw0rd-xyz'})
+                    assert form.is_valid(), form.errors
+                    form.save()
+
+            _, elapsed = timed(one_by_one)
+            results.append({'users': sample, 'method': 'UserRegistrationForm.save()',
+                            'seconds': round(elapsed, 2), 'users_per_sec': round(sample / elapsed, 1)})
+    for result in results:
+        result['hasher'] = get_hasher().algorithm
+    return results
+
+
+@benchmark('rollups', default_rows=(1_000_000,))
+def rollups_benchmark(rows, repeats=20, batch_size=10_000):
+    """
+    Latency of the portfolio summary read from the rollups against the same
+    summary aggregated live from ``rows`` applications spread over 24
+    months, plus the cost the rollup deltas add to a single save.
+    """
+    from django.contrib.auth.models import User
+    from django.db.models.signals import post_delete, post_save
+
+    from .models import LoanApplication
+    from .rollups import aggregate_groups, portfolio_summary, rebuild, summarize
+    from .signals import remove_from_portfolio_rollup, update_portfolio_rollup
+
+    def live_summary():
+        return summarize([(*group, *measures) for group, measures
+                          in sorted(aggregate_groups(LoanApplication.objects.all()).items())])
+
+    rng = np.random.default_rng(0)
+    results = []
+    with test_database():
+        seeded = 0
+        for n in sorted(rows):
+            seed_applications(n - seeded, prefix=f'rollup{seeded}-', batch_size=batch_size, rng=rng)
+            seeded = n
+            groups = rebuild()
+            assert portfolio_summary() == live_summary()
+
+            for label, func in (('rollups', portfolio_summary), ('live aggregate', live_summary)):
+                latencies = []
+                for _ in range(repeats):
+                    _, elapsed = timed(func)
+                    latencies.append(elapsed)
+                results.append({'applications': n, 'groups': groups, 'case': label,
+                                **latency_summary(latencies, sum(latencies))})
+
+            user = User.objects.create(username=f'rollup-save{n}@example.com')
+            for label, connected in (('save() with rollup deltas', True), ('save() without', False)):
+                if not connected:
+                    post_save.disconnect(update_portfolio_rollup, sender=LoanApplication)
+                    post_delete.disconnect(remove_from_portfolio_rollup, sender=LoanApplication)
+                try:
+                    latencies = []
+                    for _ in range(repeats):
+                        application = LoanApplication(user=user, employment_type='full-time', duration=12,
+                                                      monthly_income=Decimal(150000), amount=Decimal(500000))
+                        started = time.perf_counter()
+                        application.save()
+                        application.status = 'approved'
+                        application.save()
+                        latencies.append(time.perf_counter() - started)
+                finally:
+                    post_save.connect(update_portfolio_rollup, sender=LoanApplication)
+                    post_delete.connect(remove_from_portfolio_rollup, sender=LoanApplication)
+                results.append({'applications': n, 'groups': groups, 'case': label,
+                                **latency_summary(latencies, sum(latencies))})
+    return results
+
+
+@benchmark('instrumentation', default_rows=(300,))
+def instrumentation_benchmark(rows):
+    """
+    Per-view latency of home, view_recommendations, realtime_data and
+    submit_loan_api with the request metrics middleware on and off,
+    alternating the two so drift and cache refills affect both alike.
+    """
+    from django.contrib.auth.models import User
+    from django.test.utils import override_settings
+
+    from .instrumentation import render_metrics, request_metrics
+    from .models import LoanApplication
+
+    form = {'employment_type': 'full-time', 'monthly_income': '250000', 'amount': '400000',
+            'duration': 12, 'total_savings': '0', 'existing_debt': 'False'}
+    views = ('/home/', '/view_recommendations/', '/realtime_data/', '/submit-loan/')
+    results = []
+    with test_database():
+        user = User.objects.create(username='metrics@example.com', email='metrics@example.com')
+        LoanApplication.objects.create(user=user, employment_type='full-time', duration=12, status='approved',
+                                       monthly_income=Decimal('250000'), amount=Decimal('400000'))
+        clients = {}
+        for enabled in (True, False):
+            with override_settings(REQUEST_METRICS_ENABLED=enabled):
+                clients[enabled] = Client()
+                clients[enabled].force_login(user)
+                clients[enabled].get('/home/')  # loads the middleware chain under this setting
+        for n in rows:
+            request_metrics.reset()
+            latencies = {(path, enabled): [] for path in views for enabled in clients}
+            for i in range(n):
+                for path in views:
+                    # Alternate who goes first so cache refills hit both sides alike.
+                    for enabled, client in sorted(clients.items(), reverse=i % 2 == 1):
+                        started = time.perf_counter()
+                        response = client.post(path, form) if path == '/submit-loan/' else client.get(path)
+                        latencies[path, enabled].append(time.perf_counter() - started)
+                        assert response.status_code == 200, (path, response.status_code)
+                        # Keep the latest application approved for the next round.
+                        LoanApplication.objects.filter(user=user, status='pending').update(status='approved')
+            metrics = render_metrics()
+            for path in views:
+                on = latency_summary(latencies[path, True], sum(latencies[path, True]))
+                off = latency_summary(latencies[path, False], sum(latencies[path, False]))
+                results.append({
+                    'view': path, 'requests': n, 'p50_on_ms': on['p50_ms'], 'p50_off_ms': off['p50_ms'],
+                    'overhead_pct': round((on['p50_ms'] / off['p50_ms'] - 1) * 100, 1),
+                })
+            assert 'view="home"' in metrics
+    return results
+
+
+@benchmark('profiling', default_rows=(300,))
+def profiling_benchmark(rows):
+    """
+    Latency of home and apply_for_loan without the profiling middleware,
+    with it installed but not sampling, and with every request profiled.
+    """
+    import tempfile
+
+    from django.contrib.auth.models import User
+    from django.test.utils import override_settings
+
+    from .models import LoanApplication
+    from .profiling import ProfileStore
+
+    modes = {
+        'off': {'PROFILING_ENABLED': False},
+        'unsampled': {'PROFILING_SAMPLE_RATE': 0},
+        'sampled': {'PROFILING_SAMPLE_RATE': 1, 'PROFILING_MAX_FILES': 50},
+    }
+    views = ('/home/', '/apply_for_loan/')
+    results = []
+    with test_database(), tempfile.TemporaryDirectory() as directory:
+        user = User.objects.create(username='profiling@example.com', email='profiling@example.com')
+        LoanApplication.objects.create(user=user, employment_type='full-time', duration=12, status='approved',
+                                       monthly_income=Decimal('250000'), amount=Decimal('400000'))
+        clients = {}
+        for mode, overrides in modes.items():
+            with override_settings(PROFILING_DIR=directory, **overrides):
+                clients[mode] = Client()
+                clients[mode].force_login(user)
+                clients[mode].get('/home/')  # loads the middleware chain under these settings
+        for n in rows:
+            latencies = {(path, mode): [] for path in views for mode in clients}
+            for i in range(n):
+                for path in views:
+                    order = list(clients.items())
+                    for mode, client in order[i % len(order):] + order[:i % len(order)]:
+                        started = time.perf_counter()
+                        response = client.get(path)
+                        latencies[path, mode].append(time.perf_counter() - started)
+                        assert response.status_code == 200, (path, mode, response.status_code)
+            for path in views:
+                p50 = {mode: latency_summary(latencies[path, mode], sum(latencies[path, mode]))['p50_ms']
+                       for mode in clients}
+                results.append({
+                    'view': path, 'requests': n, **{f'p50_{mode}_ms': ms for mode, ms in p50.items()},
+                    'unsampled_overhead_pct': round((p50['unsampled'] / p50['off'] - 1) * 100, 1),
+                    'sampled_overhead_pct': round((p50['sampled'] / p50['off'] - 1) * 100, 1),
+                })
+            assert len(ProfileStore(directory, 50).profiles()) == 50
+    return results
+
+
+LOAN_FORM = {'employment_type': 'full-time', 'monthly_income': '250000', 'amount': '400000',
+             'duration': 12, 'total_savings': '0', 'existing_debt': 'False'}
+WHAT_IF = {'employment_type': 'full-time', 'existing_debt': False, 'monthly_income': [80000, 250000],
+           'amount': {'min': 100000, 'max': 2000000, 'steps': 5}, 'duration': [12, 24]}
+
+
+@dataclass(frozen=True)
+class Route:
+    """One request to a ``loan_core/urls.py`` route and the SQL queries it may run."""
+    name: str
+    budget: int
+    method: str = 'get'
+    kwargs: dict = field(default_factory=dict)
+    data: dict = None
+    content_type: str = None
+    login: str = 'applicant'  # 'applicant', 'staff' or None
+    writes: bool = False
+
+    def request(self, client):
+        url = reverse(self.name, kwargs=self.kwargs)
+        if self.method == 'post':
+            extra = {'content_type': self.content_type} if self.content_type else {}
+            return client.post(url, self.data, **extra)
+        return client.get(url, self.data)
+
+    def reset(self, users):
+        """Undo the request's writes so the next one sees the same state."""
+        if self.writes:
+            from .models import LoanApplication
+
+            LoanApplication.objects.filter(user=users['applicant'], status='pending').update(status='approved')
+
+
+# loan_events is left out: it streams until the client goes away.
+ROUTES = (
+    Route('login', 0, login=None),
+    Route('register', 0, login=None),
+    Route('home', 3),
+    Route('apply_for_loan', 3),
+    Route('view_recommendations', 3),
+    Route('submit_loan_api', 8, method='post', data=LOAN_FORM, writes=True),
+    Route('check_application_status', 3),
+    Route('realtime_data', 2),
+    Route('what_if_scores', 2, method='post', data=WHAT_IF, content_type='application/json'),
+    Route('product_schedule', 2, kwargs={'slug': 'personal'}),
+    Route('db_pool_status', 2, login='staff'),
+    Route('portfolio_analytics', 3, login='staff'),
+    Route('metrics', 2, login='staff'),
+)
+
+
+def route_users():
+    """The applicant, holding an approved application, and the staff user the routes run as."""
+    from django.contrib.auth.models import User
+
+    from .models import LoanApplication
+
+    applicant = User.objects.create(username='applicant@example.com', email='applicant@example.com',
+                                    first_name='Ada', last_name='Obi')
+    LoanApplication.objects.create(user=applicant, employment_type='full-time', duration=12, status='approved',
+                                   monthly_income=Decimal('250000'), amount=Decimal('400000'))
+    staff = User.objects.create(username='staff@example.com', email='staff@example.com', is_staff=True,
+                                is_superuser=True)
+    return {'applicant': applicant, 'staff': staff}
+
+
+def route_client(route, users):
+    client = Client()
+    if route.login:
+        client.force_login(users[route.login])
+    return client
+
+
+@benchmark('routes', default_rows=(10_000,))
+def routes_benchmark(rows, requests=100, concurrency=4):
+    """
+    Latency from one client and throughput from ``concurrency`` clients in
+    threads for every route in ``ROUTES``, with ``rows`` applications (for
+    a tenth as many users) seeded, and the SQL queries one request runs,
+    which must stay within the route's budget. Routes that write are only
+    measured from one client.
+    """
+    from .rollups import rebuild
+
+    results = []
+    with test_database():
+        users = route_users()
+        seeded = 0
+        for n in sorted(rows):
+            seed_applications(n - seeded, prefix=f'routes{seeded}-')
+            seeded = n
+            rebuild()
+            for route in ROUTES:
+                client = route_client(route, users)
+                route.request(client)  # warm caches and the connection
+                route.reset(users)
+                with count_queries() as queries:
+                    response = route.request(client)
+                route.reset(users)
+                assert response.status_code == 200, (route.name, response.status_code)
+                assert queries[0] <= route.budget, f"{route.name} ran {queries[0]} queries, budget {route.budget}"
+
+                latencies = []
+                for _ in range(requests):
+                    started = time.perf_counter()
+                    route.request(client)
+                    latencies.append(time.perf_counter() - started)
+                    route.reset(users)
+                result = {'route': route.name, 'applications': n, 'queries': queries[0],
+                          **latency_summary(latencies, sum(latencies))}
+                if not route.writes:
+                    result.update(_concurrent_route(route, users, requests, concurrency))
+                results.append(result)
+    return results
+
+
+def _concurrent_route(route, users, requests, concurrency):
+    clients = [route_client(route, users) for _ in range(concurrency)]
+
+    def run(client):
+        latencies = []
+        try:
+            for _ in range(max(1, requests // concurrency)):
+                started = time.perf_counter()
+                route.request(client)
+                latencies.append(time.perf_counter() - started)
+        finally:
+            connections.close_all()
+        return latencies
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        started = time.perf_counter()
+        latencies = [latency for batch in pool.map(run, clients) for latency in batch]
+    summary = latency_summary(latencies, time.perf_counter() - started)
+    return {'concurrency': concurrency, 'concurrent_req_per_sec': summary['req_per_sec'],
+            'concurrent_p50_ms': summary['p50_ms'], 'concurrent_p99_ms': summary['p99_ms']}
+
+
+@benchmark('hot_paths', default_rows=(10_000,))
+def hot_paths_benchmark(rows):
+    """
+    Per-call cost of ``calculate_risk_score`` on unsaved applications and
+    of the recommendation lookups the views make for a score
+    (``ProductIndex.cards`` and ``recommendation_tier``), over ``rows`` calls.
+    """
+    from .models import LoanApplication
+    from .products import get_product_index
+    from .scoring import recommendation_tier
+
+    results = []
+    with test_database():
+        index = get_product_index()
+        for n in rows:
+            columns = synthetic_columns(n)
+            applications = [
+                LoanApplication(employment_type=str(kind), monthly_income=Decimal(int(income)).scaleb(-2),
+                                amount=Decimal(int(amount)).scaleb(-2), existing_debt=bool(debt), duration=12)
+                for kind, income, amount, debt in zip(columns['employment_type'], columns['income_cents'],
+                                                      columns['amount_cents'], columns['existing_debt'])
+            ]
+            for application in applications[:100]:  # warm up
+                index.cards(recommendation_tier(calculate_risk_score(application)))
+            scores, elapsed = timed(lambda: [calculate_risk_score(a) for a in applications])
+            cases = [('calculate_risk_score', elapsed)]
+            for label, func in (('ProductIndex.cards', index.cards), ('recommendation_tier', recommendation_tier)):
+                _, elapsed = timed(lambda: [func(score) for score in scores])
+                cases.append((label, elapsed))
+            results += [{'case': label, 'calls': n, 'per_call_us': round(elapsed / n * 1e6, 3),
+                         'calls_per_sec': round(n / elapsed)} for label, elapsed in cases]
+    return results
+
+
+# Result fields compared by ``benchmark --compare``, by suffix; every other
+# str or int field identifies the measured case.
+LOWER_IS_BETTER = ('_ms', '_us', 'queries')
+HIGHER_IS_BETTER = ('_per_sec',)
+
+
+def _metric(name):
+    if name.endswith(HIGHER_IS_BETTER):
+        return 1
+    if name.endswith(LOWER_IS_BETTER):
+        return -1
+    return 0
+
+
+# The fields naming what a result measured: sizes, variants and settings.
+# Everything else is an outcome (timings, counts such as groups or
+# connections_opened) and never decides which baseline result it meets.
+CASE_FIELDS = (
+    'rows', 'users', 'applications', 'products', 'schedules', 'streams', 'attempts', 'requests', 'calls',
+    'grid', 'concurrency', 'path', 'server', 'mode', 'throttle', 'pool', 'export', 'validation', 'method',
+    'hasher', 'case', 'view', 'route',
+)
+
+
+def _case_key(result):
+    return tuple((name, result[name]) for name in CASE_FIELDS if name in result)
+
+
+def compare_results(baseline, current, threshold):
+    """
+    ``[(case, metric, before, after, change_pct)]`` for every metric of
+    ``current`` that is more than ``threshold`` percent worse than the
+    matching case of ``baseline``; query counts regress on any increase.
+    Cases missing from the baseline are not compared.
+    """
+    before = {_case_key(result): result for result in baseline}
+    regressions = []
+    for result in current:
+        old = before.get(_case_key(result))
+        if old is None:
+            continue
+        for name, value in result.items():
+            direction = _metric(name)
+            if not direction or not isinstance(old.get(name), (int, float)):
+                continue
+            previous = old[name]
+            change = (value - previous) / previous * 100 if previous else (100.0 if value != previous else 0.0)
+            limit = 0 if name == 'queries' else threshold
+            if -direction * change > limit:
+                regressions.append((dict(_case_key(result)), name, previous, value, round(change, 1)))
+    return regressions
+
+
+@benchmark('sessions', default_rows=(300,))
+def sessions_benchmark(rows):
+    """
+    SQL queries and latency of the authenticated polling routes with
+    database sessions, with cached_db sessions, and with cached_db sessions
+    plus the cached user.
+    """
+    from django.core.cache import cache
+    from django.test.utils import override_settings
+
+    modes = (
+        ('db sessions', {'SESSION_ENGINE': 'django.contrib.sessions.backends.db', 'USER_CACHE_TIMEOUT': 0}),
+        ('cached_db sessions', {'SESSION_ENGINE': 'django.contrib.sessions.backends.cached_db',
+                                'USER_CACHE_TIMEOUT': 0}),
+        ('cached_db + user cache', {'SESSION_ENGINE': 'django.contrib.sessions.backends.cached_db',
+                                    'USER_CACHE_TIMEOUT': 60}),
+    )
+    routes = [route for route in ROUTES
+              if route.name in ('home', 'check_application_status', 'realtime_data', 'view_recommendations')]
+    results = []
+    with test_database():
+        users = route_users()
+        for n in rows:
+            for label, overrides in modes:
+                cache.clear()
+                with override_settings(**overrides):
+                    for route in routes:
+                        client = route_client(route, users)
+                        route.request(client)  # loads the middleware chain under these settings
+                        with count_queries() as queries:
+                            route.request(client)
+                        latencies = []
+                        for _ in range(n):
+                            started = time.perf_counter()
+                            response = route.request(client)
+                            latencies.append(time.perf_counter() - started)
+                            assert response.status_code == 200, (route.name, label, response.status_code)
+                        results.append({'route': route.name, 'mode': label, 'queries': queries[0],
+                                        **latency_summary(latencies, sum(latencies))})
+    return results
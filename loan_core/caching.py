@@ -0,0 +1,77 @@
+"""
+Per-user cache of the serialized ``realtime_data`` payload.
+
+Each user's entry lives under a key that embeds a per-user version and a
+global generation. Changing a user's applications or profile bumps their
+version (see ``signals.py``); bulk updates that bypass model signals bump
+the generation instead. Old entries are never deleted, they simply stop
+being addressed and expire on their own.
+"""
+from hashlib import md5
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from .routers import primary_reads
+
+DASHBOARD_CACHE_TIMEOUT = getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 60)
+GENERATION_KEY = 'dashboard:generation'
+
+
+def _version_key(user_id):
+    return f'dashboard:version:{user_id}'
+
+
+def _bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Start from the clock rather than 1 so an evicted counter can never
+        # come back to a number whose payload is still cached.
+        cache.set(key, time.time_ns(), None)
+
+
+def invalidate_dashboard(user_id):
+    _bump(_version_key(user_id))
+
+
+def invalidate_all_dashboards():
+    _bump(GENERATION_KEY)
+
+
+async def _payload_key(user_id):
+    version_key = _version_key(user_id)
+    versions = await cache.aget_many([GENERATION_KEY, version_key])
+    for key in (GENERATION_KEY, version_key):
+        if key not in versions:
+            versions[key] = time.time_ns()
+            if not await cache.aadd(key, versions[key], None):
+                versions[key] = await cache.aget(key, versions[key])
+    return f'dashboard:payload:{user_id}:{versions[GENERATION_KEY]}:{versions[version_key]}'
+
+
+async def cached_dashboard_payload(user, build):
+    """
+    Return ``{'body', 'etag', 'last_modified'}`` for ``user``'s dashboard.
+
+    ``await build(user)`` is only called, and the database only touched,
+    when the current version of the payload is not cached yet.
+    """
+    key = await _payload_key(user.pk)
+    entry = await cache.aget(key)
+    if entry is None:
+        # The entry can outlive a replica's lag by far, so build it from
+        # the primary.
+        with primary_reads():
+            body = json.dumps(await build(user), cls=DjangoJSONEncoder).encode()
+        entry = {
+            'body': body,
+            'etag': f'"{md5(body).hexdigest()}"',
+            'last_modified': timezone.now().timestamp(),
+        }
+        await cache.aset(key, entry, DASHBOARD_CACHE_TIMEOUT)
+    return entry
@@ -0,0 +1,36 @@
+"""
+Statistics for the psycopg connection pools configured through
+``DATABASES[...]['OPTIONS']['pool']``.
+
+Pools are per worker process, so the numbers describe the worker that
+served the request. psycopg_pool keeps its request and wait counters
+cumulative until they are popped; ``pool_stats(reset=True)`` reads and
+resets them so successive scrapes see per-interval figures.
+"""
+from django.db import connections
+
+
+def pool_stats(alias='default', reset=False):
+    """Summarise the pool behind ``alias``; ``None`` when it is not pooled."""
+    pool = getattr(connections[alias], 'pool', None)
+    if pool is None:
+        return None
+    stats = pool.pop_stats() if reset else pool.get_stats()
+    queued = stats.get('requests_queued', 0)
+    wait_ms = stats.get('requests_wait_ms', 0)
+    return {
+        'min_size': stats.get('pool_min', 0),
+        'max_size': stats.get('pool_max', 0),
+        'size': stats.get('pool_size', 0),
+        'in_use': stats.get('pool_size', 0) - stats.get('pool_available', 0),
+        'available': stats.get('pool_available', 0),
+        'waiting': stats.get('requests_waiting', 0),
+        'requests': stats.get('requests_num', 0),
+        'queued': queued,
+        'wait_ms': wait_ms,
+        'avg_wait_ms': round(wait_ms / queued, 2) if queued else 0,
+        'timeouts': stats.get('requests_errors', 0),
+        'connections_opened': stats.get('connections_num', 0),
+        'connections_lost': stats.get('connections_lost', 0),
+        'bad_returns': stats.get('returns_bad', 0),
+    }
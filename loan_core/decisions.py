@@ -0,0 +1,195 @@
+"""
+Automatic decisions for pending loan applications.
+
+``process_batch`` claims a batch of ``DecisionTask`` rows with
+``SELECT ... FOR UPDATE SKIP LOCKED`` so any number of workers can drain
+the queue side by side, locks the claimed applications, scores them in one
+vectorized pass and applies the thresholds with one UPDATE per outcome.
+Applications scoring between the thresholds stay pending for a human.
+
+Dashboard invalidations and SSE events raised by a worker only reach web
+workers when they share the cache (REDIS_URL) and LOAN_EVENTS_BROKER is a
+cross-process broker; ``shared_backends_missing`` reports what is not.
+"""
+from dataclasses import dataclass, field
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.db.models import Count, Min
+from django.utils import timezone
+import numpy as np
+
+from .events import InProcessBroker, get_broker
+from .models import DecisionTask, LoanApplication
+from .scoring import SCORING_FIELDS, score_rows, score_tiers, store_scores
+from .signals import bulk_status_changed
+
+
+def decision_thresholds():
+    return (
+        getattr(settings, 'DECISION_AUTO_APPROVE_SCORE', 80),
+        getattr(settings, 'DECISION_AUTO_REJECT_SCORE', 35),
+    )
+
+
+def shared_backends_missing():
+    """Names of the settings a worker needs to reach web workers but lacks."""
+    missing = []
+    if isinstance(caches['default'], LocMemCache):
+        missing.append('REDIS_URL')
+    if isinstance(get_broker(), InProcessBroker):
+        missing.append('LOAN_EVENTS_BROKER')
+    return missing
+
+
+@dataclass
+class BatchResult:
+    claimed: int = 0
+    approved: int = 0
+    rejected: int = 0
+    held: int = 0
+    # Seconds between enqueue and decision for the oldest task in the batch.
+    lag: float = 0.0
+
+
+@dataclass
+class WorkerStats:
+    started: float = field(default_factory=time.monotonic)
+    batches: int = 0
+    processed: int = 0
+    approved: int = 0
+    rejected: int = 0
+    held: int = 0
+    max_lag: float = 0.0
+
+    def add(self, result):
+        self.batches += 1
+        self.processed += result.claimed
+        self.approved += result.approved
+        self.rejected += result.rejected
+        self.held += result.held
+        self.max_lag = max(self.max_lag, result.lag)
+
+    def throughput(self):
+        elapsed = time.monotonic() - self.started
+        return self.processed / elapsed if elapsed else 0.0
+
+
+def process_batch(batch_size=500, approve_at=None, reject_below=None):
+    """Claim, score and decide up to ``batch_size`` queued applications."""
+    default_approve, default_reject = decision_thresholds()
+    approve_at = default_approve if approve_at is None else approve_at
+    reject_below = default_reject if reject_below is None else reject_below
+    result = BatchResult()
+
+    with transaction.atomic():
+        tasks = list(
+            DecisionTask.objects.select_for_update(skip_locked=True)
+            .order_by('enqueued_at')
+            .values_list('pk', 'application_id', 'enqueued_at')[:batch_size]
+        )
+        if not tasks:
+            return result
+        task_ids, application_ids, enqueued = zip(*tasks)
+        result.claimed = len(tasks)
+        result.lag = (timezone.now() - min(enqueued)).total_seconds()
+
+        # An admin may have decided some of these already; only pending ones
+        # count. They are locked so nothing else can decide them before this
+        # transaction commits; rows another transaction holds are skipped and
+        # keep their task for a later batch.
+        rows = list(
+            LoanApplication.objects.select_for_update(skip_locked=True)
+            .filter(pk__in=application_ids, status='pending')
+            .values_list(*SCORING_FIELDS, 'user_id')
+        )
+        locked = [row[0] for row in rows]
+        busy = set(
+            LoanApplication.objects.filter(pk__in=application_ids, status='pending')
+            .exclude(pk__in=locked).values_list('pk', flat=True)
+        )
+        if busy:
+            task_ids = [pk for pk, application_id, _ in tasks if application_id not in busy]
+        pending = LoanApplication.objects.filter(pk__in=locked)
+        if rows:
+            user_ids = np.array([row[-1] for row in rows])
+            pks, scores = score_rows([row[:-1] for row in rows])
+            store_scores(pending, pks, scores)
+
+            tiers = score_tiers(scores)
+            decided = np.full(len(pks), '', dtype=object)
+            decided[scores >= approve_at] = 'approved'
+            decided[scores < reject_below] = 'rejected'
+            changes = []
+            for status in ('approved', 'rejected'):
+                mask = decided == status
+                if mask.any():
+                    setattr(result, status, pending.filter(pk__in=pks[mask].tolist()).update(status=status))
+                    changes.extend(
+                        {'user_id': int(u), 'application': int(pk), 'status': status,
+                         'riskScore': int(s), 'recommendedTier': str(t)}
+                        for u, pk, s, t in zip(user_ids[mask], pks[mask], scores[mask], tiers[mask])
+                    )
+            result.held = int((decided == '').sum())
+            bulk_status_changed(changes)
+
+        DecisionTask.objects.filter(pk__in=task_ids).delete()
+    return result
+
+
+def queue_stats():
+    """Current queue depth and the age in seconds of the oldest task."""
+    stats = DecisionTask.objects.aggregate(depth=Count('pk'), oldest=Min('enqueued_at'))
+    lag = (timezone.now() - stats['oldest']).total_seconds() if stats['oldest'] else 0.0
+    return {'depth': stats['depth'], 'lag': lag}
+
+
+@dataclass
+class BulkResult:
+    status: str
+    updated: int = 0
+    chunks: int = 0
+    elapsed: float = 0.0
+
+
+def bulk_decide(queryset, status, chunk_size=5000, progress=None):
+    """
+    Set ``status`` on every pending application in ``queryset``.
+
+    Works through the primary keys in chunks, each chunk one transaction
+    with a single UPDATE, so a large backlog never holds long locks. Queue
+    entries, dashboard caches and SSE events are handled per chunk as well.
+    ``progress(result)`` is called after every chunk.
+    """
+    result = BulkResult(status)
+    started = time.monotonic()
+    pending = queryset.filter(status='pending').order_by('pk')
+    last_pk = 0
+    while True:
+        ids = list(pending.filter(pk__gt=last_pk).values_list('pk', flat=True)[:chunk_size])
+        if not ids:
+            break
+        last_pk = ids[-1]
+        with transaction.atomic():
+            rows = list(
+                LoanApplication.objects.select_for_update()
+                .filter(pk__in=ids, status='pending')
+                .values_list('pk', 'user_id', 'risk_score', 'recommended_tier')
+            )
+            locked = [pk for pk, *_ in rows]
+            result.updated += LoanApplication.objects.filter(pk__in=locked).update(status=status)
+            DecisionTask.objects.filter(application_id__in=locked).delete()
+            bulk_status_changed(
+                {'user_id': user_id, 'application': pk, 'status': status,
+                 'riskScore': score, 'recommendedTier': tier}
+                for pk, user_id, score, tier in rows
+            )
+        result.chunks += 1
+        result.elapsed = time.monotonic() - started
+        if progress:
+            progress(result)
+    result.elapsed = time.monotonic() - started
+    return result
@@ -0,0 +1,93 @@
+"""
+Fan-out of loan events to the ``loan_events`` Server-Sent Events stream.
+
+Publishers call ``get_broker().publish(user_id, event)`` from any thread;
+each open stream holds a ``Subscription`` and awaits events for its user.
+The broker class is taken from ``settings.LOAN_EVENTS_BROKER`` so the
+in-process default can be replaced by a backend that reaches other worker
+processes.
+"""
+import asyncio
+from collections import defaultdict
+from functools import lru_cache
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+DEFAULT_BROKER = 'loan_core.events.InProcessBroker'
+SUBSCRIPTION_QUEUE_SIZE = 16
+
+
+class Subscription:
+    def __init__(self, broker, user_id, loop):
+        self.broker = broker
+        self.user_id = user_id
+        self.loop = loop
+        self.queue = asyncio.Queue(SUBSCRIPTION_QUEUE_SIZE)
+
+    def deliver(self, event):
+        # Runs on the subscriber's event loop. A stream that stopped reading
+        # loses its oldest events rather than holding up the publisher.
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout=None):
+        """Wait for the next event; raise ``TimeoutError`` after ``timeout`` seconds."""
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InProcessBroker:
+    """Delivers events to subscribers living in this process only."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def subscribe(self, user_id):
+        subscription = Subscription(self, user_id, asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+
+    def publish(self, user_id, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+            except RuntimeError:
+                # The subscriber's loop has shut down.
+                self.unsubscribe(subscription)
+        return len(subscribers)
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(s) for s in self._subscribers.values())
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    return import_string(getattr(settings, 'LOAN_EVENTS_BROKER', DEFAULT_BROKER))()
+
+
+def application_event(application):
+    return {
+        'type': 'status',
+        'application': application.pk,
+        'status': application.status,
+        'riskScore': application.risk_score,
+        'recommendedTier': application.recommended_tier,
+    }
@@ -4,6 +4,11 @@ from django.contrib.auth.models import User
 from django.contrib.auth.forms import UserCreationForm
 from .models import LoanApplication
 
+def split_full_name(full_name):
+    """``(first_name, last_name)``, split at the first space."""
+    first, *rest = full_name.split(' ',1)
+    return first, rest[0] if rest else ''
+
 class UserRegistrationForm(UserCreationForm):
     full_name = forms.CharField(max_length=100, required=True)
     email     = forms.EmailField(required=True)
@@ -15,10 +20,7 @@ class UserRegistrationForm(UserCreationForm):
     def save(self, commit=True):
         user = super().save(commit=False)
         # split full_name into first & last
-        full_name = self.cleaned_data['full_name']
-        first, *rest = full_name.split(' ',1)
-        user.first_name = first
-        user.last_name  = rest[0] if rest else ''
+        user.first_name, user.last_name = split_full_name(self.cleaned_data['full_name'])
         # use email as username
         user.username   = self.cleaned_data['email']
         user.email      = self.cleaned_data['email']
@@ -0,0 +1,229 @@
+"""
+``Idempotency-Key`` support for retried POSTs.
+
+The first request for a given (user, key) reserves the key before the view
+runs; a retry that arrives while it is still running gets 409, and one
+that arrives after it finished gets the stored response replayed without
+running the view again. A key reused with a different request body is
+refused with 422. Stored responses are never replaced. A reservation whose
+request died is taken over after ``IDEMPOTENCY_LOCK_TIMEOUT`` seconds.
+
+The store class comes from ``settings.IDEMPOTENCY_STORE``: the default keeps a
+bounded TTL/LRU map per process, ``DatabaseIdempotencyStore`` shares keys
+across workers through the ``IdempotencyKey`` table.
+"""
+from collections import OrderedDict
+from datetime import timedelta
+from functools import lru_cache, wraps
+import hashlib
+import logging
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .instrumentation import register_collector
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+
+class BaseIdempotencyStore:
+    def __init__(self, ttl=None, max_entries=None, lock_timeout=None):
+        self.ttl = ttl or getattr(settings, 'IDEMPOTENCY_TTL', 24 * 60 * 60)
+        self.max_entries = max_entries or getattr(settings, 'IDEMPOTENCY_MAX_ENTRIES', 10000)
+        self.lock_timeout = lock_timeout or getattr(settings, 'IDEMPOTENCY_LOCK_TIMEOUT', 60)
+        self._counter_lock = threading.Lock()
+        self.counters = {'hits': 0, 'misses': 0, 'stored': 0, 'in_flight': 0, 'mismatched': 0}
+
+    def count(self, name):
+        with self._counter_lock:
+            self.counters[name] += 1
+
+    def stats(self):
+        with self._counter_lock:
+            return dict(self.counters)
+
+    def reserve(self, user_id, key, fingerprint):
+        """
+        Claim ``key`` for a request whose body hashes to ``fingerprint``.
+        Returns ``None`` when the caller now owns the key, otherwise the
+        existing ``(fingerprint, response)``, where ``response`` is
+        ``(status, content_type, content)`` or ``None`` while the owner is
+        still running.
+        """
+        raise NotImplementedError
+
+    def complete(self, user_id, key, status, content_type, content):
+        """Store the owner's response; a finished entry is never replaced."""
+        raise NotImplementedError
+
+    def release(self, user_id, key):
+        """Drop an unfinished reservation so a retry runs the view again."""
+        raise NotImplementedError
+
+
+class LocalIdempotencyStore(BaseIdempotencyStore):
+    """Per-process store bounded by ``max_entries`` (LRU) and ``ttl``."""
+
+    def __init__(self, ttl=None, max_entries=None, lock_timeout=None):
+        super().__init__(ttl, max_entries, lock_timeout)
+        self._lock = threading.Lock()
+        # (user_id, key) -> [expires, fingerprint, response or None]
+        self._entries = OrderedDict()
+
+    def reserve(self, user_id, key, fingerprint):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get((user_id, key))
+            if entry is not None and entry[0] >= now:
+                self._entries.move_to_end((user_id, key))
+                return entry[1], entry[2]
+            self._entries[(user_id, key)] = [now + self.lock_timeout, fingerprint, None]
+            self._entries.move_to_end((user_id, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return None
+
+    def complete(self, user_id, key, status, content_type, content):
+        with self._lock:
+            entry = self._entries.get((user_id, key))
+            if entry is not None and entry[2] is None:
+                entry[0] = time.monotonic() + self.ttl
+                entry[2] = (status, content_type, content)
+
+    def release(self, user_id, key):
+        with self._lock:
+            entry = self._entries.get((user_id, key))
+            if entry is not None and entry[2] is None:
+                del self._entries[(user_id, key)]
+
+
+class DatabaseIdempotencyStore(BaseIdempotencyStore):
+    """
+    Store shared by every worker. A row without ``status_code`` is a
+    reservation; expired rows are purged now and then.
+    """
+
+    PURGE_PROBABILITY = 0.01
+
+    def reserve(self, user_id, key, fingerprint):
+        from .models import IdempotencyKey
+
+        for _ in range(3):
+            now = timezone.now()
+            try:
+                with transaction.atomic():
+                    IdempotencyKey.objects.create(user_id=user_id, key=key, fingerprint=fingerprint, created_at=now)
+                return None
+            except IntegrityError:
+                pass
+            row = IdempotencyKey.objects.filter(user_id=user_id, key=key).values_list(
+                'fingerprint', 'status_code', 'content_type', 'content', 'created_at').first()
+            if row is None:
+                continue  # purged meanwhile
+            stored, status, content_type, content, created_at = row
+            age = (now - created_at).total_seconds()
+            if age < (self.lock_timeout if status is None else self.ttl):
+                return stored, None if status is None else (status, content_type, bytes(content))
+            # An expired response or an abandoned reservation; take it over
+            # unless another request just did.
+            if IdempotencyKey.objects.filter(user_id=user_id, key=key, created_at=created_at).update(
+                fingerprint=fingerprint, status_code=None, content_type='', content=None, created_at=now,
+            ):
+                return None
+        raise IntegrityError(f"Could not reserve {HEADER} {key!r}.")
+
+    def complete(self, user_id, key, status, content_type, content):
+        from .models import IdempotencyKey
+
+        IdempotencyKey.objects.filter(user_id=user_id, key=key, status_code__isnull=True).update(
+            status_code=status, content_type=content_type, content=content, created_at=timezone.now(),
+        )
+        if random.random() < self.PURGE_PROBABILITY:
+            self.purge()
+
+    def release(self, user_id, key):
+        from .models import IdempotencyKey
+
+        IdempotencyKey.objects.filter(user_id=user_id, key=key, status_code__isnull=True).delete()
+
+    def purge(self):
+        from .models import IdempotencyKey
+
+        cutoff = timezone.now() - timedelta(seconds=self.ttl)
+        return IdempotencyKey.objects.filter(created_at__lt=cutoff).delete()[0]
+
+
+@lru_cache(maxsize=None)
+def get_store():
+    return import_string(getattr(settings, 'IDEMPOTENCY_STORE', 'loan_core.idempotency.LocalIdempotencyStore'))()
+
+
+def fingerprint(request):
+    return hashlib.sha256(b'%s %s\n%s' % (request.method.encode(), request.path.encode(), request.body)).hexdigest()
+
+
+def idempotent(view):
+    """
+    Replay the stored response when a request repeats an ``Idempotency-Key``.
+
+    Keys are scoped to the authenticated user. Server errors are not stored
+    so that the client's retry actually runs again.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return view(request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return HttpResponse(f"{HEADER} is longer than {MAX_KEY_LENGTH} characters.", status=400)
+
+        store, digest = get_store(), fingerprint(request)
+        existing = store.reserve(request.user.pk, key, digest)
+        if existing is not None:
+            stored_digest, stored = existing
+            # Rows stored before fingerprints were recorded have none.
+            if stored_digest and stored_digest != digest:
+                store.count('mismatched')
+                return HttpResponse(f"{HEADER} was already used for a different request.", status=422)
+            if stored is None:
+                store.count('in_flight')
+                response = HttpResponse(f"A request with this {HEADER} is still being processed.", status=409)
+                response['Retry-After'] = '1'
+                return response
+            store.count('hits')
+            logger.info("Replaying response for %s %s", HEADER, key)
+            status, content_type, content = stored
+            response = HttpResponse(content, status=status, content_type=content_type)
+            response['Idempotent-Replayed'] = 'true'
+            return response
+
+        store.count('misses')
+        try:
+            response = view(request, *args, **kwargs)
+        except BaseException:
+            store.release(request.user.pk, key)
+            raise
+        if response.status_code < 500:
+            store.complete(request.user.pk, key, response.status_code, response['Content-Type'], response.content)
+            store.count('stored')
+        else:
+            store.release(request.user.pk, key)
+        return response
+    return wrapper
+
+
+@register_collector
+def idempotency_metrics():
+    return [(
+        'loan_idempotency_requests_total', 'Idempotency-Key lookups of this process by outcome.',
+        'outcome', get_store().stats(),
+    )]
@@ -0,0 +1,309 @@
+"""
+Bulk import of historical loan applications from CSV or JSON lines.
+
+Records are streamed from the input file in chunks. Each chunk is validated
+field by field with the very form fields ``LoanApplicationForm`` uses (plus
+``status`` and ``created_at`` for historical rows), optionally in a process
+pool, then written from the main process: applicants are resolved by email
+in one query, one-pending-per-user conflicts are checked in one more, risk
+scores come from one ``score_arrays`` call, and the rows go in with
+``bulk_create`` inside a single transaction per chunk.
+
+Rows that fail are written to a reject file as JSON lines
+(``{"row", "errors", "record"}``) instead of stopping the import. After
+every committed chunk the number of records consumed is saved to a
+checkpoint file so an interrupted import can be resumed where it stopped.
+A crash between a chunk's commit and its checkpoint write would replay that
+chunk on resume.
+"""
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import csv
+from dataclasses import dataclass, field
+import gzip
+from itertools import islice
+import json
+import os
+import time
+
+from django import forms
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models.functions import Lower
+
+from .caching import invalidate_all_dashboards
+from .forms import LoanApplicationForm
+from .models import DecisionTask, LoanApplication
+from .rollups import record_created
+from .scoring import EMPLOYMENT_SCORES, score_arrays, score_tiers, to_cents
+
+DEFAULT_CHUNK_SIZE = 2000
+FORMATS = ('csv', 'jsonl')
+EMAIL_COLUMN = 'user_email'
+# Historical rows may carry their outcome and date; new rows default to pending/now.
+EXTRA_FIELDS = {
+    'status': forms.ChoiceField(choices=LoanApplication.STATUS_CHOICES, required=False),
+    'created_at': forms.DateTimeField(required=False),
+}
+# Columns of an ``export_applications`` file that are recomputed or assigned here.
+IGNORED_COLUMNS = {'id', 'risk_score', 'recommended_tier'}
+
+
+def import_fields():
+    return {EMAIL_COLUMN: forms.EmailField(), **LoanApplicationForm.base_fields, **EXTRA_FIELDS}
+
+
+def model_defaults():
+    """Values for columns a file leaves out, e.g. ``total_savings`` (the form pre-fills these)."""
+    return {f.name: f.get_default() for f in LoanApplication._meta.concrete_fields if f.has_default()}
+
+
+class ImportFileError(ValueError):
+    pass
+
+
+def check_columns(columns):
+    """Raise ``ImportFileError`` for a header missing the email or naming unknown columns."""
+    known = import_fields()
+    unknown = [c for c in columns if c not in known and c not in IGNORED_COLUMNS]
+    if unknown:
+        raise ImportFileError(f"Unknown column(s): {', '.join(unknown)}.")
+    if EMAIL_COLUMN not in columns:
+        raise ImportFileError(f"The input needs a {EMAIL_COLUMN} column.")
+
+
+def input_format(path, fmt=None):
+    if fmt:
+        return fmt
+    name = path[:-3] if path.endswith('.gz') else path
+    if name.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    if name.endswith('.csv'):
+        return 'csv'
+    raise ImportFileError(f"Cannot tell the format of {path}; pass it explicitly.")
+
+
+def read_records(path, fmt, check=check_columns):
+    """
+    Yield ``(row_number, record)`` for every record of a (possibly gzipped)
+    file, numbered from 1. ``check`` vets the column names.
+    """
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8', newline='') as f:
+        if fmt == 'csv':
+            reader = csv.DictReader(f)
+            check(reader.fieldnames or [])
+            yield from enumerate(reader, 1)
+            return
+        number = 0
+        for line in f:
+            if not line.strip():
+                continue
+            number += 1
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                record = {'__invalid__': line.rstrip('\n'), '__error__': str(e)}
+            else:
+                if not isinstance(record, dict):
+                    record = {'__invalid__': line.rstrip('\n'), '__error__': 'Not a JSON object.'}
+                elif number == 1:
+                    check(list(record))
+            yield number, record
+
+
+def validate_records(records):
+    """
+    Clean a chunk of ``(row_number, record)`` pairs with the form field rules.
+
+    Returns ``(valid, rejected)``: ``(row_number, cleaned_data)`` pairs and
+    ``(row_number, errors, record)`` triples. Runs without the database so
+    it can be handed to a worker process.
+    """
+    fields, defaults = import_fields(), model_defaults()
+    valid, rejected = [], []
+    for number, record in records:
+        if '__invalid__' in record:
+            rejected.append((number, {'__all__': [record['__error__']]}, record['__invalid__']))
+            continue
+        cleaned, errors = {}, {}
+        for name, form_field in fields.items():
+            try:
+                value = record.get(name)
+                cleaned[name] = form_field.clean(defaults.get(name) if value is None else value)
+            except ValidationError as e:
+                errors[name] = e.messages
+        if errors:
+            rejected.append((number, errors, record))
+        else:
+            cleaned['status'] = cleaned['status'] or 'pending'
+            valid.append((number, cleaned))
+    return valid, rejected
+
+
+def _validated_chunks(records, chunk_size, workers):
+    """Yield ``(chunk, (valid, rejected))`` in input order, validating up to two chunks per worker ahead."""
+    chunks = iter(lambda: list(islice(records, chunk_size)), [])
+    if workers <= 1:
+        for chunk in chunks:
+            yield chunk, validate_records(chunk)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append((chunk, pool.submit(validate_records, chunk)))
+            if len(pending) >= workers * 2:
+                chunk, future = pending.popleft()
+                yield chunk, future.result()
+        while pending:
+            chunk, future = pending.popleft()
+            yield chunk, future.result()
+
+
+def lookup_users(emails):
+    """Map lower-cased emails to user ids in one query (see ``backends.EmailBackend``)."""
+    return dict(
+        User.objects.alias(email_lower=Lower('email')).exclude(email='')
+        .filter(email_lower__in=set(emails)).values_list(Lower('email'), 'pk')
+    )
+
+
+def build_applications(valid):
+    """
+    Resolve applicants and score a validated chunk.
+
+    Returns ``(applications, rejected)``.
+    """
+    user_ids = lookup_users(cleaned[EMAIL_COLUMN].lower() for _, cleaned in valid)
+    rejected, accepted = [], []
+    for number, cleaned in valid:
+        user_id = user_ids.get(cleaned[EMAIL_COLUMN].lower())
+        if user_id is None:
+            rejected.append((number, {EMAIL_COLUMN: ['No user has this email address.']}, cleaned))
+        else:
+            accepted.append((number, user_id, cleaned))
+
+    pending_users = set(
+        LoanApplication.objects.filter(status='pending', user_id__in={u for _, u, c in accepted
+                                                                       if c['status'] == 'pending'})
+        .values_list('user_id', flat=True)
+    )
+    rows = []
+    for number, user_id, cleaned in accepted:
+        if cleaned['status'] == 'pending':
+            if user_id in pending_users:
+                rejected.append((number, {'status': ['This user already has a pending application.']}, cleaned))
+                continue
+            pending_users.add(user_id)
+        rows.append((user_id, cleaned))
+
+    if not rows:
+        return [], rejected
+    scores = score_arrays(
+        [EMPLOYMENT_SCORES.get(c['employment_type'], 0) for _, c in rows],
+        to_cents([c['monthly_income'] for _, c in rows]),
+        to_cents([c['amount'] for _, c in rows]),
+        [c['existing_debt'] for _, c in rows],
+    )
+    tiers = score_tiers(scores)
+    applications = []
+    for (user_id, cleaned), score, tier in zip(rows, scores.tolist(), tiers.tolist()):
+        fields = {name: value for name, value in cleaned.items() if name != EMAIL_COLUMN}
+        if fields['created_at'] is None:
+            del fields['created_at']
+        applications.append(LoanApplication(user_id=user_id, risk_score=score, recommended_tier=tier, **fields))
+    return applications, rejected
+
+
+def save_applications(applications):
+    """
+    Insert one chunk in a transaction, counting it in the portfolio rollups
+    and queueing pending rows for the decision worker.
+    """
+    with transaction.atomic():
+        created = LoanApplication.objects.bulk_create(applications)
+        record_created(created)
+        DecisionTask.objects.bulk_create(
+            DecisionTask(application=application, enqueued_at=application.created_at)
+            for application in created if application.status == 'pending'
+        )
+    return len(created)
+
+
+def read_checkpoint(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def write_checkpoint(path, state):
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+@dataclass
+class ImportResult:
+    read: int = 0
+    created: int = 0
+    rejected: int = 0
+    skipped: int = 0
+    chunks: int = 0
+    started: float = field(default_factory=time.monotonic)
+    elapsed: float = 0.0
+
+    @property
+    def rate(self):
+        return self.read / self.elapsed if self.elapsed else 0.0
+
+
+def import_applications(path, fmt=None, chunk_size=DEFAULT_CHUNK_SIZE, workers=1, rejects=None,
+                        checkpoint=None, resume=False, progress=None):
+    """
+    Import every record of ``path``; returns an ``ImportResult``.
+
+    ``rejects`` is a text file that receives one JSON line per rejected
+    row. With ``checkpoint`` set, progress is saved there after each chunk,
+    and ``resume=True`` skips the records a previous run already committed.
+    ``progress(result)`` is called after every chunk.
+    """
+    fmt = input_format(path, fmt)
+    source = os.path.abspath(path)
+    result = ImportResult()
+    state = read_checkpoint(checkpoint) if checkpoint and resume else None
+    if state:
+        if state['source'] != source:
+            raise ImportFileError(f"The checkpoint {checkpoint} belongs to {state['source']}.")
+        result.skipped = state['rows']
+    encoder = DjangoJSONEncoder()
+
+    records = islice(read_records(path, fmt), result.skipped, None)
+    try:
+        for chunk, (valid, rejected) in _validated_chunks(records, chunk_size, workers):
+            applications, unmatched = build_applications(valid)
+            created = save_applications(applications) if applications else 0
+            rejected = sorted(rejected + unmatched, key=lambda reject: reject[0])
+            if rejects is not None:
+                for number, errors, record in rejected:
+                    rejects.write(encoder.encode({'row': number, 'errors': errors, 'record': record}) + '\n')
+                rejects.flush()
+            result.read += len(chunk)
+            result.created += created
+            result.rejected += len(rejected)
+            result.chunks += 1
+            if checkpoint:
+                write_checkpoint(checkpoint, {'source': source, 'rows': chunk[-1][0]})
+            result.elapsed = time.monotonic() - result.started
+            if progress:
+                progress(result)
+    finally:
+        # bulk_create() skips the model signals that keep dashboards fresh.
+        if result.created:
+            transaction.on_commit(invalidate_all_dashboards)
+    result.elapsed = time.monotonic() - result.started
+    return result
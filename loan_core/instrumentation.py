@@ -0,0 +1,242 @@
+"""
+Per-request timings: wall time, SQL query count and time, template time.
+
+``request_metrics_middleware`` opens a ``RequestTimings`` in a context
+variable for each request. Every database connection gets an execute
+wrapper (installed when it connects) that adds to it, and templates loaded
+through ``TimedDjangoTemplates`` add their render time. Because
+``sync_to_async`` copies the context, queries an async view runs in the
+thread pool are counted too.
+
+Each response gets a ``Server-Timing`` header, and the numbers go into
+per-view histograms kept in process memory, which ``render_metrics()``
+prints in the Prometheus text format for ``/metrics/``. Every worker process
+counts its own requests.
+
+``REQUEST_METRICS_ENABLED = False`` removes the middleware (the wrappers
+then find no timings and step aside); ``SERVER_TIMING_HEADER = False``
+keeps the histograms but stops sending the header.
+"""
+from bisect import bisect_left
+from contextvars import ContextVar
+import threading
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+from django.utils.decorators import sync_and_async_middleware
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+# (name, help, buckets, RequestTimings attribute)
+HISTOGRAMS = (
+    ('loan_http_request_duration_seconds', 'Wall time spent serving the request.', DURATION_BUCKETS, 'total'),
+    ('loan_http_request_db_queries', 'SQL queries run for the request.', QUERY_BUCKETS, 'queries'),
+    ('loan_http_request_db_duration_seconds', 'Time spent in SQL queries.', DURATION_BUCKETS, 'db_time'),
+    ('loan_http_request_template_duration_seconds', 'Time spent rendering templates.', DURATION_BUCKETS,
+     'template_time'),
+)
+
+_timings = ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    __slots__ = ('started', 'total', 'queries', 'db_time', 'template_time')
+
+    def __init__(self):
+        self.started = perf_counter()
+        self.total = 0.0
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+
+    def server_timing(self):
+        return (f'total;dur={self.total * 1000:.1f}, '
+                f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries", '
+                f'tpl;dur={self.template_time * 1000:.1f}')
+
+
+def _timed_execute(execute, sql, params, many, context):
+    timings = _timings.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.db_time += perf_counter() - started
+        timings.queries += 1
+
+
+def install_wrapper(connection, **kwargs):
+    if _timed_execute not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_timed_execute)
+
+
+connection_created.connect(install_wrapper, dispatch_uid='loan_core.instrumentation')
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        timings = _timings.get()
+        if timings is None:
+            return super().render(context, request)
+        started = perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            timings.template_time += perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, timing each top-level render into the current request."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """``(le, count)`` pairs as Prometheus expects, ending with ``+Inf``."""
+        total, pairs = 0, []
+        for bound, count in zip((*self.buckets, '+Inf'), self.counts):
+            total += count
+            pairs.append((bound, total))
+        return pairs
+
+
+class RequestMetrics:
+    """Per-view histograms and response counts of this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+        self._responses = {}
+
+    def observe(self, view, status, timings):
+        with self._lock:
+            histograms = self._views.get(view)
+            if histograms is None:
+                histograms = self._views[view] = [Histogram(buckets) for _, _, buckets, _ in HISTOGRAMS]
+            for histogram, (_, _, _, attribute) in zip(histograms, HISTOGRAMS):
+                histogram.observe(getattr(timings, attribute))
+            key = (view, status)
+            self._responses[key] = self._responses.get(key, 0) + 1
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+            self._responses.clear()
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            views = {view: [(h.cumulative(), h.sum, h.count) for h in histograms]
+                     for view, histograms in self._views.items()}
+            responses = dict(self._responses)
+        lines = []
+        for i, (name, help_text, _, _) in enumerate(HISTOGRAMS):
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+            for view in sorted(views):
+                pairs, total, count = views[view][i]
+                label = f'view="{_escape(view)}"'
+                lines += [f'{name}_bucket{{{label},le="{bound}"}} {n}' for bound, n in pairs]
+                lines += [f'{name}_sum{{{label}}} {total:.6f}', f'{name}_count{{{label}}} {count}']
+        lines += ['# HELP loan_http_responses_total Responses by view and status code.',
+                  '# TYPE loan_http_responses_total counter']
+        lines += [f'loan_http_responses_total{{view="{_escape(view)}",status="{status}"}} {count}'
+                  for (view, status), count in sorted(responses.items())]
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+request_metrics = RequestMetrics()
+_collectors = []
+
+
+def register_collector(func):
+    """
+    Add counters from another module to ``render_metrics()``: ``func()``
+    returns ``[(name, help, label, {label value: count})]``.
+    """
+    _collectors.append(func)
+    return func
+
+
+def render_metrics():
+    lines = []
+    for collect in _collectors:
+        for name, help_text, label, counts in collect():
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+            lines += [f'{name}{{{label}="{_escape(str(value))}"}} {count}' for value, count in sorted(counts.items())]
+    return request_metrics.render() + ''.join(f'{line}\n' for line in lines)
+
+
+def _finish(request, response, timings, token):
+    _timings.reset(token)
+    timings.total = perf_counter() - timings.started
+    match = getattr(request, 'resolver_match', None)
+    request_metrics.observe(match.view_name if match else 'unmatched', response.status_code, timings)
+    if getattr(settings, 'SERVER_TIMING_HEADER', True):
+        response['Server-Timing'] = timings.server_timing()
+    return response
+
+
+@sync_and_async_middleware
+def request_metrics_middleware(get_response):
+    """Time every request; put it first in ``MIDDLEWARE`` so the whole stack is measured."""
+    if not getattr(settings, 'REQUEST_METRICS_ENABLED', True):
+        raise MiddlewareNotUsed
+    # Connections opened before this module was imported missed the signal.
+    for connection in connections.all(initialized_only=True):
+        install_wrapper(connection)
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            timings = RequestTimings()
+            token = _timings.set(timings)
+            try:
+                response = await get_response(request)
+            except BaseException:
+                _timings.reset(token)
+                raise
+            return _finish(request, response, timings, token)
+        markcoroutinefunction(middleware)
+    else:
+        def middleware(request):
+            timings = RequestTimings()
+            token = _timings.set(timings)
+            try:
+                response = get_response(request)
+            except BaseException:
+                _timings.reset(token)
+                raise
+            return _finish(request, response, timings, token)
+    return middleware
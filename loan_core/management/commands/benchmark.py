@@ -0,0 +1,77 @@
+from datetime import datetime, timezone
+import json
+import os
+import platform
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from loan_core.benchmarks import BENCHMARKS, compare_results
+
+
+class Command(BaseCommand):
+    help = ("Run loan_core benchmarks and print the results; optionally save them as JSON and fail on "
+            "regressions against a saved baseline.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', metavar='name', help=f"Any of: {', '.join(sorted(BENCHMARKS))}")
+        parser.add_argument('--rows', type=int, nargs='+',
+                            help="Row counts to measure (defaults depend on the benchmark).")
+        parser.add_argument('--json', metavar='PATH', help="Write the results to this JSON file.")
+        parser.add_argument('--compare', metavar='BASELINE',
+                            help="A JSON file from an earlier --json run to compare against.")
+        parser.add_argument('--threshold', type=float, default=10.0,
+                            help="Percent a timing may worsen before --compare fails (default 10).")
+
+    def handle(self, *args, **options):
+        names = options['names']
+        unknown = [name for name in names if name not in BENCHMARKS]
+        if not names or unknown:
+            raise CommandError(f"Unknown benchmark {', '.join(map(repr, unknown)) or 'name'}; "
+                               f"choose from {', '.join(sorted(BENCHMARKS))}")
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as f:
+                    baseline = json.load(f)['benchmarks']
+            except (OSError, ValueError, KeyError) as e:
+                raise CommandError(f"Cannot read baseline {options['compare']}: {e}")
+
+        report = {'environment': self.environment(), 'benchmarks': {}}
+        for name in names:
+            func = BENCHMARKS[name]
+            results = report['benchmarks'][name] = []
+            for result in func(options['rows'] or func.default_rows):
+                results.append(result)
+                self.stdout.write("  ".join(f"{key}={value}" for key, value in result.items()))
+        if options['json']:
+            with open(options['json'], 'w') as f:
+                json.dump(report, f, indent=2, default=str)
+                f.write('\n')
+
+        if baseline is None:
+            return
+        regressions = []
+        for name, results in report['benchmarks'].items():
+            if name not in baseline:
+                self.stdout.write(f"{name}: not in the baseline, skipped")
+                continue
+            for case, metric, before, after, change in compare_results(baseline[name], results,
+                                                                       options['threshold']):
+                label = ' '.join(f'{key}={value}' for key, value in case.items())
+                regressions.append(f"{name} {label}: {metric} {before} -> {after} ({change:+}%)")
+        for line in regressions:
+            self.stderr.write(line)
+        if regressions:
+            raise CommandError(f"{len(regressions)} regression(s) past {options['threshold']}%.")
+        self.stdout.write(self.style.SUCCESS("No regressions against the baseline."))
+
+    def environment(self):
+        return {
+            'recorded_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'cpus': os.cpu_count(),
+        }
@@ -0,0 +1,59 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from loan_core.decisions import bulk_decide
+from loan_core.models import LoanApplication
+from loan_core.scoring import TIER_CHOICES
+
+
+class Command(BaseCommand):
+    help = "Approve or reject a filtered set of pending loan applications with chunked UPDATEs."
+
+    def add_arguments(self, parser):
+        parser.add_argument('decision', choices=['approve', 'reject'])
+        parser.add_argument('--tier', action='append', choices=[tier for tier, _ in TIER_CHOICES],
+                            help="Recommended tier (repeatable).")
+        parser.add_argument('--min-score', type=int)
+        parser.add_argument('--max-score', type=int)
+        parser.add_argument('--min-amount', type=float)
+        parser.add_argument('--max-amount', type=float)
+        parser.add_argument('--older-than-days', type=int)
+        parser.add_argument('--newer-than-days', type=int)
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--dry-run', action='store_true', help="Only count the matching applications.")
+
+    def handle(self, *args, **options):
+        queryset = LoanApplication.objects.filter(status='pending')
+        if options['tier']:
+            queryset = queryset.filter(recommended_tier__in=options['tier'])
+        if options['min_score'] is not None:
+            queryset = queryset.filter(risk_score__gte=options['min_score'])
+        if options['max_score'] is not None:
+            queryset = queryset.filter(risk_score__lte=options['max_score'])
+        if options['min_amount'] is not None:
+            queryset = queryset.filter(amount__gte=options['min_amount'])
+        if options['max_amount'] is not None:
+            queryset = queryset.filter(amount__lte=options['max_amount'])
+        now = timezone.now()
+        if options['older_than_days'] is not None:
+            queryset = queryset.filter(created_at__lt=now - timedelta(days=options['older_than_days']))
+        if options['newer_than_days'] is not None:
+            queryset = queryset.filter(created_at__gte=now - timedelta(days=options['newer_than_days']))
+
+        if options['dry_run']:
+            self.stdout.write(f"{queryset.count()} pending application(s) match.")
+            return
+
+        status = {'approve': 'approved', 'reject': 'rejected'}[options['decision']]
+
+        def progress(result):
+            self.stdout.write(f"  chunk {result.chunks}: {result.updated} {status} so far "
+                              f"({result.elapsed:.2f}s)")
+
+        result = bulk_decide(queryset, status, chunk_size=options['chunk_size'], progress=progress)
+        rate = result.updated / result.elapsed if result.elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"{result.updated} application(s) {status} in {result.elapsed:.2f}s ({rate:,.0f} rows/sec)"
+        ))
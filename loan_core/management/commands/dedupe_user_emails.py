@@ -0,0 +1,39 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import Coalesce, Lower
+
+
+class Command(BaseCommand):
+    help = ("List email addresses shared by several accounts (ignoring case); with --apply keep each on the "
+            "most recently used account and clear it on the others.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--apply', action='store_true', help="Clear the duplicates instead of only listing them.")
+
+    def handle(self, *args, **options):
+        users = User.objects.exclude(email='').annotate(email_lower=Lower('email'))
+        duplicated = list(
+            users.values('email_lower').annotate(n=Count('id')).filter(n__gt=1)
+            .order_by('email_lower').values_list('email_lower', flat=True)
+        )
+        cleared = 0
+        with transaction.atomic():
+            for email in duplicated:
+                accounts = list(users.filter(email_lower=email)
+                                .order_by(Coalesce('last_login', 'date_joined').desc(), '-id'))
+                keep, others = accounts[0], accounts[1:]
+                self.stdout.write(f"{email}: keep {keep.pk} ({keep.username}), "
+                                  f"clear {', '.join(f'{u.pk} ({u.username})' for u in others)}")
+                if options['apply']:
+                    # save() rather than update(): the post_save handlers
+                    # drop the cached user and dashboards holding the email.
+                    for user in others:
+                        user.email = ''
+                        user.save(update_fields=['email'])
+                    cleared += len(others)
+        if not options['apply']:
+            self.stdout.write(f"{len(duplicated)} shared email address(es); run with --apply to clear them.")
+            return
+        self.stdout.write(self.style.SUCCESS(f"Cleared the email of {cleared} account(s)."))
@@ -0,0 +1,49 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from loan_core.imports import DEFAULT_CHUNK_SIZE, FORMATS, ImportFileError, import_applications
+
+
+class Command(BaseCommand):
+    help = "Bulk-import loan applications from a CSV or JSON lines file (optionally gzipped)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Input file; needs a user_email column, see loan_core.imports.")
+        parser.add_argument('--format', choices=FORMATS, help="Defaults to the file extension.")
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                            help="Records validated and inserted per transaction.")
+        parser.add_argument('--workers', type=int, default=1,
+                            help="Processes validating chunks in parallel (1 validates inline).")
+        parser.add_argument('--rejects', help="JSON lines file for rejected rows (default: <path>.rejects.jsonl).")
+        parser.add_argument('--checkpoint', help="Progress file (default: <path>.checkpoint).")
+        parser.add_argument('--resume', action='store_true',
+                            help="Skip the records a previous run committed according to the checkpoint.")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f"{path} does not exist.")
+        checkpoint = options['checkpoint'] or f'{path}.checkpoint'
+        reject_path = options['rejects'] or f'{path}.rejects.jsonl'
+
+        def progress(result):
+            self.stdout.write(f"  chunk {result.chunks}: {result.created} created, {result.rejected} rejected "
+                              f"({result.rate:,.0f} rows/sec)")
+
+        with open(reject_path, 'a' if options['resume'] else 'w', encoding='utf-8') as rejects:
+            try:
+                result = import_applications(
+                    path, fmt=options['format'], chunk_size=options['chunk_size'], workers=options['workers'],
+                    rejects=rejects, checkpoint=checkpoint, resume=options['resume'], progress=progress,
+                )
+            except ImportFileError as e:
+                raise CommandError(e)
+        if result.skipped:
+            self.stdout.write(f"Resumed after {result.skipped} record(s) already imported.")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result.created} of {result.read} application(s) in {result.elapsed:.2f}s "
+            f"({result.rate:,.0f} rows/sec)"
+        ))
+        if result.rejected:
+            self.stdout.write(self.style.WARNING(f"{result.rejected} row(s) rejected, see {reject_path}"))
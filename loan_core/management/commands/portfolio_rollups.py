@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from loan_core.rollups import drift, rebuild
+
+
+class Command(BaseCommand):
+    help = "Rebuild the portfolio analytics rollups from scratch, or check them for drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['rebuild', 'check'])
+        parser.add_argument('--fix', action='store_true', help="With check: rebuild when drift is found.")
+        parser.add_argument('--show', type=int, default=20, help="With check: drifted groups to list.")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if options['action'] == 'rebuild':
+            groups = rebuild()
+            self.stdout.write(self.style.SUCCESS(
+                f"Rebuilt {groups} rollup group(s) in {time.perf_counter() - started:.2f}s"
+            ))
+            return
+
+        drifted = drift()
+        elapsed = time.perf_counter() - started
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS(f"Rollups match the applications ({elapsed:.2f}s)."))
+            return
+        for (month, employment_type, status, band), stored, actual in drifted[:options['show']]:
+            self.stdout.write(f"  {month:%Y-%m} {employment_type} {status} {band}: "
+                              f"stored {stored or '-'}, actual {actual or '-'}")
+        if options['fix']:
+            groups = rebuild()
+            self.stdout.write(self.style.WARNING(
+                f"{len(drifted)} group(s) drifted; rebuilt {groups} group(s)."
+            ))
+            return
+        raise CommandError(f"{len(drifted)} rollup group(s) drifted; run with --fix or 'rebuild'.")
@@ -0,0 +1,45 @@
+import pstats
+
+from django.core.management.base import BaseCommand, CommandError
+
+from loan_core.profiling import HEADER, ProfileStore, make_token
+
+
+class Command(BaseCommand):
+    help = "List or summarize stored request profiles, or mint an X-Debug-Profile header value."
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['list', 'summary', 'token'])
+        parser.add_argument('--dir', help="Profile directory (defaults to PROFILING_DIR).")
+        parser.add_argument('--view', action='append', help="Only profiles of this view name (repeatable).")
+        parser.add_argument('--last', type=int, help="Only the newest N matching profiles.")
+        parser.add_argument('--sort', choices=['cumulative', 'tottime', 'ncalls'], default='cumulative')
+        parser.add_argument('--limit', type=int, default=25, help="Functions shown by summary.")
+
+    def handle(self, *args, **options):
+        if options['action'] == 'token':
+            self.stdout.write(f"{HEADER}: {make_token()}")
+            return
+
+        profiles = ProfileStore(directory=options['dir']).profiles()
+        if options['view']:
+            profiles = [p for p in profiles if p.view in options['view']]
+        if options['last']:
+            profiles = profiles[:options['last']]
+
+        if options['action'] == 'list':
+            for profile in profiles:
+                self.stdout.write(f"{profile.created:%Y-%m-%d %H:%M:%S}  {profile.duration_ms:>7} ms  "
+                                  f"pid {profile.pid:<7} {profile.view}  {profile.path}")
+            self.stdout.write(f"{len(profiles)} profile(s)")
+            return
+
+        if not profiles:
+            raise CommandError("No stored profiles match.")
+        durations = sorted(p.duration_ms for p in profiles)
+        self.stdout.write(f"{len(profiles)} profile(s) of {', '.join(sorted({p.view for p in profiles}))}; "
+                          f"median {durations[len(durations) // 2]} ms, slowest {durations[-1]} ms")
+        stats = pstats.Stats(profiles[0].path, stream=self.stdout)
+        for profile in profiles[1:]:
+            stats.add(profile.path)
+        stats.strip_dirs().sort_stats(options['sort']).print_stats(options['limit'])
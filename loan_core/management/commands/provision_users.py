@@ -0,0 +1,43 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from loan_core.imports import FORMATS, ImportFileError
+from loan_core.provisioning import DEFAULT_CHUNK_SIZE, provision_users
+
+
+class Command(BaseCommand):
+    help = ("Bulk-create user accounts from a CSV or JSON lines file with full_name, email and password "
+            "(\"unusable\" or empty for no password). Existing emails are skipped.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=FORMATS, help="Defaults to the file extension.")
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                            help="Accounts hashed and inserted per transaction.")
+        parser.add_argument('--workers', type=int, default=None,
+                            help="Password hashing processes (defaults to the CPU count, 1 disables the pool).")
+        parser.add_argument('--rejects', help="JSON lines file for rejected rows (default: <path>.rejects.jsonl).")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f"{path} does not exist.")
+        reject_path = options['rejects'] or f'{path}.rejects.jsonl'
+
+        def progress(result):
+            self.stdout.write(f"  chunk {result.chunks}: {result.created} created, {result.skipped} existing, "
+                              f"{result.rejected} rejected ({result.rate:,.1f} users/sec)")
+
+        with open(reject_path, 'w', encoding='utf-8') as rejects:
+            try:
+                result = provision_users(path, fmt=options['format'], chunk_size=options['chunk_size'],
+                                         workers=options['workers'], rejects=rejects, progress=progress)
+            except ImportFileError as e:
+                raise CommandError(e)
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {result.created} user(s), skipped {result.skipped} existing, in {result.elapsed:.2f}s "
+            f"({result.rate:,.1f} users/sec)"
+        ))
+        if result.rejected:
+            self.stdout.write(self.style.WARNING(f"{result.rejected} row(s) rejected, see {reject_path}"))
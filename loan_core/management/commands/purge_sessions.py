@@ -0,0 +1,37 @@
+import time
+
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = ("Delete expired sessions in short batches, unlike clearsessions' single DELETE, "
+            "so the sessions table is never locked for long.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--pause', type=float, default=0.0, help="Seconds to sleep between batches.")
+        parser.add_argument('--dry-run', action='store_true', help="Only count the expired sessions.")
+
+    def handle(self, *args, **options):
+        # Fixed up front so sessions expiring during the run wait for the next one.
+        now = timezone.now()
+        expired = Session.objects.filter(expire_date__lt=now)
+        if options['dry_run']:
+            self.stdout.write(f"{expired.count()} expired session(s).")
+            return
+        deleted = 0
+        while True:
+            with transaction.atomic():
+                keys = list(expired.values_list('session_key', flat=True)[:options['batch_size']])
+                if not keys:
+                    break
+                deleted += Session.objects.filter(session_key__in=keys, expire_date__lt=now).delete()[0]
+            if options['verbosity'] > 1:
+                self.stdout.write(f"  {deleted} deleted so far")
+            if options['pause']:
+                time.sleep(options['pause'])
+        # Entries cached by cached_db carry the session's own expiry, so they lapse by themselves.
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired session(s)."))
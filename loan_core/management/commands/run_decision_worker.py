@@ -0,0 +1,63 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from loan_core.decisions import (
+    WorkerStats, decision_thresholds, process_batch, queue_stats, shared_backends_missing,
+)
+
+
+class Command(BaseCommand):
+    help = ("Run a worker that scores queued loan applications and auto-approves or "
+            "auto-rejects them. Start several to drain the queue in parallel.")
+
+    def add_arguments(self, parser):
+        approve_at, reject_below = decision_thresholds()
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help="Seconds to sleep when the queue is empty.")
+        parser.add_argument('--approve-at', type=int, default=approve_at,
+                            help="Approve applications scoring at least this much.")
+        parser.add_argument('--reject-below', type=int, default=reject_below,
+                            help="Reject applications scoring below this.")
+        parser.add_argument('--once', action='store_true', help="Exit once the queue is empty.")
+        parser.add_argument('--stats', action='store_true', help="Print queue depth and lag, then exit.")
+        parser.add_argument('--report-every', type=float, default=30.0,
+                            help="Seconds between throughput reports.")
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            stats = queue_stats()
+            self.stdout.write(f"depth={stats['depth']} lag={stats['lag']:.1f}s")
+            return
+
+        missing = shared_backends_missing()
+        if missing:
+            self.stderr.write(self.style.WARNING(
+                f"{' and '.join(missing)} not set: dashboards and event streams served by "
+                f"other processes will not see this worker's decisions."
+            ))
+        stats = WorkerStats()
+        last_report = time.monotonic()
+        try:
+            while True:
+                result = process_batch(options['batch_size'], options['approve_at'], options['reject_below'])
+                if result.claimed:
+                    stats.add(result)
+                elif options['once']:
+                    break
+                else:
+                    time.sleep(options['poll_interval'])
+                if time.monotonic() - last_report >= options['report_every']:
+                    self.report(stats)
+                    last_report = time.monotonic()
+        except KeyboardInterrupt:
+            pass
+        self.report(stats)
+
+    def report(self, stats):
+        self.stdout.write(
+            f"processed={stats.processed} approved={stats.approved} rejected={stats.rejected} "
+            f"held={stats.held} batches={stats.batches} rate={stats.throughput():,.0f}/s "
+            f"max_lag={stats.max_lag:.1f}s"
+        )
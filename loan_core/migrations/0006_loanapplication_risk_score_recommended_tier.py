@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-16 23:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loan_core', '0005_delete_userprofile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='loanapplication',
+            name='recommended_tier',
+            field=models.CharField(blank=True, choices=[('personal', 'Personal Loan (Low Interest Rate)'), ('small-business', 'Small Business Loan'), ('emergency', 'Emergency Loan'), ('micro', 'Micro Loan (20-25%)'), ('basic-micro', 'Basic Micro Loan')], db_index=True, editable=False, max_length=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='loanapplication',
+            name='risk_score',
+            field=models.PositiveSmallIntegerField(blank=True, db_index=True, editable=False, null=True),
+        ),
+    ]
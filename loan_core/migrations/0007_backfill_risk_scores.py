@@ -0,0 +1,61 @@
+# Generated by Django 5.2 on 2026-10-16 23:35
+
+from collections import defaultdict
+from itertools import islice
+
+from django.db import migrations
+
+# The scoring rules as they stood when this migration was written, frozen
+# here so later changes to loan_core.scoring cannot change what it does.
+BASE_SCORE = 50
+EMPLOYMENT_SCORES = {'employed': 20, 'self-employed': 15, 'unemployed': -10, 'retired': 5}
+INCOME_BANDS = ((500000, 15), (200000, 10), (100000, 5))
+LOW_INCOME_THRESHOLD, LOW_INCOME_POINTS = 50000, -10
+RATIO_BANDS = ((5, -20), (3, -10), (1, -5))
+LOW_RATIO_POINTS = 5
+EXISTING_DEBT_POINTS = -15
+MIN_SCORE, MAX_SCORE = 1, 100
+TIERS = ((80, 'personal'), (65, 'small-business'), (50, 'emergency'), (35, 'micro'), (MIN_SCORE, 'basic-micro'))
+CHUNK_SIZE = 20000
+
+
+def risk_score(employment_type, income, amount, existing_debt):
+    score = BASE_SCORE + EMPLOYMENT_SCORES.get(employment_type, 0)
+    income, amount = income or 0, amount or 0
+    score += next((points for threshold, points in INCOME_BANDS if income > threshold),
+                  LOW_INCOME_POINTS if income < LOW_INCOME_THRESHOLD else 0)
+    ratio = income / amount if income and amount else 0
+    score += next((points for threshold, points in RATIO_BANDS if ratio > threshold), LOW_RATIO_POINTS)
+    if existing_debt:
+        score += EXISTING_DEBT_POINTS
+    return max(MIN_SCORE, min(MAX_SCORE, score))
+
+
+def tier(score):
+    return next(name for minimum, name in TIERS if score >= minimum)
+
+
+def backfill_risk_scores(apps, schema_editor):
+    LoanApplication = apps.get_model('loan_core', 'LoanApplication')
+    queryset = LoanApplication.objects.using(schema_editor.connection.alias)
+    rows = (queryset.order_by('pk')
+            .values_list('pk', 'employment_type', 'monthly_income', 'amount', 'existing_debt')
+            .iterator(chunk_size=CHUNK_SIZE))
+    while chunk := list(islice(rows, CHUNK_SIZE)):
+        # One UPDATE per distinct score in the chunk.
+        by_score = defaultdict(list)
+        for pk, *fields in chunk:
+            by_score[risk_score(*fields)].append(pk)
+        for score, pks in by_score.items():
+            queryset.filter(pk__in=pks).update(risk_score=score, recommended_tier=tier(score))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loan_core', '0006_loanapplication_risk_score_recommended_tier'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_risk_scores, migrations.RunPython.noop),
+    ]
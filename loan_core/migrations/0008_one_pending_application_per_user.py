@@ -0,0 +1,33 @@
+# Generated by Django 5.2 on 2026-10-16 23:38
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def reject_duplicate_pending(apps, schema_editor):
+    # Races in the old check-then-insert view could leave a user with more
+    # than one pending application; keep the newest and reject the rest so
+    # the constraint can be created.
+    LoanApplication = apps.get_model('loan_core', 'LoanApplication')
+    pending = LoanApplication.objects.using(schema_editor.connection.alias).filter(status='pending')
+    duplicated = pending.values('user').annotate(n=Count('id')).filter(n__gt=1).values_list('user', flat=True)
+    for user_id in duplicated:
+        newest = pending.filter(user=user_id).latest('created_at', 'id')
+        pending.filter(user=user_id).exclude(pk=newest.pk).update(status='rejected')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loan_core', '0007_backfill_risk_scores'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(reject_duplicate_pending, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='loanapplication',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'pending')), fields=('user',), name='one_pending_application_per_user'),
+        ),
+    ]
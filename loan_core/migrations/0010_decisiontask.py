@@ -0,0 +1,35 @@
+# Generated by Django 5.2 on 2026-10-16 23:48
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def enqueue_pending(apps, schema_editor):
+    LoanApplication = apps.get_model('loan_core', 'LoanApplication')
+    DecisionTask = apps.get_model('loan_core', 'DecisionTask')
+    db = schema_editor.connection.alias
+    pending = LoanApplication.objects.using(db).filter(status='pending').values_list('pk', 'created_at')
+    DecisionTask.objects.using(db).bulk_create(
+        (DecisionTask(application_id=pk, enqueued_at=created_at) for pk, created_at in pending.iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loan_core', '0009_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DecisionTask',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('enqueued_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('application', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='decision_task', to='loan_core.loanapplication')),
+            ],
+        ),
+        migrations.RunPython(enqueue_pending, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-16 23:53
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loan_core', '0010_decisiontask'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='loanapplication',
+            index=models.Index(fields=['-created_at', '-id'], name='loan_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loanapplication',
+            index=models.Index(fields=['status', '-created_at', '-id'], name='loan_status_created_id_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2 on 2026-10-17 00:12
+
+from django.db import migrations
+from django.db.models import Count
+from django.db.models.functions import Lower
+
+
+def check_duplicate_emails(apps, schema_editor):
+    # Emails differing only in case (or created through the admin) can be
+    # shared by several accounts. Stop with a report rather than pick which
+    # account keeps the address; "manage.py dedupe_user_emails" resolves them.
+    User = apps.get_model('auth', 'User')
+    users = User.objects.using(schema_editor.connection.alias).exclude(email='').annotate(email_lower=Lower('email'))
+    duplicated = users.values('email_lower').annotate(n=Count('id')).filter(n__gt=1).order_by('email_lower')
+    if not duplicated:
+        return
+    report = '\n'.join(
+        f"  {row['email_lower']}: user ids "
+        f"{', '.join(str(pk) for pk in users.filter(email_lower=row['email_lower']).order_by('pk').values_list('pk', flat=True))}"
+        for row in duplicated
+    )
+    raise RuntimeError(
+        f"{len(duplicated)} email address(es) are shared by several accounts, so the case-insensitive unique "
+        f"index cannot be built:\n{report}\n"
+        f"Run \"manage.py dedupe_user_emails\" to review them and --apply to clear all but one, then migrate again."
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('loan_core', '0011_loanapplication_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicate_emails, migrations.RunPython.noop),
+        migrations.RunSQL(
+            "CREATE UNIQUE INDEX auth_user_email_lower_uniq ON auth_user (LOWER(email)) WHERE email <> ''",
+            "DROP INDEX auth_user_email_lower_uniq",
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.2 on 2026-10-17 00:13
+
+from decimal import Decimal
+from django.db import migrations, models
+
+FEATURES = [
+    "Quick approval process",
+    "No collateral required",
+    "Flexible repayment options",
+    "No hidden charges",
+]
+ELIGIBILITY = [
+    "Nigerian citizen or resident",
+    "Aged 18 years and above",
+    "Steady source of income",
+    "Valid government ID",
+]
+# The products get_recommendations used to hard-code, one per risk tier.
+# Each is open to every score from its tier up.
+PRODUCTS = [
+    ('personal', "Personal Loan (Low Interest Rate)", 80, 5000000, 5, 36),
+    ('small-business', "Small Business Loan", 65, 2000000, 10, 24),
+    ('emergency', "Emergency Loan", 50, 1000000, 15, 18),
+    ('micro', "Micro Loan (20-25%)", 35, 500000, 22, 12),
+    ('basic-micro', "Basic Micro Loan", 1, 200000, 28, 6),
+]
+
+
+def seed_products(apps, schema_editor):
+    LoanProduct = apps.get_model('loan_core', 'LoanProduct')
+    LoanProduct.objects.using(schema_editor.connection.alias).bulk_create([
+        LoanProduct(slug=slug, name=name, min_score=min_score, max_score=100, max_amount=amount,
+                    interest_rate=rate, term_months=term, features=FEATURES, eligibility_requirements=ELIGIBILITY)
+        for slug, name, min_score, amount, rate, term in PRODUCTS
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loan_core', '0012_auth_user_email_lower_uniq'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoanProduct',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slug', models.SlugField(unique=True)),
+                ('name', models.CharField(max_length=100)),
+                ('min_score', models.PositiveSmallIntegerField()),
+                ('max_score', models.PositiveSmallIntegerField(default=100)),
+                ('max_amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('interest_rate', models.DecimalField(decimal_places=2, help_text='percent', max_digits=5)),
+                ('term_months', models.PositiveSmallIntegerField()),
+                ('processing_fee_percentage', models.DecimalField(decimal_places=2, default=Decimal('1.50'), max_digits=4)),
+                ('features', models.JSONField(blank=True, default=list)),
+                ('eligibility_requirements', models.JSONField(blank=True, default=list)),
+                ('priority', models.SmallIntegerField(default=0, help_text='Lower values rank first among eligible products.')),
+                ('is_active', models.BooleanField(default=True)),
+            ],
+            options={
+                'ordering': ['-min_score', 'priority'],
+                'constraints': [models.CheckConstraint(condition=models.Q(('min_score__lte', models.F('max_score'))), name='loan_product_score_band')],
+            },
+        ),
+        migrations.RunPython(seed_products, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2 on 2026-10-17 00:37
+
+from django.db import migrations, models
+from django.db.models import Case, Count, DateField, Sum, Value, When
+from django.db.models.functions import TruncMonth
+
+# The income bands and grouping of loan_core.rollups when this migration was
+# written, frozen here so later changes there cannot change what it does.
+INCOME_BANDS = (
+    (0, 'under_50k'),
+    (50000, '50k_100k'),
+    (100000, '100k_200k'),
+    (200000, '200k_500k'),
+    (500000, '500k_plus'),
+)
+GROUP_FIELDS = ('month', 'employment_type', 'status', 'income_band')
+
+
+def build_rollups(apps, schema_editor):
+    alias = schema_editor.connection.alias
+    LoanApplication = apps.get_model('loan_core', 'LoanApplication')
+    PortfolioRollup = apps.get_model('loan_core', 'PortfolioRollup')
+    band = Case(
+        *(When(monthly_income__gte=edge, then=Value(name)) for edge, name in reversed(INCOME_BANDS[1:])),
+        default=Value(INCOME_BANDS[0][1]),
+    )
+    groups = (
+        LoanApplication.objects.using(alias).order_by()
+        .annotate(month=TruncMonth('created_at', output_field=DateField()), income_band=band)
+        .values(*GROUP_FIELDS)
+        .annotate(applications=Count('pk'), total_amount=Sum('amount'), total_income=Sum('monthly_income'))
+    )
+    PortfolioRollup.objects.using(alias).bulk_create(PortfolioRollup(**group) for group in groups)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loan_core', '0014_loanapplication_created_at_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PortfolioRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('employment_type', models.CharField(choices=[('full-time', 'Full‑Time'), ('part-time', 'Part‑Time'), ('self-employed', 'Self‑Employed'), ('unemployed', 'Unemployed'), ('retired', 'Retired')], max_length=20)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('approved', 'Approved'), ('rejected', 'Rejected')], max_length=10)),
+                ('income_band', models.CharField(max_length=20)),
+                ('applications', models.IntegerField(default=0)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('total_income', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('month', 'employment_type', 'status', 'income_band'), name='unique_portfolio_rollup_group')],
+            },
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2 on 2026-10-17 01:40
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loan_core', '0016_idempotency_reservation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='loanproduct',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
@@ -1,7 +1,14 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 from decimal import Decimal
 
+from .scoring import TIER_CHOICES, calculate_risk_score, recommendation_tier
+
+# LoanApplication fields its portfolio rollup group and sums derive from (see rollups.py).
+ROLLUP_SOURCE_FIELDS = ('created_at', 'employment_type', 'status', 'monthly_income', 'amount')
+
+
 class LoanApplication(models.Model):
     STATUS_CHOICES = [
         ('pending','Pending'),
@@ -33,8 +40,141 @@ class LoanApplication(models.Model):
     existing_debt    = models.BooleanField(default=False)
     purpose = models.TextField(blank=True, null=True)
     status           = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
-    created_at       = models.DateTimeField(auto_now_add=True)
+    # A default rather than auto_now_add so bulk imports can keep historical dates.
+    created_at       = models.DateTimeField(default=timezone.now, editable=False)
+    risk_score       = models.PositiveSmallIntegerField(blank=True, null=True, db_index=True, editable=False)
+    recommended_tier = models.CharField(max_length=20, choices=TIER_CHOICES, blank=True, null=True,
+                                        db_index=True, editable=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user'],
+                condition=models.Q(status='pending'),
+                name='one_pending_application_per_user',
+            ),
+        ]
+        indexes = [
+            # Newest-first listing and keyset paging, optionally per status.
+            models.Index(fields=['-created_at', '-id'], name='loan_created_id_idx'),
+            models.Index(fields=['status', '-created_at', '-id'], name='loan_status_created_id_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} – {self.status}"
-    
\ No newline at end of file
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored status so saves can tell a status change apart.
+        instance._loaded_status = instance.__dict__.get('status')
+        # And the fields its portfolio rollup group derives from.
+        instance._loaded_rollup = instance.rollup_values()
+        return instance
+
+    def rollup_values(self):
+        """This application's ``ROLLUP_SOURCE_FIELDS``, or ``None`` if any is deferred."""
+        values = {name: self.__dict__.get(name) for name in ROLLUP_SOURCE_FIELDS}
+        return values if None not in values.values() else None
+
+    def save(self, *args, **kwargs):
+        # Store the score with the row so read views never recompute it.
+        self.risk_score = calculate_risk_score(self)
+        self.recommended_tier = recommendation_tier(self.risk_score)
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'risk_score', 'recommended_tier'}
+        super().save(*args, **kwargs)
+
+
+class IdempotencyKey(models.Model):
+    """
+    Stored response for an ``Idempotency-Key``, or a reservation while
+    ``status_code`` is null; see ``idempotency.DatabaseIdempotencyStore``.
+    """
+    user         = models.ForeignKey(User, on_delete=models.CASCADE)
+    key          = models.CharField(max_length=255)
+    fingerprint  = models.CharField(max_length=64, default='')
+    status_code  = models.PositiveSmallIntegerField(null=True)
+    content_type = models.CharField(max_length=100, blank=True, default='')
+    content      = models.BinaryField(null=True)
+    created_at   = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='unique_idempotency_key_per_user'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} – {self.key}"
+
+
+class DecisionTask(models.Model):
+    """
+    Queue entry for an application awaiting an automatic decision.
+
+    Rows are claimed with ``SELECT ... FOR UPDATE SKIP LOCKED`` and deleted
+    in the same transaction that records the decision, see
+    ``decisions.process_batch``.
+    """
+    application = models.OneToOneField(LoanApplication, on_delete=models.CASCADE, related_name='decision_task')
+    enqueued_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"Decision for application {self.application_id}"
+
+
+class LoanProduct(models.Model):
+    """
+    A product offered to applicants whose risk score lies within
+    ``min_score``..``max_score``. Active products are served from the
+    in-process index in ``products.py``.
+    """
+    slug                      = models.SlugField(unique=True)
+    name                      = models.CharField(max_length=100)
+    min_score                 = models.PositiveSmallIntegerField()
+    max_score                 = models.PositiveSmallIntegerField(default=100)
+    max_amount                = models.DecimalField(max_digits=12, decimal_places=2)
+    interest_rate             = models.DecimalField(max_digits=5, decimal_places=2, help_text="percent")
+    term_months               = models.PositiveSmallIntegerField()
+    processing_fee_percentage = models.DecimalField(max_digits=4, decimal_places=2, default=Decimal('1.50'))
+    features                  = models.JSONField(default=list, blank=True)
+    eligibility_requirements  = models.JSONField(default=list, blank=True)
+    priority                  = models.SmallIntegerField(default=0,
+                                                         help_text="Lower values rank first among eligible products.")
+    is_active                 = models.BooleanField(default=True)
+    # Part of the catalog version workers compare (products.catalog_version);
+    # a QuerySet.update() of products must set it too.
+    updated_at                = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-min_score', 'priority']
+        constraints = [
+            models.CheckConstraint(condition=models.Q(min_score__lte=models.F('max_score')),
+                                   name='loan_product_score_band'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.min_score}–{self.max_score})"
+
+
+class PortfolioRollup(models.Model):
+    """
+    Application count and sums for one (month, employment type, status,
+    income band) group, maintained incrementally by ``rollups.py``.
+    """
+    month           = models.DateField()
+    employment_type = models.CharField(max_length=20, choices=LoanApplication.EMPLOYMENT_CHOICES)
+    status          = models.CharField(max_length=10, choices=LoanApplication.STATUS_CHOICES)
+    income_band     = models.CharField(max_length=20)
+    applications    = models.IntegerField(default=0)
+    total_amount    = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    total_income    = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['month', 'employment_type', 'status', 'income_band'],
+                                    name='unique_portfolio_rollup_group'),
+        ]
+
+    def __str__(self):
+        return f"{self.month:%Y-%m} {self.employment_type} {self.status} {self.income_band}: {self.applications}"
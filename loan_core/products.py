@@ -0,0 +1,176 @@
+"""
+In-process index of the ``LoanProduct`` catalog.
+
+``get_product_index()`` returns an immutable ``ProductIndex``: the score
+range is cut at every product's band edges into sorted intervals, and each
+interval holds the products eligible there, already ranked and already
+rendered into the cards ``view_recommendations`` shows. A lookup is a
+single ``bisect`` and returns shared tuples, so serving recommendations
+allocates nothing per product.
+
+Each worker keeps its own index and, at most every
+``PRODUCT_CATALOG_CHECK_INTERVAL`` seconds, compares it with the catalog's
+version in the database (every product's id and ``updated_at``; the
+catalog is a handful of rows), rebuilding it when that moved. Saving or deleting a product
+makes the worker that did it check on its next lookup (see ``signals.py``);
+other workers notice within the interval, whatever cache they use.
+"""
+from bisect import bisect_right
+from dataclasses import dataclass
+from decimal import Decimal
+import threading
+import time
+from types import MappingProxyType
+
+from django.conf import settings
+
+from .amortization import CENT, payment_arrays
+from .routers import primary_reads
+
+# (recommendationLevel, badgeClass, ratingClass) by position in the ranking.
+RECOMMENDATION_LEVELS = (
+    ('Best Match', 'badge-best', 'best'),
+    ('Good Option', 'badge-good', 'good'),
+)
+OTHER_LEVEL = ('Basic Option', 'badge-basic', 'basic')
+
+
+@dataclass(frozen=True)
+class Product:
+    slug: str
+    name: str
+    min_score: int
+    max_score: int
+    max_amount: Decimal
+    interest_rate: Decimal
+    term_months: int
+    processing_fee_percentage: Decimal
+    features: tuple
+    eligibility_requirements: tuple
+    priority: int
+
+    @classmethod
+    def from_model(cls, product):
+        return cls(
+            slug=product.slug, name=product.name, min_score=product.min_score, max_score=product.max_score,
+            max_amount=product.max_amount, interest_rate=product.interest_rate,
+            term_months=product.term_months, processing_fee_percentage=product.processing_fee_percentage,
+            features=tuple(product.features), eligibility_requirements=tuple(product.eligibility_requirements),
+            priority=product.priority,
+        )
+
+    @property
+    def rank_key(self):
+        # Explicit priority first, then the narrowest (highest) band, then the cheapest.
+        return (self.priority, -self.min_score, self.interest_rate, self.slug)
+
+
+def _card(product, payment, position, best_rate):
+    level, badge, rating = RECOMMENDATION_LEVELS[position] if position < len(RECOMMENDATION_LEVELS) else OTHER_LEVEL
+    return MappingProxyType({
+        'productId': product.slug,
+        'productName': product.name,
+        'loanAmount': product.max_amount,
+        'interestRate': product.interest_rate,
+        'termMonths': product.term_months,
+        'monthlyPayment': payment,
+        'processingFeePercentage': product.processing_fee_percentage,
+        'recommendationLevel': level,
+        'badgeClass': badge,
+        'ratingClass': rating,
+        'isBestRate': product.interest_rate == best_rate,
+        'features': product.features,
+        'eligibilityRequirements': product.eligibility_requirements,
+    })
+
+
+class ProductIndex:
+    """Sorted score intervals mapped to ranked products and their cards."""
+
+    def __init__(self, products, limit=3, version=None):
+        self.version = version
+        self.limit = limit
+        products = sorted(products, key=lambda p: p.rank_key)
+        self._by_slug = {p.slug: p for p in products}
+        # Interval i covers scores [bounds[i], bounds[i + 1]).
+        self._bounds = tuple(sorted({p.min_score for p in products} | {p.max_score + 1 for p in products}))
+        self._ranked = tuple(
+            tuple(p for p in products if p.min_score <= start <= p.max_score)
+            for start in self._bounds
+        )
+        payments = payment_arrays([p.max_amount for p in products], [p.interest_rate for p in products],
+                                  [p.term_months for p in products])
+        self._payments = {p.slug: Decimal(payment).quantize(CENT) for p, payment in zip(products, payments.tolist())}
+        self._cards = tuple(self._build_cards(ranked[:limit]) for ranked in self._ranked)
+
+    def _build_cards(self, ranked):
+        best_rate = min((p.interest_rate for p in ranked), default=None)
+        return tuple(
+            _card(product, self._payments[product.slug], position, best_rate)
+            for position, product in enumerate(ranked)
+        )
+
+    def _interval(self, score):
+        return bisect_right(self._bounds, score) - 1
+
+    def lookup(self, score):
+        """Every product eligible for ``score``, best first."""
+        i = self._interval(score)
+        return self._ranked[i] if i >= 0 else ()
+
+    def cards(self, score):
+        """Read-only recommendation cards for the top ``limit`` products."""
+        i = self._interval(score)
+        return self._cards[i] if i >= 0 else ()
+
+    def get(self, slug):
+        return self._by_slug.get(slug)
+
+    def best(self, score):
+        ranked = self.lookup(score)
+        return ranked[0] if ranked else None
+
+
+_index = None
+_checked_at = float('-inf')  # time.monotonic() of the last version check
+_lock = threading.Lock()
+
+
+def catalog_version():
+    """Every product's ``(pk, updated_at)``; any save, insert or delete changes it."""
+    from .models import LoanProduct
+
+    with primary_reads():
+        return tuple(LoanProduct.objects.order_by('pk').values_list('pk', 'updated_at'))
+
+
+def invalidate_products():
+    """Check the catalog version on this worker's next lookup."""
+    global _checked_at
+    _checked_at = float('-inf')
+
+
+def load_index(version=None):
+    from .models import LoanProduct
+
+    # The version is read before the rows, and the rows come from the
+    # primary, so an index is never newer than the data it was built from.
+    with primary_reads():
+        products = [Product.from_model(p) for p in LoanProduct.objects.filter(is_active=True)]
+    return ProductIndex(products, limit=getattr(settings, 'RECOMMENDATION_LIMIT', 3), version=version)
+
+
+def get_product_index():
+    """This worker's index, rebuilt when the catalog version in the database moved."""
+    global _index, _checked_at
+    interval = getattr(settings, 'PRODUCT_CATALOG_CHECK_INTERVAL', 5)
+    index = _index
+    if index is not None and time.monotonic() - _checked_at < interval:
+        return index
+    with _lock:
+        if _index is None or time.monotonic() - _checked_at >= interval:
+            version = catalog_version()
+            if _index is None or _index.version != version:
+                _index = load_index(version)
+            _checked_at = time.monotonic()
+        return _index
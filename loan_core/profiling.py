@@ -0,0 +1,212 @@
+"""
+On-demand profiling of production requests.
+
+``RequestProfilingMiddleware`` runs ``cProfile`` around the views of a random
+``PROFILING_SAMPLE_RATE`` fraction of requests and around any request that
+carries a valid signed ``X-Debug-Profile`` header (mint one with
+``manage.py profiles token``). Requests that are not picked cost one
+``random()`` call and one ``META`` lookup.
+
+Profiles go to ``PROFILING_DIR`` as ``<ms since epoch>__<pid>__<view>__<duration>ms.prof``;
+once there are more than ``PROFILING_MAX_FILES`` the oldest are deleted.
+``manage.py profiles list`` and ``profiles summary`` read them back with
+``pstats``.
+
+The profiler is switched on in ``process_view``, on the thread that will
+run the view, and off once the response is back, so the later view
+middleware and the view itself are covered. Sync views served under ASGI
+run in a ``sync_to_async`` thread and are profiled there. Async views are
+profiled on the event loop, together with whatever other tasks it runs
+meanwhile, and only when every middleware below this one is async-capable;
+with a sync-only one such as WhiteNoise, Django runs this middleware's hooks
+in a thread that never sees the view, so async views are left unprofiled.
+Only one request per process is profiled at a time, so an overlapping pick
+is simply served unprofiled.
+"""
+import cProfile
+from dataclasses import dataclass
+from datetime import datetime, timezone as dt_timezone
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import MiddlewareNotUsed
+
+HEADER = 'X-Debug-Profile'
+_META_KEY = 'HTTP_X_DEBUG_PROFILE'
+_SALT = 'loan_core.profiling'
+_TOKEN_VALUE = 'profile'
+SUFFIX = '.prof'
+
+_active = threading.Lock()
+
+
+def profiling_dir():
+    return str(getattr(settings, 'PROFILING_DIR', None) or os.path.join(tempfile.gettempdir(), 'loan-profiles'))
+
+
+def make_token():
+    """A header value that asks for a profile until ``PROFILING_TOKEN_MAX_AGE`` seconds pass."""
+    return signing.TimestampSigner(salt=_SALT).sign(_TOKEN_VALUE)
+
+
+def valid_token(value):
+    try:
+        return signing.TimestampSigner(salt=_SALT).unsign(
+            value, max_age=getattr(settings, 'PROFILING_TOKEN_MAX_AGE', 3600)
+        ) == _TOKEN_VALUE
+    except signing.BadSignature:
+        return False
+
+
+@dataclass(frozen=True)
+class StoredProfile:
+    path: str
+    created: datetime
+    pid: int
+    view: str
+    duration_ms: int
+
+    @classmethod
+    def parse(cls, directory, name):
+        """``None`` for files that are not stored profiles."""
+        parts = name[:-len(SUFFIX)].split('__') if name.endswith(SUFFIX) else []
+        if len(parts) < 4 or not parts[-1].endswith('ms'):
+            return None
+        try:
+            stamp, pid, duration = int(parts[0]), int(parts[1]), int(parts[-1][:-2])
+        except ValueError:
+            return None
+        return cls(os.path.join(directory, name), datetime.fromtimestamp(stamp / 1000, dt_timezone.utc), pid,
+                   '__'.join(parts[2:-1]), duration)
+
+
+class ProfileStore:
+    """A directory holding at most ``max_files`` profiles, oldest dropped first."""
+
+    def __init__(self, directory=None, max_files=None):
+        self.directory = directory or profiling_dir()
+        self.max_files = max_files or getattr(settings, 'PROFILING_MAX_FILES', 200)
+
+    def profiles(self):
+        """Stored profiles, newest first."""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        profiles = (StoredProfile.parse(self.directory, name) for name in names)
+        return sorted((p for p in profiles if p), key=lambda p: (p.created, p.path), reverse=True)
+
+    def save(self, profiler, view, duration):
+        os.makedirs(self.directory, exist_ok=True)
+        view = re.sub(r'[^\w.-]+', '_', view).replace('__', '_')
+        name = f'{time.time_ns() // 1_000_000}__{os.getpid()}__{view}__{round(duration * 1000)}ms{SUFFIX}'
+        path = os.path.join(self.directory, name)
+        # Write then rename so readers never see half a profile.
+        profiler.dump_stats(f'{path}.tmp')
+        os.replace(f'{path}.tmp', path)
+        for stale in self.profiles()[self.max_files:]:
+            try:
+                os.remove(stale.path)
+            except FileNotFoundError:
+                pass
+        return path
+
+
+def _wanted(request, sample_rate):
+    token = request.META.get(_META_KEY)
+    if token is not None and valid_token(token):
+        return True
+    return sample_rate > 0 and random.random() < sample_rate
+
+
+class RequestProfilingMiddleware:
+    """Profile the views of sampled or explicitly flagged requests into the ring directory."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0.0)
+        self.store = ProfileStore()
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+            self.process_view = self.aprocess_view
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self.pick(request):
+            return self.get_response(request)
+        try:
+            try:
+                response = self.get_response(request)
+            finally:
+                if request._profiled_in is not None:
+                    request._profiler.disable()
+            return self.finish(request, response)
+        finally:
+            _active.release()
+
+    async def __acall__(self, request):
+        if not self.pick(request):
+            return await self.get_response(request)
+        try:
+            try:
+                response = await self.get_response(request)
+            finally:
+                if request._profiled_in == 'loop':
+                    request._profiler.disable()
+                elif request._profiled_in == 'sync':
+                    await sync_to_async(request._profiler.disable, thread_sensitive=True)()
+            return self.finish(request, response)
+        finally:
+            _active.release()
+
+    def pick(self, request):
+        if not _wanted(request, self.sample_rate) or not _active.acquire(blocking=False):
+            return False
+        request._profiler = cProfile.Profile()
+        request._profile_started = time.perf_counter()
+        request._profiled_in = None
+        return True
+
+    # The profiler is only switched on here, never by calling the view:
+    # the later process_view hooks (CsrfViewMiddleware's among them) and
+    # Django's own view call must run exactly as for unprofiled requests.
+
+    def process_view(self, request, view, args, kwargs):
+        # An async view runs on an event loop in another thread.
+        if getattr(request, '_profiler', None) is not None and not iscoroutinefunction(view):
+            request._profiler.enable()
+            request._profiled_in = 'thread'
+
+    async def aprocess_view(self, request, view, args, kwargs):
+        if getattr(request, '_profiler', None) is None:
+            return
+        if iscoroutinefunction(view):
+            request._profiler.enable()
+            request._profiled_in = 'loop'
+        else:
+            # The thread Django runs the sync view in.
+            await sync_to_async(request._profiler.enable, thread_sensitive=True)()
+            request._profiled_in = 'sync'
+
+    def finish(self, request, response):
+        # Nothing was profiled when the URL did not resolve or an earlier
+        # middleware answered the request.
+        if request._profiled_in is not None:
+            match = request.resolver_match
+            path = self.store.save(request._profiler, match.view_name,
+                                   time.perf_counter() - request._profile_started)
+            response[HEADER] = os.path.basename(path)
+        return response
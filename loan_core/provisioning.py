@@ -0,0 +1,180 @@
+"""
+Bulk creation of user accounts for partner onboarding.
+
+Accounts are read from CSV or JSON lines (``full_name``, ``email``,
+``password``) and created the way ``UserRegistrationForm`` would create
+them: the email doubles as the username and the full name is split at its
+first space. Passwords must pass ``AUTH_PASSWORD_VALIDATORS``; a
+``password`` of ``unusable`` (or an empty one) gives an account that cannot
+log in until a reset.
+
+Password hashing dominates the cost (PBKDF2 takes a noticeable fraction of
+a CPU second per password by design), so the hashes of each chunk are
+computed across a process pool. Existing emails are found with one
+case-insensitive query per chunk and skipped, and each chunk is inserted
+with ``bulk_create`` in one transaction.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from itertools import islice
+import math
+import os
+import time
+
+from django import forms
+from django.contrib.auth import password_validation
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from .forms import split_full_name
+from .imports import ImportFileError, input_format, lookup_users, read_records
+
+DEFAULT_CHUNK_SIZE = 1000
+UNUSABLE = 'unusable'
+# Same rules as UserRegistrationForm; the email must also fit the username.
+USER_FIELDS = {
+    'full_name': forms.CharField(max_length=100),
+    'email': forms.EmailField(max_length=150),
+    'password': forms.CharField(required=False, strip=False),
+}
+
+
+def check_user_columns(columns):
+    missing = [name for name in ('full_name', 'email') if name not in columns]
+    if missing:
+        raise ImportFileError(f"The input needs {' and '.join(missing)} column(s).")
+    unknown = [c for c in columns if c not in USER_FIELDS]
+    if unknown:
+        raise ImportFileError(f"Unknown column(s): {', '.join(unknown)}.")
+
+
+def validate_users(records, seen):
+    """
+    Clean ``(row_number, record)`` pairs; ``seen`` collects lower-cased
+    emails so a repeated email within the file is rejected.
+    """
+    valid, rejected = [], []
+    for number, record in records:
+        if '__invalid__' in record:
+            rejected.append((number, {'__all__': [record['__error__']]}, None))
+            continue
+        cleaned, errors = {}, {}
+        for name, form_field in USER_FIELDS.items():
+            try:
+                cleaned[name] = form_field.clean(record.get(name))
+            except ValidationError as e:
+                errors[name] = e.messages
+        if not errors and cleaned['email'].lower() in seen:
+            errors['email'] = ['This email appears earlier in the file.']
+        if not errors and cleaned['password'] and cleaned['password'] != UNUSABLE:
+            first_name, last_name = split_full_name(cleaned['full_name'])
+            user = User(username=cleaned['email'], email=cleaned['email'], first_name=first_name, last_name=last_name)
+            try:
+                password_validation.validate_password(cleaned['password'], user)
+            except ValidationError as e:
+                errors['password'] = e.messages
+        # Never echo a password into the reject file.
+        record = {name: value for name, value in record.items() if name != 'password'}
+        if errors:
+            rejected.append((number, errors, record))
+        else:
+            seen.add(cleaned['email'].lower())
+            valid.append((number, cleaned))
+    return valid, rejected
+
+
+def _hash_passwords(passwords):
+    return [make_password(password) for password in passwords]
+
+
+def hash_passwords(passwords, pool=None, workers=1):
+    """
+    Hash ``passwords`` (``None`` for an unusable one), in ``pool`` when
+    given, spread over ``workers`` batches so every process gets a share.
+    """
+    usable = [(i, password) for i, password in enumerate(passwords) if password is not None]
+    hashes = [make_password(None) if password is None else None for password in passwords]
+    if pool is None or len(usable) < 2:
+        computed = _hash_passwords([password for _, password in usable])
+    else:
+        size = math.ceil(len(usable) / workers)
+        batches = [[password for _, password in usable[start:start + size]]
+                   for start in range(0, len(usable), size)]
+        computed = [hashed for batch in pool.map(_hash_passwords, batches) for hashed in batch]
+    for (i, _), hashed in zip(usable, computed):
+        hashes[i] = hashed
+    return hashes
+
+
+def build_users(valid, pool=None, workers=1):
+    """Skip emails that already have an account and hash the rest; returns ``(users, skipped)``."""
+    existing = lookup_users(cleaned['email'].lower() for _, cleaned in valid)
+    new, skipped = [], 0
+    for _, cleaned in valid:
+        if cleaned['email'].lower() in existing:
+            skipped += 1
+        else:
+            new.append(cleaned)
+    passwords = [c['password'] if c['password'] and c['password'] != UNUSABLE else None for c in new]
+    users = []
+    for cleaned, hashed in zip(new, hash_passwords(passwords, pool, workers)):
+        first_name, last_name = split_full_name(cleaned['full_name'])
+        users.append(User(username=cleaned['email'], email=cleaned['email'], password=hashed,
+                          first_name=first_name, last_name=last_name))
+    return users, skipped
+
+
+@dataclass
+class ProvisionResult:
+    read: int = 0
+    created: int = 0
+    skipped: int = 0
+    rejected: int = 0
+    chunks: int = 0
+    started: float = field(default_factory=time.monotonic)
+    elapsed: float = 0.0
+
+    @property
+    def rate(self):
+        return self.created / self.elapsed if self.elapsed else 0.0
+
+
+def provision_users(path, fmt=None, chunk_size=DEFAULT_CHUNK_SIZE, workers=None, rejects=None, progress=None):
+    """
+    Create an account for every new email in ``path``; returns a
+    ``ProvisionResult``. ``workers`` defaults to the CPU count; 1 hashes in
+    this process. Rejected rows go to the ``rejects`` text file as JSON
+    lines, and ``progress(result)`` is called after every chunk.
+    """
+    workers = workers or os.cpu_count() or 1
+    records = read_records(path, input_format(path, fmt), check=check_user_columns)
+    result = ProvisionResult()
+    encoder = DjangoJSONEncoder()
+    seen = set()
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        for chunk in iter(lambda: list(islice(records, chunk_size)), []):
+            valid, rejected = validate_users(chunk, seen)
+            users, skipped = build_users(valid, pool, workers)
+            if users:
+                with transaction.atomic():
+                    User.objects.bulk_create(users)
+            if rejects is not None:
+                for number, errors, record in rejected:
+                    rejects.write(encoder.encode({'row': number, 'errors': errors, 'record': record}) + '\n')
+            result.read += len(chunk)
+            result.created += len(users)
+            result.skipped += skipped
+            result.rejected += len(rejected)
+            result.chunks += 1
+            result.elapsed = time.monotonic() - result.started
+            if progress:
+                progress(result)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    result.elapsed = time.monotonic() - result.started
+    return result
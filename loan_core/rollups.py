@@ -0,0 +1,247 @@
+"""
+Portfolio analytics kept in ``PortfolioRollup``.
+
+Each rollup row holds the number of applications and their summed amount
+and monthly income for one (month created, employment type, status, income
+band) group. Rows are maintained by deltas in the same code paths that
+change applications: the model signals for single saves and deletes,
+``signals.bulk_status_changed`` for ``QuerySet.update()`` decisions and
+``imports.save_applications`` for bulk inserts. Each delta is an
+``UPDATE ... SET applications = applications + n`` on the affected group,
+so reads never aggregate ``LoanApplication``.
+
+``rebuild()`` recomputes the table with one ``GROUP BY`` and ``drift()``
+compares it with that recomputation (``manage.py portfolio_rollups``).
+"""
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, DateField, F, Sum, Value, When
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import LoanApplication, PortfolioRollup
+
+# (lowest monthly income, band); the same edges the scoring rules use.
+INCOME_BANDS = (
+    (0, 'under_50k'),
+    (50000, '50k_100k'),
+    (100000, '100k_200k'),
+    (200000, '200k_500k'),
+    (500000, '500k_plus'),
+)
+_BAND_EDGES = [edge for edge, _ in INCOME_BANDS[1:]]
+GROUP_FIELDS = ('month', 'employment_type', 'status', 'income_band')
+
+
+def income_band(monthly_income):
+    return INCOME_BANDS[bisect_right(_BAND_EDGES, monthly_income)][1]
+
+
+def month_of(created_at):
+    return timezone.localtime(created_at).date().replace(day=1)
+
+
+def entry(values):
+    """``(group, (count, amount, income))`` for a mapping of ``ROLLUP_SOURCE_FIELDS``."""
+    group = (month_of(values['created_at']), values['employment_type'], values['status'],
+             income_band(values['monthly_income']))
+    return group, (1, Decimal(values['amount']), Decimal(values['monthly_income']))
+
+
+def apply_deltas(deltas):
+    """
+    Add ``{group: (count, amount, income)}`` to the rollup rows, creating
+    missing groups, in one transaction. Groups are visited in sorted order
+    so concurrent writers take row locks in the same order.
+    """
+    with transaction.atomic():
+        _apply_deltas(deltas)
+
+
+def _apply_deltas(deltas):
+    for group in sorted(deltas):
+        count, amount, income = deltas[group]
+        if not (count or amount or income):
+            continue
+        lookup = dict(zip(GROUP_FIELDS, group))
+        increments = {
+            'applications': F('applications') + count,
+            'total_amount': F('total_amount') + amount,
+            'total_income': F('total_income') + income,
+        }
+        if PortfolioRollup.objects.filter(**lookup).update(**increments):
+            continue
+        try:
+            with transaction.atomic():
+                PortfolioRollup.objects.create(**lookup, applications=count, total_amount=amount,
+                                               total_income=income)
+        except IntegrityError:
+            # Another writer created the group first.
+            PortfolioRollup.objects.filter(**lookup).update(**increments)
+
+
+def _add(deltas, group, measures, sign):
+    current = deltas[group]
+    deltas[group] = tuple(total + sign * value for total, value in zip(current, measures))
+
+
+def record_change(before, after):
+    """
+    Move one application between groups. ``before``/``after`` are
+    ``ROLLUP_SOURCE_FIELDS`` mappings, ``None`` for a create or delete.
+    """
+    deltas = defaultdict(lambda: (0, Decimal(0), Decimal(0)))
+    if before is not None:
+        _add(deltas, *entry(before), -1)
+    if after is not None:
+        _add(deltas, *entry(after), 1)
+    apply_deltas(deltas)
+
+
+def record_created(applications):
+    """Count freshly inserted applications (``bulk_create`` skips the signals)."""
+    deltas = defaultdict(lambda: (0, Decimal(0), Decimal(0)))
+    for application in applications:
+        _add(deltas, *entry(application.__dict__), 1)
+    apply_deltas(deltas)
+
+
+def aggregate_groups(queryset):
+    """``{group: (count, amount, income)}`` aggregated in the database."""
+    rows = (
+        queryset.order_by()
+        .annotate(month=TruncMonth('created_at', output_field=DateField()), income_band=band_expression())
+        .values(*GROUP_FIELDS)
+        .annotate(applications=Count('pk'), total_amount=Sum('amount'), total_income=Sum('monthly_income'))
+    )
+    return {
+        (row['month'], row['employment_type'], row['status'], row['income_band']):
+            (row['applications'], row['total_amount'], row['total_income'])
+        for row in rows
+    }
+
+
+def record_status_moves(pks, previous, status):
+    """Move already-updated applications ``pks`` from ``previous`` to ``status`` with one aggregate query."""
+    deltas = defaultdict(lambda: (0, Decimal(0), Decimal(0)))
+    for (month, employment_type, _, band), measures in aggregate_groups(
+        LoanApplication.objects.filter(pk__in=pks)
+    ).items():
+        _add(deltas, (month, employment_type, previous, band), measures, -1)
+        _add(deltas, (month, employment_type, status, band), measures, 1)
+    apply_deltas(deltas)
+
+
+def band_expression():
+    return Case(
+        *(When(monthly_income__gte=edge, then=Value(band)) for edge, band in reversed(INCOME_BANDS[1:])),
+        default=Value(INCOME_BANDS[0][1]),
+    )
+
+
+def stored():
+    return {
+        tuple(row[:4]): tuple(row[4:])
+        for row in PortfolioRollup.objects.filter(applications__gt=0)
+        .values_list(*GROUP_FIELDS, 'applications', 'total_amount', 'total_income')
+    }
+
+
+def rebuild():
+    """Replace every rollup row with a fresh aggregate; returns the number of groups."""
+    with transaction.atomic():
+        groups = aggregate_groups(LoanApplication.objects.all())
+        PortfolioRollup.objects.all().delete()
+        PortfolioRollup.objects.bulk_create(
+            PortfolioRollup(**dict(zip(GROUP_FIELDS, group)), applications=count, total_amount=amount,
+                            total_income=income)
+            for group, (count, amount, income) in groups.items()
+        )
+    return len(groups)
+
+
+def drift():
+    """``[(group, stored, actual)]`` for every group where the rollups disagree with the applications."""
+    expected, actual = aggregate_groups(LoanApplication.objects.all()), stored()
+    return [
+        (group, actual.get(group), expected.get(group))
+        for group in sorted(expected.keys() | actual.keys())
+        if actual.get(group) != expected.get(group)
+    ]
+
+
+def _rate(approved, decided):
+    return round(approved / decided, 4) if decided else None
+
+
+def _new_group():
+    return {'applications': 0, 'approved': 0, 'rejected': 0, 'pending': 0,
+            'amount': Decimal(0), 'exposure': Decimal(0), 'income': Decimal(0)}
+
+
+def _payload(group):
+    return {
+        'applications': group['applications'],
+        'approved': group['approved'],
+        'rejected': group['rejected'],
+        'pending': group['pending'],
+        'approvalRate': _rate(group['approved'], group['approved'] + group['rejected']),
+        'totalAmount': group['amount'],
+        'exposure': group['exposure'],
+        'averageIncome': (group['income'] / group['applications']).quantize(Decimal('0.01'))
+        if group['applications'] else None,
+    }
+
+
+def summarize(rows):
+    """
+    The ``portfolio_summary`` payload for ``(month, employment_type,
+    status, income_band, applications, total_amount, total_income)`` rows
+    in month order, folded in a single pass.
+    """
+    totals, by_type, by_month = _new_group(), defaultdict(_new_group), defaultdict(_new_group)
+    bands = dict.fromkeys((band for _, band in INCOME_BANDS), 0)
+    for month, employment_type, status, band, count, amount, income in rows:
+        bands[band] += count
+        for group in (totals, by_type[employment_type], by_month[month]):
+            group['applications'] += count
+            group[status] += count
+            group['amount'] += amount
+            group['income'] += income
+            if status == 'approved':
+                group['exposure'] += amount
+    return {
+        'totals': _payload(totals) if totals['applications'] else None,
+        'byEmploymentType': {name: _payload(group) for name, group in by_type.items()},
+        'byMonth': [{'month': f'{month:%Y-%m}', **_payload(group)} for month, group in by_month.items()],
+        'byStatus': {status: totals[status] for status, _ in LoanApplication.STATUS_CHOICES},
+        'incomeDistribution': [{'band': band, 'applications': count} for band, count in bands.items()],
+    }
+
+
+def portfolio_summary(since=None, until=None, employment_type=None):
+    """
+    Approval rate, exposure (approved amount) and income mix by employment
+    type, month and status, read from the rollups only. ``since``/``until``
+    are inclusive months given as dates.
+    """
+    queryset = PortfolioRollup.objects.filter(applications__gt=0)
+    if since:
+        queryset = queryset.filter(month__gte=since.replace(day=1))
+    if until:
+        queryset = queryset.filter(month__lte=until.replace(day=1))
+    if employment_type:
+        queryset = queryset.filter(employment_type=employment_type)
+    return summarize(
+        queryset.order_by(*GROUP_FIELDS).values_list(*GROUP_FIELDS, 'applications', 'total_amount', 'total_income')
+    )
+
+
+def parse_month(value):
+    """``date`` for ``YYYY-MM``; raises ``ValueError``."""
+    year, month = value.split('-')
+    return date(int(year), int(month), 1)
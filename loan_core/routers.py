@@ -0,0 +1,159 @@
+"""
+Read-replica routing.
+
+Views wrapped in ``replica_reads`` send their reads to one of the aliases in
+``settings.DATABASE_REPLICAS``; everything else, every write and any read
+inside a transaction stays on ``default``. Two things keep a user from
+reading their own writes back stale:
+
+* ``replica_pin_middleware`` sets a short-lived cookie on every unsafe
+  request (POST, PUT, ...); while it is present the browser's reads go to
+  the primary. ``DATABASE_REPLICA_STICKY_SECONDS`` should comfortably exceed
+  the lag a replica is allowed to have.
+* Each replica's lag is measured at most every
+  ``DATABASE_REPLICA_LAG_CHECK_INTERVAL`` seconds per process; replicas more
+  than ``DATABASE_REPLICA_MAX_LAG`` seconds behind (or unreachable) are
+  skipped until they catch up.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+import logging
+import random
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.utils.decorators import sync_and_async_middleware
+
+logger = logging.getLogger(__name__)
+
+PIN_COOKIE = 'primary_pin'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+_use_replica = ContextVar('use_replica', default=False)
+
+# alias -> (checked at, lag in seconds or None when unreachable)
+_lag_checks = {}
+_lag_lock = threading.Lock()
+
+PG_LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+
+def measure_lag(alias):
+    """Seconds ``alias`` is behind its primary; 0 for backends that cannot tell."""
+    connection = connections[alias]
+    if connection.vendor != 'postgresql':
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(PG_LAG_SQL)
+        return float(cursor.fetchone()[0])
+
+
+def replica_lag(alias):
+    """Cached ``measure_lag``; ``None`` when the replica could not be reached."""
+    interval = getattr(settings, 'DATABASE_REPLICA_LAG_CHECK_INTERVAL', 5)
+    now = time.monotonic()
+    checked = _lag_checks.get(alias)
+    if checked and now - checked[0] < interval:
+        return checked[1]
+    with _lag_lock:
+        try:
+            lag = measure_lag(alias)
+        except DatabaseError:
+            logger.warning("Replica %s is unreachable", alias, exc_info=True)
+            lag = None
+        _lag_checks[alias] = (now, lag)
+    return lag
+
+
+def healthy_replicas():
+    max_lag = getattr(settings, 'DATABASE_REPLICA_MAX_LAG', 2)
+    return [
+        alias for alias in getattr(settings, 'DATABASE_REPLICAS', [])
+        if (lag := replica_lag(alias)) is not None and lag <= max_lag
+    ]
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not _use_replica.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        replicas = healthy_replicas()
+        return random.choice(replicas) if replicas else None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        databases = {DEFAULT_DB_ALIAS, *getattr(settings, 'DATABASE_REPLICAS', [])}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+def replica_reads(view):
+    """
+    Let the wrapped (sync or async) view read from a replica unless the
+    request carries the primary pin cookie. Put it below ``login_required``
+    so the session and user are still loaded from the primary: a replica
+    may not have the session of a login made a moment ago.
+    """
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            token = _use_replica.set(PIN_COOKIE not in request.COOKIES)
+            try:
+                return await view(request, *args, **kwargs)
+            finally:
+                _use_replica.reset(token)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        token = _use_replica.set(PIN_COOKIE not in request.COOKIES)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _use_replica.reset(token)
+    return wrapper
+
+
+@contextmanager
+def primary_reads():
+    """Read from the primary inside the block, even under ``replica_reads``."""
+    token = _use_replica.set(False)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+def _pin(request, response):
+    if request.method not in SAFE_METHODS and getattr(settings, 'DATABASE_REPLICAS', None):
+        response.set_cookie(
+            PIN_COOKIE, '1', max_age=getattr(settings, 'DATABASE_REPLICA_STICKY_SECONDS', 10),
+            httponly=True, samesite='Lax',
+        )
+    return response
+
+
+@sync_and_async_middleware
+def replica_pin_middleware(get_response):
+    """Pin the client to the primary for a while after any unsafe request."""
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            return _pin(request, await get_response(request))
+        markcoroutinefunction(middleware)
+    else:
+        def middleware(request):
+            return _pin(request, get_response(request))
+    return middleware
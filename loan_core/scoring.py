@@ -0,0 +1,223 @@
+"""
+Risk scoring rules for loan applications.
+
+``calculate_risk_score`` scores a single application and is what the views
+use. ``score_arrays`` applies the very same rules to whole columns at once
+and ``iter_scored_chunks`` streams applications out of the database in
+chunks and scores each chunk in one go, fanning out to a process pool when
+the table is large. Both paths read the rule tables below so they cannot
+drift apart.
+"""
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+import os
+
+import numpy as np
+
+BASE_SCORE = 50
+EMPLOYMENT_SCORES = {'employed': 20, 'self-employed': 15, 'unemployed': -10, 'retired': 5}
+# (monthly income strictly above, points), checked top-down
+INCOME_BANDS = ((500000, 15), (200000, 10), (100000, 5))
+LOW_INCOME_THRESHOLD = 50000
+LOW_INCOME_POINTS = -10
+# (income-to-amount ratio strictly above, points), checked top-down
+RATIO_BANDS = ((5, -20), (3, -10), (1, -5))
+LOW_RATIO_POINTS = 5
+EXISTING_DEBT_POINTS = -15
+MIN_SCORE, MAX_SCORE = 1, 100
+
+# (minimum risk score, tier, label), checked top-down. The products offered
+# for a score come from the LoanProduct catalog, see ``products.py``.
+RECOMMENDATION_TIERS = (
+    (80, 'personal', "Personal Loan (Low Interest Rate)"),
+    (65, 'small-business', "Small Business Loan"),
+    (50, 'emergency', "Emergency Loan"),
+    (35, 'micro', "Micro Loan (20-25%)"),
+    (MIN_SCORE, 'basic-micro', "Basic Micro Loan"),
+)
+TIER_CHOICES = [(tier, label) for _, tier, label in RECOMMENDATION_TIERS]
+# Ascending thresholds/tiers for np.searchsorted in ``score_tiers``.
+_TIER_THRESHOLDS = np.array([minimum for minimum, _, _ in RECOMMENDATION_TIERS[-2::-1]])
+_TIERS_ASCENDING = np.array([tier for _, tier, _ in RECOMMENDATION_TIERS[::-1]])
+
+SCORING_FIELDS = ('pk', 'employment_type', 'monthly_income', 'amount', 'existing_debt')
+DEFAULT_CHUNK_SIZE = 20000
+# Below this many rows the pool start-up costs more than it saves.
+PARALLEL_THRESHOLD = 200000
+
+
+def calculate_risk_score(application):
+    if not application:
+        return 0
+
+    score = BASE_SCORE
+    score += EMPLOYMENT_SCORES.get(application.employment_type, 0)
+
+    inc = application.monthly_income or 0
+    for threshold, points in INCOME_BANDS:
+        if inc > threshold:
+            score += points
+            break
+    else:
+        if inc < LOW_INCOME_THRESHOLD:
+            score += LOW_INCOME_POINTS
+
+    amt = application.amount or 0
+    ratio = inc / amt if inc and amt else 0
+    for threshold, points in RATIO_BANDS:
+        if ratio > threshold:
+            score += points
+            break
+    else:
+        score += LOW_RATIO_POINTS
+
+    if application.existing_debt:
+        score += EXISTING_DEBT_POINTS
+
+    return max(MIN_SCORE, min(MAX_SCORE, score))
+
+
+def recommendation_tier(risk_score):
+    for minimum, tier, _ in RECOMMENDATION_TIERS:
+        if risk_score >= minimum:
+            return tier
+    return RECOMMENDATION_TIERS[-1][1]
+
+
+def score_tiers(scores):
+    """Vectorized ``recommendation_tier`` over an array of scores."""
+    return _TIERS_ASCENDING[np.searchsorted(_TIER_THRESHOLDS, scores, side='right')]
+
+
+def to_cents(values):
+    """Convert a sequence of Decimal/None money values to an int64 array of cents."""
+    floats = np.array([0 if v is None else v for v in values], dtype=np.float64)
+    return np.rint(floats * 100).astype(np.int64)
+
+
+def score_arrays(employment_points, income_cents, amount_cents, existing_debt):
+    """
+    Score whole columns at once.
+
+    Money is taken in integer cents so every threshold comparison is exact
+    and the result matches ``calculate_risk_score`` row for row; the ratio
+    bands are evaluated as ``income > k * amount`` rather than by dividing.
+    """
+    income_cents = np.asarray(income_cents, dtype=np.int64)
+    amount_cents = np.asarray(amount_cents, dtype=np.int64)
+
+    score = BASE_SCORE + np.asarray(employment_points, dtype=np.int64)
+
+    score += np.select(
+        [income_cents > threshold * 100 for threshold, _ in INCOME_BANDS]
+        + [income_cents < LOW_INCOME_THRESHOLD * 100],
+        [points for _, points in INCOME_BANDS] + [LOW_INCOME_POINTS],
+        default=0,
+    )
+
+    # Compare in the sign of the amount so negative amounts flip correctly.
+    sign = np.sign(amount_cents)
+    signed_income = income_cents * sign
+    abs_amount = np.abs(amount_cents)
+    has_ratio = (income_cents != 0) & (amount_cents != 0)
+    score += np.select(
+        [has_ratio & (signed_income > threshold * abs_amount) for threshold, _ in RATIO_BANDS],
+        [points for _, points in RATIO_BANDS],
+        default=LOW_RATIO_POINTS,
+    )
+
+    score += np.where(np.asarray(existing_debt, dtype=bool), EXISTING_DEBT_POINTS, 0)
+
+    return np.clip(score, MIN_SCORE, MAX_SCORE)
+
+
+def score_grid(employment_type, existing_debt, monthly_incomes, amounts):
+    """
+    Score one applicant profile over every (monthly income, amount) pair.
+
+    Returns an ``(incomes, amounts)`` array; each cell equals
+    ``calculate_risk_score`` for that variation of the profile.
+    """
+    income_cents, amount_cents = to_cents(monthly_incomes), to_cents(amounts)
+    return score_arrays(
+        np.full((len(income_cents), len(amount_cents)), EMPLOYMENT_SCORES.get(employment_type, 0)),
+        income_cents[:, None],
+        amount_cents[None, :],
+        existing_debt,
+    )
+
+
+def _columns(rows):
+    pks, employment, income, amount, debt = zip(*rows)
+    return (
+        np.array(pks, dtype=np.int64),
+        np.array([EMPLOYMENT_SCORES.get(e, 0) for e in employment], dtype=np.int64),
+        to_cents(income),
+        to_cents(amount),
+        np.array(debt, dtype=bool),
+    )
+
+
+def _score_chunk(columns):
+    pks, employment, income, amount, debt = columns
+    return pks, score_arrays(employment, income, amount, debt)
+
+
+def score_rows(rows):
+    """Score ``values_list(*SCORING_FIELDS)`` rows; returns ``(pks, scores)`` arrays."""
+    return _score_chunk(_columns(rows))
+
+
+def _chunks(queryset, chunk_size):
+    rows = queryset.order_by('pk').values_list(*SCORING_FIELDS).iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield _columns(chunk)
+
+
+def store_scores(queryset, pks, scores):
+    """
+    Write ``risk_score`` and ``recommended_tier`` for a scored chunk.
+
+    Rows are grouped by score so a chunk costs at most one UPDATE per
+    distinct score instead of one per row.
+    """
+    tiers = score_tiers(scores)
+    updated = 0
+    for score in np.unique(scores):
+        mask = scores == score
+        updated += queryset.filter(pk__in=pks[mask].tolist()).update(
+            risk_score=int(score), recommended_tier=str(tiers[mask][0]),
+        )
+    return updated
+
+
+def iter_scored_chunks(queryset, chunk_size=DEFAULT_CHUNK_SIZE, workers=None,
+                       parallel_threshold=PARALLEL_THRESHOLD):
+    """
+    Yield ``(pks, scores)`` array pairs for every application in ``queryset``.
+
+    Rows are read with a server-side cursor so memory stays bounded by
+    ``chunk_size``. When the queryset holds at least ``parallel_threshold``
+    rows and more than one worker is allowed, chunks are scored in a
+    process pool with at most two chunks in flight per worker.
+    """
+    workers = workers or os.cpu_count() or 1
+    chunks = _chunks(queryset, chunk_size)
+
+    if workers == 1 or queryset.count() < parallel_threshold:
+        for columns in chunks:
+            yield _score_chunk(columns)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for columns in chunks:
+            pending.append(pool.submit(_score_chunk, columns))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
@@ -0,0 +1,102 @@
+from django.contrib.auth.models import User
+from django.contrib.auth.signals import user_logged_out
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .backends import invalidate_cached_user
+from .caching import invalidate_dashboard
+from .events import application_event, get_broker
+from .models import DecisionTask, LoanApplication, LoanProduct
+from .products import invalidate_products
+from .rollups import record_change, record_status_moves
+
+
+def invalidate_dashboards_on_commit(user_ids):
+    # After the commit, or a request between the bump and the commit could
+    # cache the old rows under the new version.
+    transaction.on_commit(lambda: [invalidate_dashboard(user_id) for user_id in user_ids])
+
+
+@receiver([post_save, post_delete], sender=LoanApplication)
+def loan_application_changed(sender, instance, **kwargs):
+    invalidate_dashboards_on_commit([instance.user_id])
+
+
+@receiver(post_save, sender=LoanApplication)
+def publish_status_change(sender, instance, created, **kwargs):
+    if created or instance.status != getattr(instance, '_loaded_status', None):
+        user_id, event = instance.user_id, application_event(instance)
+        transaction.on_commit(lambda: get_broker().publish(user_id, event))
+    instance._loaded_status = instance.status
+
+
+@receiver(post_save, sender=LoanApplication)
+def enqueue_decision(sender, instance, created, **kwargs):
+    if created and instance.status == 'pending':
+        DecisionTask.objects.create(application=instance, enqueued_at=instance.created_at)
+
+
+@receiver(post_save, sender=LoanApplication)
+def update_portfolio_rollup(sender, instance, created, **kwargs):
+    after = instance.rollup_values()
+    before = None if created else getattr(instance, '_loaded_rollup', None)
+    # An update of an instance whose old values are unknown cannot be
+    # expressed as a delta; ``portfolio_rollups check`` reports such drift.
+    if after is not None and before != after and (created or before is not None):
+        record_change(before, after)
+    instance._loaded_rollup = after
+
+
+@receiver(post_delete, sender=LoanApplication)
+def remove_from_portfolio_rollup(sender, instance, **kwargs):
+    before = getattr(instance, '_loaded_rollup', None) or instance.rollup_values()
+    if before is not None:
+        record_change(before, None)
+
+
+@receiver([post_save, post_delete], sender=LoanProduct)
+def loan_product_changed(sender, instance, **kwargs):
+    transaction.on_commit(invalidate_products)
+
+
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, **kwargs):
+    invalidate_dashboards_on_commit([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=User)
+def forget_cached_user(sender, instance, **kwargs):
+    # Also runs for set_password() + save(), so the new hash is checked
+    # against every session right away.
+    invalidate_cached_user(instance.pk)
+
+
+@receiver(user_logged_out)
+def forget_logged_out_user(sender, user, **kwargs):
+    if user is not None:
+        invalidate_cached_user(user.pk)
+
+
+def bulk_status_changed(changes, previous_status='pending'):
+    """
+    Do what the model signals would have done for rows whose status was
+    changed from ``previous_status`` with ``QuerySet.update()``. ``changes``
+    holds one ``{'user_id', 'application', 'status', 'riskScore',
+    'recommendedTier'}`` dict per row. Call it in the updating transaction.
+    """
+    changes = list(changes)
+    events, moved = [], {}
+    invalidate_dashboards_on_commit({change['user_id'] for change in changes})
+    for change in changes:
+        user_id = change['user_id']
+        events.append((user_id, {'type': 'status', **{k: v for k, v in change.items() if k != 'user_id'}}))
+        moved.setdefault(change['status'], []).append(change['application'])
+    for status, pks in moved.items():
+        record_status_moves(pks, previous_status, status)
+
+    def publish():
+        broker = get_broker()
+        for user_id, event in events:
+            broker.publish(user_id, event)
+    transaction.on_commit(publish)
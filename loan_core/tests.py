@@ -1,3 +1,1451 @@
-from django.test import TestCase
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import csv
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+import gzip
+import io
+import json
+import os
+import pstats
+import random
+from io import StringIO
+from importlib import import_module
+from itertools import product
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import numpy as np
+from asgiref.sync import async_to_sync, sync_to_async
+from django.apps import apps
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
+from django.contrib.auth import authenticate
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, connection, connections, transaction
+from django.db.models import F
+from django.template import Template as EngineTemplate, TemplateDoesNotExist, engines
+from django.template.backends.django import Template as DjangoBackendTemplate
+from django.test import (
+    AsyncClient, Client, RequestFactory, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .backends import EmailBackend
+from .benchmarks import ROUTES, compare_results, count_queries, route_client, route_users
+from .dbpool import pool_stats
+from .decisions import bulk_decide, process_batch, queue_stats
+from .events import get_broker
+from .exports import EXPORT_COLUMNS, aiter_blocks, export_stream
+from .idempotency import DatabaseIdempotencyStore, LocalIdempotencyStore
+from .instrumentation import Histogram, render_metrics, request_metrics
+from .profiling import ProfileStore, make_token, valid_token
+from . import amortization, idempotency, imports, rollups, routers
+from .admin import LoanApplicationAdmin
+from .amortization import CENT, ScheduleCache, compute_schedules, decimal_schedule, get_schedule
+from .models import DecisionTask, IdempotencyKey, LoanApplication, LoanProduct, PortfolioRollup
+from .products import Product, ProductIndex, get_product_index, invalidate_products
+from .scoring import calculate_risk_score, iter_scored_chunks, recommendation_tier
+from .throttling import CacheBucketStore, LocalBucketStore, get_throttle
+from .views import realtime_data
+
+
+LOAN_FORM_DATA = {
+    'employment_type': 'full-time', 'monthly_income': '250000', 'amount': '400000',
+    'duration': 12, 'total_savings': '0', 'existing_debt': 'False',
+}
+
+
+def make_application(user, **overrides):
+    fields = {
+        'user': user,
+        'employment_type': 'full-time',
+        'monthly_income': Decimal('150000.00'),
+        'amount': Decimal('500000.00'),
+        'duration': 12,
+    }
+    fields.update(overrides)
+    return LoanApplication.objects.create(**fields)
+
+
+class BatchScoringParityTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('parity@example.com', 'parity@example.com', 'pw')
+
+    def test_batch_scores_match_per_row_scores(self):
+        # Values sit on and either side of every income and ratio threshold.
+        incomes = ['0', '49999.99', '50000', '100000', '100000.01', '200000.01',
+                   '500000', '500000.01', '1000000']
+        amounts = ['0', '0.01', '100000', '200000', '333333.33', '1000000', '-50000']
+        employment = ['employed', 'full-time', 'self-employed', 'unemployed', 'retired']
+        for inc, amt, emp, debt in product(incomes, amounts, employment, (False, True)):
+            make_application(self.user, monthly_income=Decimal(inc), amount=Decimal(amt),
+                             employment_type=emp, existing_debt=debt, status='approved')
+
+        expected = {a.pk: calculate_risk_score(a) for a in LoanApplication.objects.all()}
+        for workers, threshold in ((1, 0), (2, 0)):
+            batch = {}
+            for pks, scores in iter_scored_chunks(LoanApplication.objects.all(), chunk_size=97,
+                                                  workers=workers, parallel_threshold=threshold):
+                batch.update(zip(pks.tolist(), scores.tolist()))
+            self.assertEqual(batch, expected)
+
+
+class StoredScoreTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('stored@example.com', 'stored@example.com', 'pw')
+
+    def test_save_stores_score_and_tier(self):
+        app = make_application(self.user, monthly_income=Decimal('600000'), amount=Decimal('1000000'),
+                               employment_type='employed')
+        self.assertEqual(app.risk_score, calculate_risk_score(app))
+        self.assertEqual(app.recommended_tier, recommendation_tier(app.risk_score))
+
+    def test_submit_loan_api_stores_score(self):
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('submit_loan_api'), LOAN_FORM_DATA)
+        self.assertEqual(response.status_code, 200)
+        app = LoanApplication.objects.get(user=self.user)
+        self.assertEqual(app.risk_score, calculate_risk_score(app))
+
+    def test_realtime_data_reads_stored_score(self):
+        app = make_application(self.user)
+        LoanApplication.objects.filter(pk=app.pk).update(risk_score=42)
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('realtime_data')).json()['creditScore'], 42)
+
+    def test_rescore_command_refreshes_stored_scores(self):
+        app = make_application(self.user)
+        LoanApplication.objects.filter(pk=app.pk).update(risk_score=None, recommended_tier=None)
+        call_command('rescore_applications', workers=1, stdout=StringIO())
+        app.refresh_from_db()
+        self.assertEqual(app.risk_score, calculate_risk_score(app))
+        self.assertEqual(app.recommended_tier, recommendation_tier(app.risk_score))
+
+
+class RealtimeDataCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('cache@example.com', 'cache@example.com', 'pw')
+        self.factory = RequestFactory()
+
+    def get(self, **headers):
+        request = self.factory.get(reverse('realtime_data'), headers=headers)
+        request.user = self.user
+        request.auser = sync_to_async(lambda: self.user)
+        return async_to_sync(realtime_data)(request)
+
+    def test_cache_hit_runs_no_queries(self):
+        first = self.get()
+        with self.assertNumQueries(0):
+            second = self.get()
+        self.assertEqual(first.content, second.content)
+
+    def test_conditional_request_returns_304(self):
+        first = self.get()
+        self.assertEqual(self.get(if_none_match=first['ETag']).status_code, 304)
+        self.assertEqual(self.get(if_modified_since=first['Last-Modified']).status_code, 304)
+
+    def test_application_change_invalidates_payload(self):
+        first = self.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            app = make_application(self.user)
+        second = self.get(if_none_match=first['ETag'])
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(json.loads(second.content)['loanStatus'], 'pending')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            app.status = 'approved'
+            app.save()
+        self.assertEqual(json.loads(self.get().content)['loanStatus'], 'approved')
+
+    def test_profile_change_invalidates_payload(self):
+        self.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.first_name = 'Ada'
+            self.user.save()
+        self.assertEqual(json.loads(self.get().content)['firstName'], 'Ada')
+
+    def test_invalidation_waits_for_commit(self):
+        first = self.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            make_application(self.user)
+            # Still uncommitted: the cached payload stays addressed, and
+            # nothing can be cached under the version the commit will use.
+            self.assertEqual(self.get().content, first.content)
+        self.assertEqual(json.loads(self.get().content)['loanStatus'], 'pending')
+
+
+class LoanEventsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('events@example.com', 'events@example.com', 'pw')
+        self.application = make_application(self.user)
+
+    def test_status_change_publishes_event(self):
+        broker = get_broker()
+        with mock.patch.object(broker, 'publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                app = LoanApplication.objects.get(pk=self.application.pk)
+                app.save()
+            publish.assert_not_called()
+            with self.captureOnCommitCallbacks(execute=True):
+                app.status = 'approved'
+                app.save()
+        publish.assert_called_once()
+        self.assertEqual(publish.call_args.args[1]['status'], 'approved')
+
+    async def test_stream_sends_snapshot_events_and_heartbeats(self):
+        await self.async_client.aforce_login(self.user)
+        with self.settings(SSE_HEARTBEAT_SECONDS=0.05):
+            response = await self.async_client.get(reverse('loan_events'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+
+        self.assertIn(b'"status": "pending"', await anext(stream))
+        get_broker().publish(self.user.pk, {'type': 'status', 'status': 'approved'})
+        self.assertIn(b'"status": "approved"', await anext(stream))
+        self.assertEqual(await anext(stream), b': heartbeat\n\n')
+
+        # A client disconnect cancels the task that is reading the stream.
+        count = get_broker().subscriber_count()
+        reader = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0)
+        reader.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await reader
+        self.assertEqual(get_broker().subscriber_count(), count - 1)
+
+
+class AsyncReadEndpointTests(TestCase):
+    async def test_check_application_status_over_async_client(self):
+        user = await User.objects.acreate_user('async@example.com', 'async@example.com', 'pw')
+        await self.async_client.aforce_login(user)
+        response = await self.async_client.get(reverse('check_application_status'))
+        self.assertEqual(response.json(), {'already_applied': False})
+
+        await sync_to_async(make_application)(user)
+        response = await self.async_client.get(reverse('check_application_status'))
+        self.assertEqual(response.json(), {'already_applied': True})
+        response = await self.async_client.get(reverse('realtime_data'))
+        self.assertEqual(response.json()['loanStatus'], 'pending')
+
+
+@skipUnlessDBFeature('test_db_allows_multiple_connections')
+class ConcurrentSubmitTests(TransactionTestCase):
+    def test_parallel_submits_create_one_pending_application(self):
+        user = User.objects.create_user('race@example.com', 'race@example.com', 'pw')
+        workers = 8
+        barrier = threading.Barrier(workers)
+
+        def submit():
+            client = Client()
+            client.force_login(user)
+            barrier.wait()
+            try:
+                return client.post(reverse('submit_loan_api'), LOAN_FORM_DATA).status_code
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(workers) as pool:
+            statuses = list(pool.map(lambda _: submit(), range(workers)))
+
+        self.assertEqual(sorted(statuses), [200] + [400] * (workers - 1))
+        self.assertEqual(LoanApplication.objects.filter(user=user, status='pending').count(), 1)
+
+    def test_parallel_retries_with_one_key_never_store_a_failure(self):
+        user = User.objects.create_user('retry-race@example.com', 'retry-race@example.com', 'pw')
+        store = DatabaseIdempotencyStore()
+        workers = 8
+        barrier = threading.Barrier(workers)
+
+        def submit():
+            client = Client()
+            client.force_login(user)
+            barrier.wait()
+            try:
+                return client.post(reverse('submit_loan_api'), LOAN_FORM_DATA,
+                                   headers={'Idempotency-Key': 'same'}).status_code
+            finally:
+                connection.close()
+
+        with mock.patch('loan_core.idempotency.get_store', return_value=store), ThreadPoolExecutor(workers) as pool:
+            statuses = list(pool.map(lambda _: submit(), range(workers)))
+
+        self.assertEqual(set(statuses) - {409}, {200})
+        self.assertEqual(IdempotencyKey.objects.get(user=user, key='same').status_code, 200)
+        self.assertEqual(LoanApplication.objects.filter(user=user).count(), 1)
+
+
+class IdempotencyKeyTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('retry@example.com', 'retry@example.com', 'pw')
+        self.client.force_login(self.user)
+
+    def submit(self, key):
+        return self.client.post(reverse('submit_loan_api'), LOAN_FORM_DATA, headers={'Idempotency-Key': key})
+
+    def assert_replays(self, store):
+        with mock.patch('loan_core.idempotency.get_store', return_value=store):
+            first = self.submit('abc')
+            with CaptureQueriesContext(connection) as queries:
+                retry = self.submit('abc')
+            self.assertFalse([q for q in queries if LoanApplication._meta.db_table in q['sql']])
+            self.assertEqual(retry.status_code, first.status_code)
+            self.assertEqual(retry.content, first.content)
+            self.assertEqual(retry['Idempotent-Replayed'], 'true')
+            self.assertEqual(self.submit('other').status_code, 400)
+        self.assertEqual(LoanApplication.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(store.stats(), {'hits': 1, 'misses': 2, 'stored': 2, 'in_flight': 0, 'mismatched': 0})
+
+    def test_local_store_replays_response(self):
+        self.assert_replays(LocalIdempotencyStore())
+
+    def test_database_store_replays_response(self):
+        self.assert_replays(DatabaseIdempotencyStore())
+
+    def assert_guards_key(self, store):
+        with mock.patch('loan_core.idempotency.get_store', return_value=store):
+            # Another request holding the key is still running.
+            request = RequestFactory().post(reverse('submit_loan_api'), LOAN_FORM_DATA)
+            self.assertIsNone(store.reserve(self.user.pk, 'k', idempotency.fingerprint(request)))
+            busy = self.submit('k')
+            self.assertEqual(busy.status_code, 409)
+            self.assertFalse(LoanApplication.objects.exists())
+
+            # The owner finishes; its response is kept even if a loser tries to store its own.
+            store.complete(self.user.pk, 'k', 200, 'application/json', b'{"status": "success"}')
+            store.complete(self.user.pk, 'k', 400, 'application/json', b'{"status": "error"}')
+            replay = self.submit('k')
+            self.assertEqual((replay.status_code, replay.content), (200, b'{"status": "success"}'))
+
+            # Same key, different payload.
+            other = self.client.post(reverse('submit_loan_api'), {**LOAN_FORM_DATA, 'amount': '1234'},
+                                     headers={'Idempotency-Key': 'k'})
+            self.assertEqual(other.status_code, 422)
+        self.assertEqual(store.stats(), {'hits': 1, 'misses': 0, 'stored': 0, 'in_flight': 1, 'mismatched': 1})
+
+    def test_local_store_guards_key_in_flight(self):
+        self.assert_guards_key(LocalIdempotencyStore())
+
+    def test_database_store_guards_key_in_flight(self):
+        self.assert_guards_key(DatabaseIdempotencyStore())
+
+    def test_abandoned_reservation_is_taken_over(self):
+        store = DatabaseIdempotencyStore(lock_timeout=30)
+        self.assertIsNone(store.reserve(self.user.pk, 'k', 'a'))
+        self.assertEqual(store.reserve(self.user.pk, 'k', 'a'), ('a', None))
+        IdempotencyKey.objects.update(created_at=timezone.now() - timedelta(seconds=31))
+        self.assertIsNone(store.reserve(self.user.pk, 'k', 'a'))
+
+    def test_server_error_releases_key(self):
+        store = LocalIdempotencyStore()
+        with mock.patch('loan_core.idempotency.get_store', return_value=store), \
+                mock.patch('loan_core.views.LoanApplicationForm', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.submit('k')
+        self.assertIsNone(store.reserve(self.user.pk, 'k', 'x'))
+
+    def test_counters_on_metrics(self):
+        store = LocalIdempotencyStore()
+        with mock.patch('loan_core.idempotency.get_store', return_value=store):
+            self.submit('abc')
+            self.submit('abc')
+            self.assertIn('loan_idempotency_requests_total{outcome="hits"} 1', render_metrics())
+
+    def test_local_store_evicts_least_recently_used(self):
+        store = LocalIdempotencyStore(max_entries=2)
+        for key in ('a', 'b'):
+            store.reserve(1, key, key)
+            store.complete(1, key, 200, 'application/json', key.encode())
+        store.reserve(1, 'a', 'a')
+        store.reserve(1, 'c', 'c')
+        self.assertEqual(store.reserve(1, 'a', 'a'), ('a', (200, 'application/json', b'a')))
+        self.assertIsNone(store.reserve(1, 'b', 'b'))
+
+
+class DecisionWorkerTests(TestCase):
+    def setUp(self):
+        self.users = [User.objects.create_user(f'decide{i}@example.com', f'decide{i}@example.com', 'pw')
+                      for i in range(3)]
+
+    def test_batch_decides_by_thresholds(self):
+        strong = make_application(self.users[0], employment_type='employed', monthly_income=Decimal('600000'),
+                                  amount=Decimal('1000000'))
+        middling = make_application(self.users[1])
+        weak = make_application(self.users[2], employment_type='unemployed', monthly_income=Decimal('10000'),
+                                amount=Decimal('1000'), existing_debt=True)
+        self.assertEqual(queue_stats()['depth'], 3)
+
+        with mock.patch.object(get_broker(), 'publish') as publish, \
+                self.captureOnCommitCallbacks(execute=True):
+            result = process_batch(approve_at=80, reject_below=35)
+
+        self.assertEqual((result.claimed, result.approved, result.rejected, result.held), (3, 1, 1, 1))
+        statuses = dict(LoanApplication.objects.values_list('pk', 'status'))
+        self.assertEqual(statuses, {strong.pk: 'approved', middling.pk: 'pending', weak.pk: 'rejected'})
+        self.assertEqual(publish.call_count, 2)
+        self.assertEqual(queue_stats()['depth'], 0)
+
+    def test_manually_decided_applications_are_left_alone(self):
+        app = make_application(self.users[0], employment_type='unemployed', monthly_income=Decimal('10000'))
+        app.status = 'approved'
+        app.save()
+        process_batch(approve_at=80, reject_below=35)
+        app.refresh_from_db()
+        self.assertEqual(app.status, 'approved')
+        self.assertFalse(DecisionTask.objects.exists())
+
+    def test_worker_command_drains_queue(self):
+        for user in self.users:
+            make_application(user)
+        out = StringIO()
+        call_command('run_decision_worker', once=True, batch_size=2, stdout=out, stderr=StringIO())
+        self.assertIn('processed=3', out.getvalue())
+
+    def test_worker_warns_without_shared_backends(self):
+        err = StringIO()
+        call_command('run_decision_worker', once=True, stdout=StringIO(), stderr=err)
+        self.assertIn('REDIS_URL and LOAN_EVENTS_BROKER not set', err.getvalue())
+        with mock.patch('loan_core.management.commands.run_decision_worker.shared_backends_missing',
+                        return_value=[]):
+            err = StringIO()
+            call_command('run_decision_worker', once=True, stdout=StringIO(), stderr=err)
+        self.assertEqual(err.getvalue(), '')
+
+
+@skipUnlessDBFeature('test_db_allows_multiple_connections')
+class ParallelDecisionWorkerTests(TransactionTestCase):
+    def test_workers_never_claim_the_same_task(self):
+        for i in range(60):
+            make_application(User.objects.create(username=f'queue{i}@example.com'))
+
+        def drain():
+            claimed = 0
+            try:
+                while result := process_batch(batch_size=7):
+                    if not result.claimed:
+                        return claimed
+                    claimed += result.claimed
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(4) as pool:
+            claimed = list(pool.map(lambda _: drain(), range(4)))
+        self.assertEqual(sum(claimed), 60)
+        self.assertFalse(DecisionTask.objects.exists())
+
+    def test_applications_locked_elsewhere_are_skipped(self):
+        users = [User.objects.create(username=f'held{i}@example.com') for i in range(2)]
+        held, free = (make_application(user, employment_type='unemployed', monthly_income=Decimal('10000'),
+                                       amount=Decimal('1000'), existing_debt=True) for user in users)
+        locked, release = threading.Event(), threading.Event()
+
+        def hold():
+            try:
+                with transaction.atomic():
+                    LoanApplication.objects.select_for_update().get(pk=held.pk)
+                    locked.set()
+                    release.wait(10)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(1) as pool:
+            holder = pool.submit(hold)
+            locked.wait(10)
+            with mock.patch('loan_core.decisions.bulk_status_changed') as changed:
+                result = process_batch(reject_below=35)
+            release.set()
+            holder.result()
+
+        self.assertEqual(result.rejected, 1)
+        self.assertEqual([change['application'] for change in changed.call_args.args[0]], [free.pk])
+        self.assertEqual(list(DecisionTask.objects.values_list('application_id', flat=True)), [held.pk])
+        self.assertEqual(LoanApplication.objects.get(pk=held.pk).status, 'pending')
+
+
+class BulkDecisionTests(TestCase):
+    def setUp(self):
+        self.applications = [
+            make_application(User.objects.create(username=f'bulk{i}@example.com'), amount=Decimal(amount))
+            for i, amount in enumerate(['100000', '300000', '3000000', '4000000'])
+        ]
+
+    def test_command_rejects_filtered_set_in_chunks(self):
+        out = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('bulk_decide', 'reject', min_amount=1000000, chunk_size=1, stdout=out)
+        self.assertIn('2 application(s) rejected', out.getvalue())
+        self.assertEqual(
+            list(LoanApplication.objects.order_by('amount').values_list('status', flat=True)),
+            ['pending', 'pending', 'rejected', 'rejected'],
+        )
+        self.assertEqual(DecisionTask.objects.count(), 2)
+
+    def test_admin_action_approves_selection(self):
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.client.force_login(admin)
+        selected = [str(a.pk) for a in self.applications[:3]]
+        response = self.client.post(reverse('admin:loan_core_loanapplication_changelist'), {
+            'action': 'approve_pending', '_selected_action': selected,
+        }, follow=True)
+        self.assertContains(response, '3 pending application(s) approved')
+        self.assertEqual(LoanApplication.objects.filter(status='approved').count(), 3)
+
+
+# Always estimate, so PostgreSQL swaps COUNT(*) for EXPLAIN and the number
+# of queries is the same on every backend.
+@override_settings(ADMIN_ESTIMATED_COUNT_THRESHOLD=0)
+@mock.patch.object(LoanApplicationAdmin, 'list_per_page', 10)
+class AdminChangelistTests(TestCase):
+    def setUp(self):
+        admin_user = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.client.force_login(admin_user)
+        self.url = reverse('admin:loan_core_loanapplication_changelist')
+
+    def add_applications(self, n):
+        for i in range(n):
+            make_application(User.objects.create(username=f'list{i}-{User.objects.count()}@example.com'))
+
+    def test_query_count_does_not_grow_with_rows(self):
+        # session, user, page of applications joined to users, next-page
+        # EXISTS and COUNT, whatever the table size or the page.
+        self.add_applications(15)
+        with self.assertNumQueries(5):
+            self.client.get(self.url)
+        self.add_applications(40)
+        with self.assertNumQueries(5):
+            response = self.client.get(self.url)
+        with self.assertNumQueries(5):
+            self.client.get(self.url + response.context['cl'].next_page_url)
+
+    def test_keyset_pages_cover_every_row_once(self):
+        self.add_applications(45)
+        seen, url = [], self.url
+        while url:
+            response = self.client.get(url)
+            cl = response.context['cl']
+            seen.extend(a.pk for a in cl.result_list)
+            url = cl.next_page_url and self.url + cl.next_page_url
+        self.assertEqual(len(seen), 45)
+        self.assertEqual(seen, list(LoanApplication.objects.order_by('-created_at', '-id').values_list('pk', flat=True)))
+
+    @skipUnless(connection.vendor == 'postgresql', "row estimates come from the PostgreSQL planner")
+    def test_large_results_use_planner_estimate(self):
+        self.add_applications(12)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertTrue(response.context['cl'].count_is_estimate)
+        self.assertFalse([q for q in queries if 'COUNT(' in q['sql']])
+
+    def test_bad_cursor_is_rejected(self):
+        response = self.client.get(self.url, {'cursor': 'nonsense'})
+        self.assertRedirects(response, self.url + '?e=1', fetch_redirect_response=False)
+
+
+class EmailLoginTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('Login@Example.com', 'Login@Example.com', 'secret-pw')
+
+    def test_login_is_case_insensitive_and_single_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            user = authenticate(None, email='login@example.COM', password='secret-pw')
+        self.assertEqual(user, self.user)
+        self.assertEqual(len(queries), 1)
+        self.assertIn('LOWER(', queries[0]['sql'].upper())
+
+    def test_login_view_uses_email_backend(self):
+        response = self.client.post(reverse('login'), {'email': 'LOGIN@example.com', 'password': 'secret-pw'})
+        self.assertRedirects(response, reverse('home'), fetch_redirect_response=False)
+        response = Client().post(reverse('login'), {'email': 'login@example.com', 'password': 'wrong'})
+        self.assertEqual([str(m) for m in response.context['messages']], ['Invalid login credentials'])
+
+    def test_email_is_unique_ignoring_case(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            User.objects.create(username='other', email='LOGIN@EXAMPLE.COM')
+        User.objects.create(username='no-email-1')
+        User.objects.create(username='no-email-2')
+
+    def test_duplicates_stop_the_migration_until_deduplicated(self):
+        migration = import_module('loan_core.migrations.0012_auth_user_email_lower_uniq')
+        schema_editor = SimpleNamespace(connection=connection)
+        with connection.cursor() as cursor:
+            cursor.execute('DROP INDEX auth_user_email_lower_uniq')
+        older = User.objects.create(username='older', email='LOGIN@example.com')
+        with self.assertRaisesMessage(RuntimeError, f'login@example.com: user ids {self.user.pk}, {older.pk}'):
+            migration.check_duplicate_emails(apps, schema_editor)
+
+        out = StringIO()
+        call_command('dedupe_user_emails', stdout=out)
+        self.assertIn('1 shared email address(es)', out.getvalue())
+        self.assertEqual(User.objects.filter(email__iexact='login@example.com').count(), 2)
+
+        self.user.last_login = timezone.now()
+        self.user.save()
+        cache.clear()
+        with self.settings(USER_CACHE_TIMEOUT=60):
+            backend = EmailBackend()
+            self.assertEqual(backend.get_user(older.pk).email, 'LOGIN@example.com')
+            with self.captureOnCommitCallbacks(execute=True):
+                call_command('dedupe_user_emails', apply=True, stdout=StringIO())
+            self.assertEqual(backend.get_user(older.pk).email, '')
+        self.assertEqual(list(User.objects.filter(email__iexact='login@example.com')), [self.user])
+        migration.check_duplicate_emails(apps, schema_editor)
+
+
+# Each cache window admits half of these: 3 attempts per IP, 2 per email.
+@override_settings(LOGIN_THROTTLE_IP_RATE=(6, 60), LOGIN_THROTTLE_EMAIL_RATE=(4, 300))
+class CredentialThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        get_throttle.cache_clear()
+        self.addCleanup(get_throttle.cache_clear)
+        # Ten seconds into a window of either length, so no test straddles two.
+        clock = mock.patch('loan_core.throttling.time.time', return_value=(time.time() // 300 + 1) * 300 + 10)
+        clock.start()
+        self.addCleanup(clock.stop)
+
+    def post_login(self, email, ip='10.0.0.1'):
+        return self.client.post(reverse('login'), {'email': email, 'password': 'guess'}, REMOTE_ADDR=ip)
+
+    def test_ip_bucket_refuses_before_authenticate(self):
+        with mock.patch('loan_core.views.authenticate', return_value=None) as authenticate_mock:
+            statuses = [self.post_login(f'victim{i}@example.com').status_code for i in range(4)]
+        self.assertEqual(statuses, [200, 200, 200, 429])
+        self.assertEqual(authenticate_mock.call_count, 3)
+        self.assertEqual(get_throttle().stats(), {'allowed': 3, 'throttled': 1, 'fallback': 0})
+        self.assertEqual(self.post_login('victim0@example.com', ip='10.0.0.2').status_code, 200)
+
+    def test_refused_ip_leaves_email_limit_alone(self):
+        statuses = [self.post_login('victim@example.com', ip='10.0.0.1').status_code for _ in range(2)]
+        statuses += [self.post_login(f'other{i}@example.com', ip='10.0.0.1').status_code for i in range(5)]
+        self.assertEqual(statuses, [200, 200, 200, 429, 429, 429, 429])
+        self.assertEqual(self.post_login('other0@example.com', ip='10.0.0.2').status_code, 200)
+
+    def test_concurrent_attempts_never_overdraw(self):
+        def attempt(_):
+            return get_throttle().check('login', RequestFactory().post('/', REMOTE_ADDR='10.0.0.9'), '')
+
+        with ThreadPoolExecutor(8) as pool:
+            waits = list(pool.map(attempt, range(40)))
+        self.assertEqual(waits.count(None), 3)
+
+    def test_counters_on_metrics(self):
+        self.post_login('victim@example.com')
+        staff = User.objects.create_user('metrics@example.com', 'metrics@example.com', 'pw', is_staff=True)
+        self.client.force_login(staff)
+        body = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('loan_credential_throttle_requests_total{outcome="allowed"} 1', body)
+
+    def test_email_bucket_spans_ips_and_case(self):
+        self.post_login('victim@example.com', ip='10.0.0.1')
+        self.post_login('VICTIM@example.com', ip='10.0.0.2')
+        response = self.post_login('victim@EXAMPLE.com', ip='10.0.0.3')
+        self.assertEqual(response.status_code, 429)
+        # The rest of the 300-second window.
+        self.assertEqual(response['Retry-After'], '290')
+
+    def test_register_view_is_throttled(self):
+        data = {'full_name': 'Ada Lovelace', 'email': 'ada@example.com', 'password1': 'x', 'password2': 'y'}
+        statuses = [self.client.post(reverse('register'), data).status_code for _ in range(3)]
+        self.assertEqual(statuses, [200, 200, 429])
+
+    def test_falls_back_to_local_buckets_when_cache_fails(self):
+        with mock.patch.object(CacheBucketStore, 'take', side_effect=ConnectionError), \
+                self.assertLogs('loan_core.throttling', 'WARNING'):
+            statuses = [self.post_login(f'victim{i}@example.com').status_code for i in range(7)]
+        # Local token buckets start full.
+        self.assertEqual(statuses, [200] * 6 + [429])
+        # The refused seventh attempt never reaches the email limit.
+        self.assertEqual(get_throttle().stats()['fallback'], 13)
+
+    def test_burst_across_a_window_edge_stays_within_the_limit(self):
+        store = CacheBucketStore()
+        edge = (time.time() // 60 + 1) * 60
+        waits = []
+        for now in (edge - 1, edge + 1):
+            with mock.patch('loan_core.throttling.time.time', return_value=now):
+                waits += [store.take('edge', 6, 60) for _ in range(4)]
+        self.assertEqual(waits, [None, None, None, 1, None, None, None, 59])
+
+    def test_bucket_refills_over_time(self):
+        store = LocalBucketStore()
+        with mock.patch('loan_core.throttling.time.monotonic', side_effect=[0, 0, 0, 30]):
+            self.assertEqual([store.take('k', 2, 60) for _ in range(3)], [None, None, 30])
+            self.assertIsNone(store.take('k', 2, 60))
+
+
+class DbPoolStatusTests(TestCase):
+    def test_staff_only(self):
+        url = reverse('db_pool_status')
+        self.client.force_login(User.objects.create_user('user@example.com', 'user@example.com', 'pw'))
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(User.objects.create_user('staff@example.com', 'staff@example.com', 'pw', is_staff=True))
+        self.assertEqual(self.client.get(url).json()['default'], None)
+
+    def test_pool_stats_summary(self):
+        pool = mock.Mock()
+        pool.get_stats.return_value = {
+            'pool_min': 2, 'pool_max': 10, 'pool_size': 4, 'pool_available': 1, 'requests_waiting': 2,
+            'requests_num': 50, 'requests_queued': 4, 'requests_wait_ms': 30, 'requests_errors': 1,
+        }
+        with mock.patch('loan_core.dbpool.connections', {'default': SimpleNamespace(pool=pool)}):
+            stats = pool_stats()
+        self.assertEqual(
+            {key: stats[key] for key in ('size', 'in_use', 'waiting', 'queued', 'avg_wait_ms', 'timeouts')},
+            {'size': 4, 'in_use': 3, 'waiting': 2, 'queued': 4, 'avg_wait_ms': 7.5, 'timeouts': 1},
+        )
+        pool.pop_stats.assert_not_called()
+
+
+@skipUnless(settings.DATABASE_REPLICAS, "needs a replica alias in DATABASE_REPLICAS")
+class ReplicaRoutingTests(TransactionTestCase):
+    databases = {'default', *settings.DATABASE_REPLICAS}
+
+    def setUp(self):
+        cache.clear()
+        routers._lag_checks.clear()
+        self.replica = connections[settings.DATABASE_REPLICAS[0]]
+        self.user = User.objects.create_user('replica@example.com', 'replica@example.com', 'pw')
+        self.client.force_login(self.user)
+
+    def get_counting_queries(self, url):
+        with CaptureQueriesContext(connection) as primary, CaptureQueriesContext(self.replica) as replica:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [q['sql'] for q in primary], [q['sql'] for q in replica]
+
+    def test_polling_reads_go_to_replica(self):
+        for name in ('check_application_status', 'home'):
+            primary, replica = self.get_counting_queries(reverse(name))
+            self.assertTrue(any('loan_core_loanapplication' in sql for sql in replica))
+            self.assertFalse(any('loan_core_loanapplication' in sql for sql in primary))
+
+    def test_session_and_user_are_read_from_primary(self):
+        primary, replica = self.get_counting_queries(reverse('check_application_status'))
+        for table in ('django_session', 'auth_user'):
+            self.assertTrue(any(table in sql for sql in primary))
+            self.assertFalse(any(table in sql for sql in replica))
+
+    def test_reads_stick_to_primary_after_a_write(self):
+        response = self.client.post(reverse('submit_loan_api'), LOAN_FORM_DATA)
+        self.assertEqual(response.cookies[routers.PIN_COOKIE]['max-age'], settings.DATABASE_REPLICA_STICKY_SECONDS)
+        primary, replica = self.get_counting_queries(reverse('check_application_status'))
+        self.assertEqual(replica, [])
+        self.assertTrue(self.client.get(reverse('check_application_status')).json()['already_applied'])
+
+    def test_lagging_replica_is_skipped(self):
+        with mock.patch('loan_core.routers.measure_lag', return_value=settings.DATABASE_REPLICA_MAX_LAG + 1):
+            primary, replica = self.get_counting_queries(reverse('check_application_status'))
+        self.assertEqual(replica, [])
+        self.assertTrue(primary)
+
+    def test_unreachable_replica_is_skipped(self):
+        with mock.patch('loan_core.routers.measure_lag', side_effect=DatabaseError), \
+                self.assertLogs('loan_core.routers', 'WARNING'):
+            primary, replica = self.get_counting_queries(reverse('check_application_status'))
+        self.assertEqual(replica, [])
+        self.assertTrue(primary)
+
+    def test_dashboard_payload_is_built_from_primary(self):
+        make_application(self.user)
+        primary, replica = self.get_counting_queries(reverse('realtime_data'))
+        self.assertTrue(any('loan_core_loanapplication' in sql for sql in primary))
+        self.assertFalse(any('loan_core_loanapplication' in sql for sql in replica))
+
+
+class ProductIndexTests(TestCase):
+    def setUp(self):
+        # Catalog changes are rolled back after each test; look again.
+        invalidate_products()
+        self.addCleanup(invalidate_products)
+
+    def test_seeded_catalog_is_ranked_by_band(self):
+        index = get_product_index()
+        self.assertEqual([p.slug for p in index.lookup(85)],
+                         ['personal', 'small-business', 'emergency', 'micro', 'basic-micro'])
+        self.assertEqual([p.slug for p in index.lookup(40)], ['micro', 'basic-micro'])
+        self.assertEqual(index.lookup(0), ())
+        cards = index.cards(85)
+        self.assertEqual([c['recommendationLevel'] for c in cards], ['Best Match', 'Good Option', 'Basic Option'])
+        self.assertEqual([c['isBestRate'] for c in cards], [True, False, False])
+
+    def test_band_edges(self):
+        product = Product(slug='mid', name='Mid', min_score=40, max_score=60, max_amount=Decimal('1000'),
+                          interest_rate=Decimal('10'), term_months=10, processing_fee_percentage=Decimal('1'),
+                          features=(), eligibility_requirements=(), priority=0)
+        index = ProductIndex([product])
+        self.assertEqual([bool(index.lookup(score)) for score in (39, 40, 60, 61)], [False, True, True, False])
+
+    def test_catalog_change_rebuilds_index(self):
+        index = get_product_index()
+        self.assertIs(get_product_index(), index)
+        with self.captureOnCommitCallbacks(execute=True):
+            LoanProduct.objects.create(slug='gold', name='Gold', min_score=90, max_amount=9000000,
+                                       interest_rate=4, term_months=48, priority=-1)
+        self.assertEqual(get_product_index().best(95).slug, 'gold')
+        self.assertEqual(get_product_index().best(85).slug, 'personal')
+
+    def test_other_workers_see_changes_within_interval(self):
+        index = get_product_index()
+        # A change made by another worker: no signal reaches this one.
+        LoanProduct.objects.filter(slug='personal').update(is_active=False, updated_at=timezone.now())
+        with CaptureQueriesContext(connection) as queries:
+            self.assertIs(get_product_index(), index)
+        self.assertEqual(len(queries), 0)
+        with override_settings(PRODUCT_CATALOG_CHECK_INTERVAL=0):
+            self.assertEqual(get_product_index().best(85).slug, 'small-business')
+            with CaptureQueriesContext(connection) as queries:
+                rechecked = get_product_index()
+            self.assertEqual(len(queries), 1)
+        self.assertIsNone(rechecked.get('personal'))
+
+    def test_view_recommendations_queries_catalog_once(self):
+        user = User.objects.create_user('recs@example.com', 'recs@example.com', 'pw')
+        make_application(user, status='approved', monthly_income=Decimal('600000'))
+        self.client.force_login(user)
+        self.client.get(reverse('view_recommendations'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('view_recommendations'))
+        self.assertFalse(any('loan_core_loanproduct' in q['sql'] for q in queries))
+        self.assertEqual(response.context['recommendations'], get_product_index().cards(user.loanapplication_set.get().risk_score))
+        self.assertContains(response, 'Best Match')
+
+
+class AmortizationTests(TestCase):
+    def test_matches_decimal_reference(self):
+        rng = random.Random(0)
+        keys = [(Decimal('1000000.00'), Decimal('0'), 12), (Decimal('5000000.00'), Decimal('5'), 36),
+                (Decimal('99999999.99'), Decimal('29.99'), 360)]
+        keys += [(Decimal(rng.randint(100, 10**10)) / 100, Decimal(rng.randint(0, 4000)) / 100, rng.randint(1, 360))
+                 for _ in range(200)]
+        for key, schedule in zip(keys, compute_schedules([amortization._key(*key) for key in keys])):
+            payment, rows = decimal_schedule(*key)
+            self.assertLessEqual(abs(Decimal(str(schedule.payment)) - payment), CENT, key)
+            engine = np.column_stack([schedule.principal, schedule.interest, schedule.balance])
+            reference = np.array(rows, dtype=np.float64)
+            # Both sides round to kobo, so a value on a half-kobo can land one apart.
+            self.assertLessEqual(np.abs(engine - reference).max(), 0.01 + 1e-6, key)
+            self.assertEqual(schedule.balance[-1], 0)
+
+    def test_cache_computes_misses_together(self):
+        cache_ = ScheduleCache(max_entries=2)
+        with mock.patch('loan_core.amortization.compute_schedules', wraps=compute_schedules) as compute:
+            first = cache_.get_many([(1000, 10, 12), (2000, 10, 12), (1000, '10.00', 12)])
+            self.assertIs(first[0], first[2])
+            self.assertIs(cache_.get_many([(2000, 10, 12)])[0], first[1])
+        self.assertEqual(compute.call_count, 1)
+        self.assertEqual(cache_.stats(), {'hits': 1, 'misses': 2, 'size': 2})
+
+    def test_schedule_endpoint_pages(self):
+        cache.clear()
+        self.client.force_login(User.objects.create_user('sched@example.com', 'sched@example.com', 'pw'))
+        url = reverse('product_schedule', args=['personal'])
+        data = self.client.get(url, {'amount': '1200000', 'term': 30, 'page': 2, 'page_size': 12}).json()
+        self.assertEqual((data['numPages'], data['next']), (3, 3))
+        self.assertEqual([row['month'] for row in data['rows']], list(range(13, 25)))
+        last = self.client.get(url, {'amount': '1200000', 'term': 30, 'page': 3, 'page_size': 12}).json()
+        self.assertEqual((len(last['rows']), last['next'], last['rows'][-1]['balance']), (6, None, 0))
+        self.assertEqual(self.client.get(url, {'amount': '99999999'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'page': 99}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('product_schedule', args=['nope'])).status_code, 404)
+
+
+class WhatIfTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(User.objects.create_user('whatif@example.com', 'whatif@example.com', 'pw'))
+
+    def post(self, data):
+        return self.client.post(reverse('what_if_scores'), json.dumps(data), content_type='application/json')
+
+    def test_grid_matches_single_scoring(self):
+        data = {
+            'employment_type': 'self-employed', 'existing_debt': True,
+            'monthly_income': [40000, 150000, 600000],
+            'amount': {'min': 10000, 'max': 3000000, 'steps': 7},
+            'duration': [6, 24],
+        }
+        response = self.post(data)
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(len(body['cells']), 3 * 7 * 2)
+        index = get_product_index()
+        for cell in body['cells']:
+            application = SimpleNamespace(employment_type='self-employed', existing_debt=True,
+                                          monthly_income=Decimal(cell['monthly_income']), amount=Decimal(cell['amount']))
+            score = calculate_risk_score(application)
+            self.assertEqual(cell['score'], score)
+            best = index.best(score)
+            self.assertEqual(cell['product'], best.slug)
+            expected = get_schedule(cell['amount'], best.interest_rate, cell['duration']).payment
+            self.assertAlmostEqual(cell['monthlyPayment'], expected, places=2)
+        self.assertFalse(LoanApplication.objects.exists())
+
+    @override_settings(WHAT_IF_MAX_CELLS=100)
+    def test_grid_size_is_capped(self):
+        response = self.post({'employment_type': 'retired', 'monthly_income': 100000,
+                              'amount': {'min': 1000, 'max': 50000, 'steps': 20}, 'duration': [6, 12, 18, 24, 36, 48]})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('at most 100', response.json()['message'])
+
+    def test_rejects_bad_input(self):
+        for data in ({'employment_type': 'pirate', 'monthly_income': 1, 'amount': 1, 'duration': 1},
+                     {'employment_type': 'retired', 'monthly_income': -5, 'amount': 1, 'duration': 1},
+                     {'employment_type': 'retired', 'monthly_income': 1, 'amount': 1, 'duration': 1.5},
+                     {'employment_type': 'retired', 'amount': 1}):
+            self.assertEqual(self.post(data).status_code, 400, data)
+
+    def test_rejects_out_of_range_and_mistyped_values(self):
+        base = {'employment_type': 'retired', 'monthly_income': 100000, 'amount': 50000, 'duration': 12}
+        for overrides in ({'monthly_income': '1e30'},
+                          {'amount': {'min': 1, 'max': 1e30, 'steps': 3}},
+                          {'amount': {'min': 1, 'max': 2, 'steps': 1e400}},
+                          {'duration': [1e20]},
+                          {'duration': 361},
+                          {'employment_type': ['retired']},
+                          {'existing_debt': 'false'},
+                          {'existing_debt': 0}):
+            response = self.post({**base, **overrides})
+            self.assertEqual(response.status_code, 400, overrides)
+            self.assertEqual(response.json()['status'], 'error')
+        self.assertEqual(self.post({**base, 'existing_debt': False, 'duration': 360}).status_code, 200)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        for i, status in enumerate(['approved', 'rejected', 'pending']):
+            user = User.objects.create(username=f'export{i}@example.com', email=f'export{i}@example.com')
+            make_application(user, status=status)
+
+    def export(self, *args):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'out')
+            call_command('export_applications', '--output', path, *args, stderr=StringIO())
+            with open(path, 'rb') as f:
+                return f.read()
+
+    def test_csv_with_filters_and_columns(self):
+        data = self.export('--status', 'approved', '--status', 'pending', '--columns', 'id,user_email,status',
+                           '--since', timezone.localdate().isoformat())
+        rows = list(csv.reader(io.StringIO(data.decode())))
+        self.assertEqual(rows[0], ['id', 'user_email', 'status'])
+        self.assertEqual(sorted(row[1:] for row in rows[1:]),
+                         [['export0@example.com', 'approved'], ['export2@example.com', 'pending']])
+        self.assertEqual(self.export('--until', '2000-01-01').decode().splitlines(), [','.join(EXPORT_COLUMNS)])
+
+    def test_csv_neutralizes_formulas(self):
+        LoanApplication.objects.filter(status='approved').update(employer_name='=HYPERLINK("http://x")',
+                                                                 job_title='@SUM(A1)', purpose='-2+3')
+        rows = list(csv.DictReader(io.StringIO(self.export('--status', 'approved').decode())))
+        self.assertEqual([rows[0][c] for c in ('employer_name', 'job_title', 'purpose')],
+                         ["'=HYPERLINK(\"http://x\")", "'@SUM(A1)", "'-2+3"])
+        [line] = self.export('--format', 'jsonl', '--status', 'approved').decode().splitlines()
+        self.assertEqual(json.loads(line)['employer_name'], '=HYPERLINK("http://x")')
+
+    def test_gzipped_jsonl_in_small_chunks(self):
+        data = self.export('--format', 'jsonl', '--gzip', '--chunk-size', '1')
+        lines = [json.loads(line) for line in gzip.decompress(data).decode().splitlines()]
+        self.assertEqual([line['user_email'] for line in lines], [f'export{i}@example.com' for i in range(3)])
+        self.assertEqual(set(lines[0]), set(EXPORT_COLUMNS))
+
+    def test_unknown_column(self):
+        with self.assertRaises(CommandError):
+            call_command('export_applications', '--columns', 'id,password')
+
+    def test_admin_action_streams(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        response = self.client.post(reverse('admin:loan_core_loanapplication_changelist'), {
+            'action': 'export_csv', ACTION_CHECKBOX_NAME: list(LoanApplication.objects.values_list('pk', flat=True)),
+        })
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment; filename="loan-applications-', response['Content-Disposition'])
+        self.assertEqual(len(b''.join(response.streaming_content).decode().splitlines()), 4)
+
+    def test_async_blocks_match_sync_export(self):
+        queryset = LoanApplication.objects.all()
+
+        async def collect():
+            return [block async for block in aiter_blocks(export_stream(queryset, ['id', 'status']))]
+
+        self.assertEqual(b''.join(async_to_sync(collect)()), b''.join(export_stream(queryset, ['id', 'status'])))
+
+
+class ImportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='import@example.com', email='Import@Example.com')
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def write(self, name, text):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, 'w') as f:
+            f.write(text)
+        return path
+
+    def run_import(self, path, *args):
+        out = StringIO()
+        call_command('import_applications', path, *args, stdout=out)
+        return out.getvalue()
+
+    def rejects(self, path):
+        with open(f'{path}.rejects.jsonl') as f:
+            return [json.loads(line) for line in f]
+
+    def test_csv_validation_rejects_and_scoring(self):
+        path = self.write('apps.csv', '\n'.join([
+            'user_email,employment_type,monthly_income,amount,duration,existing_debt,status,created_at',
+            'import@example.com,full-time,250000,400000,12,False,approved,2023-05-01 10:00',
+            'import@example.com,retired,90000,100000,6,True,,',
+            'import@example.com,full-time,100000,100000,12,False,pending,',
+            'nobody@example.com,full-time,100000,100000,12,False,,',
+            'import@example.com,astronaut,abc,100000,12,False,,',
+        ]) + '\n')
+        output = self.run_import(path, '--chunk-size', '2')
+        self.assertIn('Imported 2 of 5 application(s)', output)
+
+        approved, pending = LoanApplication.objects.filter(user=self.user).order_by('pk')
+        self.assertEqual((approved.status, approved.created_at.year), ('approved', 2023))
+        for application in (approved, pending):
+            self.assertEqual(application.risk_score, calculate_risk_score(application))
+        self.assertEqual(pending.status, 'pending')
+        self.assertFalse(DecisionTask.objects.filter(application=approved).exists())
+        self.assertTrue(DecisionTask.objects.filter(application=pending).exists())
+
+        rejects = self.rejects(path)
+        self.assertEqual([r['row'] for r in rejects], [3, 4, 5])
+        self.assertIn('status', rejects[0]['errors'])
+        self.assertIn('user_email', rejects[1]['errors'])
+        self.assertEqual(set(rejects[2]['errors']), {'employment_type', 'monthly_income'})
+
+    def test_unknown_column(self):
+        path = self.write('apps.csv', 'user_email,password\nimport@example.com,x\n')
+        with self.assertRaisesMessage(CommandError, 'Unknown column(s): password'):
+            self.run_import(path)
+
+    def test_resume_from_checkpoint(self):
+        path = self.write('apps.jsonl', ''.join(
+            json.dumps({'user_email': 'import@example.com', 'employment_type': 'full-time',
+                        'monthly_income': 100000 + i, 'amount': 50000, 'duration': 12, 'status': 'approved'}) + '\n'
+            for i in range(5)
+        ))
+        real_save, calls = imports.save_applications, []
+
+        def failing_save(applications):
+            calls.append(len(applications))
+            if len(calls) == 3:
+                raise DatabaseError('connection lost')
+            return real_save(applications)
+
+        with mock.patch.object(imports, 'save_applications', failing_save):
+            with self.assertRaises(DatabaseError):
+                self.run_import(path, '--chunk-size', '2')
+        self.assertEqual(LoanApplication.objects.count(), 4)
+
+        output = self.run_import(path, '--chunk-size', '2', '--resume')
+        self.assertIn('Resumed after 4 record(s)', output)
+        self.assertEqual(sorted(LoanApplication.objects.values_list('monthly_income', flat=True)),
+                         [Decimal(100000 + i) for i in range(5)])
+
+    def test_export_round_trip_with_workers(self):
+        for status in ('approved', 'rejected', 'pending'):
+            make_application(self.user, status=status, purpose=f'{status}, "quoted"\nline')
+        fields = ('status', 'purpose', 'amount', 'risk_score', 'recommended_tier', 'created_at')
+        # JSON timestamps carry milliseconds.
+        expected = [(*row[:-1], row[-1].replace(microsecond=row[-1].microsecond // 1000 * 1000))
+                    for row in LoanApplication.objects.order_by('pk').values_list(*fields)]
+        path = os.path.join(self.tmp.name, 'apps.jsonl.gz')
+        call_command('export_applications', '--format', 'jsonl', '--gzip', '--output', path, stderr=StringIO())
+        LoanApplication.objects.all().delete()
+
+        self.run_import(path, '--workers', '2', '--chunk-size', '1')
+        self.assertEqual(list(LoanApplication.objects.order_by('pk').values_list(*fields)), expected)
+        self.assertEqual(self.rejects(path), [])
+
+
+class ProvisioningTests(TestCase):
+    def setUp(self):
+        User.objects.create(username='taken@example.com', email='Taken@Example.com')
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def provision(self, text, *args, name='users.csv'):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, 'w') as f:
+            f.write(text)
+        out = StringIO()
+        call_command('provision_users', path, *args, stdout=out)
+        with open(f'{path}.rejects.jsonl') as f:
+            return out.getvalue(), [json.loads(line) for line in f]
+
+    def test_creates_skips_and_rejects(self):
+        output, rejects = self.provision('\n'.join([
+            'full_name,email,password',
+            'Ada Lovelace King,ada@example.com,s3cret-Pass',
+            'Grace,grace@example.com,unusable',
+            'Someone,taken@EXAMPLE.com,s0me-Pass',
+            'Ada Again,ADA@example.com,other-Pass',
+            'Broken,not-an-email,hunter2',
+            'Weak Password,weak@example.com,12345678',
+            'Kate Johnson,kate.johnson@example.com,katejohnson',
+        ]) + '\n', '--workers', '1', '--chunk-size', '2')
+        self.assertIn('Created 2 user(s), skipped 1 existing', output)
+
+        ada = User.objects.get(username='ada@example.com')
+        self.assertEqual((ada.first_name, ada.last_name, ada.email), ('Ada', 'Lovelace King', 'ada@example.com'))
+        self.assertEqual(authenticate(email='ada@example.com', password='s3cret-Pass'), ada)
+        self.assertFalse(User.objects.get(username='grace@example.com').has_usable_password())
+
+        self.assertEqual([(r['row'], list(r['errors'])) for r in rejects],
+                         [(4, ['email']), (5, ['email']), (6, ['password']), (7, ['password'])])
+        self.assertIn('This password is entirely numeric.', rejects[2]['errors']['password'])
+        self.assertIn('The password is too similar to the username.', rejects[3]['errors']['password'])
+        self.assertNotIn('12345678', json.dumps(rejects))
+        self.assertFalse(User.objects.filter(username__in=['weak@example.com', 'kate.johnson@example.com']))
+
+    def test_hashes_in_a_process_pool(self):
+        lines = ''.join(json.dumps({'full_name': f'User {i}', 'email': f'pool{i}@example.com',
+                                    'password': f'pass-{i}-word'}) + '\n' for i in range(3))
+        output, rejects = self.provision(lines, '--workers', '2', name='users.jsonl')
+        self.assertIn('Created 3 user(s)', output)
+        for i in range(3):
+            self.assertTrue(User.objects.get(username=f'pool{i}@example.com').check_password(f'pass-{i}-word'))
+
+    def test_missing_columns(self):
+        with self.assertRaisesMessage(CommandError, 'needs full_name'):
+            self.provision('email,password\na@example.com,x\n')
+
+
+class PortfolioRollupTests(TestCase):
+    def setUp(self):
+        self.users = [User.objects.create(username=f'rollup{i}@example.com', email=f'rollup{i}@example.com')
+                      for i in range(3)]
+
+    def assertNoDrift(self):
+        self.assertEqual(rollups.drift(), [])
+
+    def test_deltas_follow_every_write_path(self):
+        first = make_application(self.users[0], monthly_income=Decimal('40000'))
+        make_application(self.users[1], status='rejected', employment_type='retired')
+        self.assertNoDrift()
+
+        first.status, first.amount, first.monthly_income = 'approved', Decimal('750000'), Decimal('600000')
+        first.save()
+        self.assertNoDrift()
+        LoanApplication.objects.get(pk=first.pk).delete()
+        self.assertNoDrift()
+
+        for user in self.users:
+            make_application(user, monthly_income=Decimal('900000'))
+        bulk_decide(LoanApplication.objects.filter(user=self.users[0]), 'approved')
+        self.assertNoDrift()
+        process_batch(approve_at=0)
+        self.assertNoDrift()
+        self.assertEqual(PortfolioRollup.objects.filter(status='pending', applications__gt=0).count(), 0)
+
+    def test_bulk_import_counts_rows(self):
+        rollup_user = self.users[0]
+        imports.save_applications(imports.build_applications([
+            (1, {'user_email': rollup_user.email, 'employment_type': 'full-time', 'monthly_income': Decimal('120000'),
+                 'amount': Decimal('300000'), 'duration': 12, 'existing_debt': False, 'status': 'approved',
+                 'created_at': timezone.make_aware(datetime(2023, 5, 1))}),
+        ])[0])
+        self.assertNoDrift()
+        self.assertEqual(PortfolioRollup.objects.get(month=date(2023, 5, 1)).income_band, '100k_200k')
+
+    def test_check_and_rebuild_command(self):
+        make_application(self.users[0])
+        PortfolioRollup.objects.update(applications=F('applications') + 5)
+        with self.assertRaisesMessage(CommandError, '1 rollup group(s) drifted'):
+            call_command('portfolio_rollups', 'check', stdout=StringIO())
+        call_command('portfolio_rollups', 'check', '--fix', stdout=StringIO())
+        self.assertNoDrift()
+        PortfolioRollup.objects.all().delete()
+        call_command('portfolio_rollups', 'rebuild', stdout=StringIO())
+        self.assertNoDrift()
+
+    def test_analytics_endpoint_reads_only_rollups(self):
+        make_application(self.users[0], status='approved', amount=Decimal('200000'), monthly_income=Decimal('80000'))
+        make_application(self.users[1], status='rejected', employment_type='retired')
+        make_application(self.users[2])
+        url = reverse('portfolio_analytics')
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(User.objects.create_superuser('boss', 'boss@example.com', 'pw'))
+
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get(url).json()
+        self.assertFalse([q for q in queries if 'loan_core_loanapplication' in q['sql']])
+        self.assertEqual(data['totals']['applications'], 3)
+        self.assertEqual(data['totals']['approvalRate'], 0.5)
+        self.assertEqual(Decimal(data['totals']['exposure']), Decimal('200000'))
+        self.assertEqual(data['byStatus'], {'pending': 1, 'approved': 1, 'rejected': 1})
+        self.assertEqual(data['byEmploymentType']['retired']['approvalRate'], 0.0)
+        self.assertEqual({b['band']: b['applications'] for b in data['incomeDistribution']}['50k_100k'], 1)
+
+        month = f'{timezone.now():%Y-%m}'
+        self.assertEqual([m['month'] for m in data['byMonth']], [month])
+        self.assertEqual(self.client.get(url, {'since': '2000-01', 'until': '2000-12'}).json()['totals'], None)
+        self.assertEqual(self.client.get(url, {'employment_type': 'retired'}).json()['totals']['applications'], 1)
+        self.assertEqual(self.client.get(url, {'since': 'May'}).status_code, 400)
+
+
+class InstrumentationTests(TestCase):
+    def setUp(self):
+        request_metrics.reset()
+        self.user = User.objects.create_user('metrics@example.com', 'metrics@example.com', 'pw')
+        make_application(self.user)
+        self.client.force_login(self.user)
+
+    def timing(self, response):
+        parts = dict(part.strip().split(';', 1) for part in response['Server-Timing'].split(','))
+        return {name: dict(item.split('=', 1) for item in value.split(';')) for name, value in parts.items()}
+
+    def test_server_timing_for_sync_and_async_views(self):
+        timing = self.timing(self.client.get(reverse('home')))
+        self.assertGreater(int(timing['db']['desc'].strip('"').split()[0]), 0)
+        self.assertGreater(float(timing['tpl']['dur']), 0)
+        self.assertGreaterEqual(float(timing['total']['dur']), float(timing['db']['dur']))
+
+        # Queries an async view runs through sync_to_async are counted too.
+        timing = self.timing(self.client.get(reverse('realtime_data')))
+        self.assertGreater(int(timing['db']['desc'].strip('"').split()[0]), 0)
+        self.assertEqual(float(timing['tpl']['dur']), 0)
+
+    @override_settings(METRICS_TOKEN='scrape-me')
+    def test_metrics_endpoint(self):
+        self.client.get(reverse('home'))
+        self.client.get(reverse('home'))
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        self.assertEqual(self.client.get(reverse('metrics'), headers={'Authorization': 'Bearer nope'}).status_code,
+                         403)
+
+        response = self.client.get(reverse('metrics'), headers={'Authorization': 'Bearer scrape-me'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        text = response.content.decode()
+        self.assertIn('# TYPE loan_http_request_duration_seconds histogram', text)
+        self.assertIn('loan_http_request_duration_seconds_bucket{view="home",le="+Inf"} 2', text)
+        self.assertIn('loan_http_request_db_queries_count{view="home"} 2', text)
+        self.assertIn('loan_http_responses_total{view="home",status="200"} 2', text)
+        self.assertIn('loan_http_responses_total{view="metrics",status="403"} 2', text)
+
+    def test_timed_templates_keep_the_backend_interface(self):
+        backend = engines.all()[0]
+        template = backend.get_template('loan_core/home.html')
+        self.assertIsInstance(template, DjangoBackendTemplate)
+        self.assertIsInstance(template.template, EngineTemplate)
+        self.assertEqual(template.origin.template_name, 'loan_core/home.html')
+        with self.assertRaises(TemplateDoesNotExist) as raised:
+            backend.get_template('missing.html')
+        self.assertIs(raised.exception.backend, backend)
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = Histogram((1, 5))
+        for value in (0, 1, 3, 9):
+            histogram.observe(value)
+        self.assertEqual(histogram.cumulative(), [(1, 2), (5, 3), ('+Inf', 4)])
+
+    @override_settings(SERVER_TIMING_HEADER=False)
+    def test_header_switch_keeps_metrics(self):
+        self.assertNotIn('Server-Timing', self.client.get(reverse('home')))
+        self.assertIn('view="home"', render_metrics())
+
+    @override_settings(REQUEST_METRICS_ENABLED=False)
+    def test_off_switch(self):
+        self.assertNotIn('Server-Timing', self.client.get(reverse('home')))
+        self.assertNotIn('view="home"', render_metrics())
+        self.client.force_login(User.objects.create_superuser('root', 'root@example.com', 'pw'))
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 404)
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.user = User.objects.create_user('profile@example.com', 'profile@example.com', 'pw')
+        self.client.force_login(self.user)
+
+    def stored(self):
+        return ProfileStore(self.directory).profiles()
+
+    def test_unsampled_requests_write_nothing(self):
+        with self.settings(PROFILING_DIR=self.directory, PROFILING_SAMPLE_RATE=0):
+            response = self.client.get(reverse('home'))
+            self.client.get(reverse('home'), headers={'X-Debug-Profile': 'profile:forged:sig'})
+        self.assertNotIn('X-Debug-Profile', response)
+        self.assertEqual(self.stored(), [])
+
+    def test_signed_header_profiles_the_request(self):
+        with self.settings(PROFILING_DIR=self.directory, PROFILING_SAMPLE_RATE=0):
+            response = self.client.get(reverse('home'), headers={'X-Debug-Profile': make_token()})
+        [profile] = self.stored()
+        self.assertEqual(response['X-Debug-Profile'], os.path.basename(profile.path))
+        self.assertEqual(profile.view, 'home')
+        self.assertEqual(profile.pid, os.getpid())
+
+        with self.settings(PROFILING_DIR=self.directory, PROFILING_TOKEN_MAX_AGE=-1):
+            self.client.get(reverse('home'), headers={'X-Debug-Profile': make_token()})
+        self.assertEqual(len(self.stored()), 1)
+
+    def test_ring_keeps_newest_profiles(self):
+        with self.settings(PROFILING_DIR=self.directory, PROFILING_SAMPLE_RATE=1, PROFILING_MAX_FILES=3):
+            for _ in range(4):
+                self.client.get(reverse('home'))
+            response = self.client.get(reverse('apply_for_loan'))
+        profiles = self.stored()
+        self.assertEqual(len(profiles), 3)
+        self.assertEqual(profiles[0].view, 'apply_for_loan')
+        self.assertEqual(response['X-Debug-Profile'], os.path.basename(profiles[0].path))
+
+    def asgi_profiles(self, *names):
+        async def requests():
+            client = AsyncClient()
+            await client.aforce_login(self.user)
+            for name in names:
+                self.assertEqual((await client.get(reverse(name))).status_code, 200)
+
+        with self.settings(PROFILING_DIR=self.directory, PROFILING_SAMPLE_RATE=1):
+            async_to_sync(requests)()
+        return {p.view: {name for _, _, name in pstats.Stats(p.path).stats} for p in self.stored()}
+
+    def test_asgi_profiles_cover_the_view(self):
+        # Below the sync-only WhiteNoise the hooks run in the sync view's own
+        # thread; async views are skipped there.
+        profiles = self.asgi_profiles('home', 'realtime_data')
+        self.assertEqual(set(profiles), {'home'})
+        self.assertIn('home', profiles['home'])
+
+    def test_async_views_profiled_on_an_async_chain(self):
+        with self.settings(MIDDLEWARE=[m for m in settings.MIDDLEWARE if not m.startswith('whitenoise.')]):
+            profiles = self.asgi_profiles('home', 'realtime_data')
+        self.assertIn('home', profiles['home'])
+        self.assertIn('realtime_data', profiles['realtime_data'])
+
+    def test_profiled_requests_keep_csrf_protection(self):
+        data = {'email': 'profile@example.com', 'password': 'pw'}
+        headers = {'X-Debug-Profile': make_token()}
+        with self.settings(PROFILING_DIR=self.directory, PROFILING_SAMPLE_RATE=0):
+            response = Client(enforce_csrf_checks=True).post(reverse('login'), data, headers=headers)
+            self.assertEqual(response.status_code, 403)
+            response = async_to_sync(AsyncClient(enforce_csrf_checks=True).post)(reverse('login'), data,
+                                                                                 headers=headers)
+            self.assertEqual(response.status_code, 403)
+        self.assertEqual([p.view for p in self.stored()], ['login', 'login'])
+
+    def test_profiles_command(self):
+        with self.settings(PROFILING_DIR=self.directory, PROFILING_SAMPLE_RATE=1):
+            self.client.get(reverse('home'))
+            self.client.get(reverse('apply_for_loan'))
+        out = StringIO()
+        call_command('profiles', 'list', dir=self.directory, stdout=out)
+        self.assertIn('2 profile(s)', out.getvalue())
+
+        out = StringIO()
+        call_command('profiles', 'summary', dir=self.directory, view=['home'], stdout=out)
+        self.assertIn('1 profile(s) of home', out.getvalue())
+        self.assertIn('(home)', out.getvalue())
+
+        out = StringIO()
+        call_command('profiles', 'token', stdout=out)
+        self.assertTrue(valid_token(out.getvalue().split(': ', 1)[1].strip()))
+        with self.assertRaises(CommandError):
+            call_command('profiles', 'summary', dir=self.directory, view=['missing'])
+
+
+class RouteBudgetTests(TransactionTestCase):
+    # Outside a test transaction, as in production: the views' own
+    # atomic blocks are transactions rather than savepoints.
+    databases = {'default', *settings.DATABASE_REPLICAS}
+
+    def setUp(self):
+        cache.clear()
+        # An earlier TransactionTestCase may have flushed the seeded catalog.
+        LoanProduct.objects.get_or_create(slug='personal', defaults={
+            'name': 'Personal Loan', 'min_score': 80, 'max_amount': Decimal('5000000'),
+            'interest_rate': Decimal('5'), 'term_months': 36,
+        })
+        self.users = route_users()
+
+    def test_routes_stay_within_query_budgets(self):
+        for route in ROUTES:
+            with self.subTest(route=route.name):
+                client = route_client(route, self.users)
+                route.request(client)
+                route.reset(self.users)
+                with count_queries() as queries:
+                    response = route.request(client)
+                route.reset(self.users)
+                self.assertEqual(response.status_code, 200)
+                self.assertLessEqual(queries[0], route.budget)
+
+    def test_compare_flags_regressions_past_threshold(self):
+        baseline = [{'route': 'home', 'queries': 3, 'p50_ms': 10.0, 'req_per_sec': 100},
+                    {'route': 'metrics', 'queries': 2, 'p50_ms': 2.0, 'req_per_sec': 500}]
+        current = [{'route': 'home', 'queries': 3, 'p50_ms': 10.9, 'req_per_sec': 80},
+                   {'route': 'metrics', 'queries': 3, 'p50_ms': 1.0, 'req_per_sec': 900},
+                   {'route': 'login', 'queries': 0, 'p50_ms': 1.0, 'req_per_sec': 900}]
+        self.assertEqual(compare_results(baseline, current, threshold=10), [
+            ({'route': 'home'}, 'req_per_sec', 100, 80, -20.0),
+            ({'route': 'metrics'}, 'queries', 2, 3, 50.0),
+        ])
+
+    def test_compare_matches_cases_on_identity_fields_only(self):
+        baseline = [{'streams': 1000, 'bytes_per_stream': 900, 'fanout_ms': 10.0},
+                    {'requests': 50, 'pool': 'on', 'connections_opened': 4, 'p50_ms': 2.0}]
+        current = [{'streams': 1000, 'bytes_per_stream': 950, 'fanout_ms': 20.0},
+                   {'requests': 50, 'pool': 'on', 'connections_opened': 5, 'p50_ms': 3.0}]
+        self.assertEqual(compare_results(baseline, current, threshold=10), [
+            ({'streams': 1000}, 'fanout_ms', 10.0, 20.0, 100.0),
+            ({'requests': 50, 'pool': 'on'}, 'p50_ms', 2.0, 3.0, 50.0),
+        ])
+
+
+@override_settings(SESSION_ENGINE='django.contrib.sessions.backends.cached_db', USER_CACHE_TIMEOUT=60)
+class SessionCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('cached@example.com', 'cached@example.com', 'pw')
+        self.client.force_login(self.user)
+
+    def test_authenticated_request_skips_session_and_user_queries(self):
+        url = reverse('check_application_status')
+        # force_login already put the session in the cache.
+        with self.assertNumQueries(2):
+            self.client.get(url)  # fills the user cache
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url).json(), {'already_applied': False})
+        with override_settings(USER_CACHE_TIMEOUT=0), self.assertNumQueries(2):
+            self.client.get(url)
+
+    def test_password_change_ends_other_sessions(self):
+        url = reverse('home')
+        self.assertEqual(self.client.get(url).status_code, 200)
+        user = User.objects.get(pk=self.user.pk)
+        user.set_password('new-pw')
+        user.save()
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+    def test_logout_forgets_the_user(self):
+        self.client.get(reverse('home'))
+        self.assertIsNotNone(cache.get(f'auth:user:{self.user.pk}'))
+        self.client.logout()
+        self.assertIsNone(cache.get(f'auth:user:{self.user.pk}'))
+
+    def test_purge_sessions_deletes_expired_in_batches(self):
+        Session = self.client.session.__class__.get_model_class()
+        expired = timezone.now() - timedelta(days=1)
+        Session.objects.bulk_create(Session(session_key=f'expired{i:032}', session_data='', expire_date=expired)
+                                    for i in range(5))
+        out = StringIO()
+        call_command('purge_sessions', batch_size=2, stdout=out)
+        self.assertIn('Deleted 5 expired session(s).', out.getvalue())
+        self.assertEqual(Session.objects.count(), 1)
+        self.assertEqual(self.client.get(reverse('home')).status_code, 200)
@@ -0,0 +1,186 @@
+"""
+Rate limiting for the credential views.
+
+Every POST to ``login_view`` or ``register_view`` first counts against a
+limit keyed by client IP and, only if that one still has room, against a
+limit keyed by the submitted email, so a flood from one address cannot use
+up a victim's email allowance. When either is used up the request is
+refused with 429 before ``authenticate()`` (or the password hasher behind
+registration) runs, so a credential-stuffing burst costs a cache round trip
+per request instead of a PBKDF2 check.
+
+The limits are counted in the shared Django cache so every worker sees the
+same counts: one counter per key and fixed window of ``period`` seconds,
+created with ``cache.add()`` and bumped with the atomic ``cache.incr()``.
+Each window admits half the limit, so even a burst straddling two windows
+stays within it.
+If the cache cannot be reached the throttle falls back to per-process
+token buckets rather than letting every request through. The outcome
+counters are exported on ``/metrics/``.
+"""
+from collections import OrderedDict
+from functools import lru_cache, wraps
+import hashlib
+import logging
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import caches
+from django.shortcuts import render
+
+from .instrumentation import register_collector
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'throttle'
+
+
+class LocalBucketStore:
+    """Per-process buckets, bounded by ``max_entries`` (LRU)."""
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+
+    def take(self, key, capacity, period):
+        now = time.monotonic()
+        with self._lock:
+            tokens, stamp = self._buckets.get(key, (capacity, None))
+            tokens, retry_after = _take(tokens, stamp, now, capacity, period)
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_entries:
+                self._buckets.popitem(last=False)
+            return retry_after
+
+
+class CacheBucketStore:
+    """
+    Fixed-window counters shared through a Django cache.
+
+    ``add()`` and ``incr()`` are atomic on the cache backends, so concurrent
+    requests never overdraw a window. A burst can straddle two windows, so
+    each admits only half of ``capacity`` (at least one): no ``period``
+    seconds ever let more than ``capacity`` through.
+    """
+
+    def __init__(self, alias='default'):
+        self.cache = caches[alias]
+
+    def take(self, key, capacity, period):
+        now = time.time()
+        window = int(now // period)
+        key = f'{key}:{window}'
+        # Once the window is over the counter carries no information.
+        timeout = math.ceil(period) + 1
+        self.cache.add(key, 0, timeout=timeout)
+        try:
+            count = self.cache.incr(key)
+        except ValueError:
+            # Evicted between add() and incr().
+            self.cache.add(key, 1, timeout=timeout)
+            count = 1
+        if count <= max(1, capacity // 2):
+            return None
+        return max(1, math.ceil((window + 1) * period - now))
+
+
+def _take(tokens, stamp, now, capacity, period):
+    """Refill for the time since ``stamp`` and take one token; returns ``(tokens, retry_after)``."""
+    rate = capacity / period
+    if stamp is not None:
+        tokens = min(capacity, tokens + (now - stamp) * rate)
+    if tokens >= 1:
+        return tokens - 1, None
+    return tokens, math.ceil((1 - tokens) / rate)
+
+
+class CredentialThrottle:
+    def __init__(self, ip_rate=None, email_rate=None, cache_alias=None, proxy_count=None):
+        self.ip_rate = ip_rate or getattr(settings, 'LOGIN_THROTTLE_IP_RATE', (30, 60))
+        self.email_rate = email_rate or getattr(settings, 'LOGIN_THROTTLE_EMAIL_RATE', (10, 300))
+        self.proxy_count = getattr(settings, 'LOGIN_THROTTLE_PROXY_COUNT', 0) if proxy_count is None else proxy_count
+        self.store = CacheBucketStore(cache_alias or getattr(settings, 'LOGIN_THROTTLE_CACHE', 'default'))
+        self.fallback = LocalBucketStore()
+        self._counter_lock = threading.Lock()
+        self.counters = {'allowed': 0, 'throttled': 0, 'fallback': 0}
+
+    def count(self, name):
+        with self._counter_lock:
+            self.counters[name] += 1
+
+    def stats(self):
+        with self._counter_lock:
+            return dict(self.counters)
+
+    def client_ip(self, request):
+        """
+        ``REMOTE_ADDR``, or with ``proxy_count`` trusted proxies in front, the
+        address the outermost of them appended to ``X-Forwarded-For``.
+        """
+        if self.proxy_count:
+            forwarded = [ip.strip() for ip in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if ip.strip()]
+            if len(forwarded) >= self.proxy_count:
+                return forwarded[-self.proxy_count]
+        return request.META.get('REMOTE_ADDR', '')
+
+    def take(self, key, rate):
+        capacity, period = rate
+        try:
+            return self.store.take(key, capacity, period)
+        except Exception:
+            logger.warning("Throttle cache unavailable, using per-process buckets", exc_info=True)
+            self.count('fallback')
+            return self.fallback.take(key, capacity, period)
+
+    def check(self, scope, request, email):
+        """Count the attempt against the IP, then the email limit; returns seconds to wait or ``None``."""
+        wait = self.take(f'{KEY_PREFIX}:{scope}:ip:{self.client_ip(request)}', self.ip_rate)
+        if wait is None and email:
+            digest = hashlib.sha256(email.strip().lower().encode()).hexdigest()
+            wait = self.take(f'{KEY_PREFIX}:{scope}:email:{digest}', self.email_rate)
+        self.count('allowed' if wait is None else 'throttled')
+        return wait
+
+
+@lru_cache(maxsize=None)
+def get_throttle():
+    return CredentialThrottle()
+
+
+@register_collector
+def throttle_metrics():
+    return [(
+        'loan_credential_throttle_requests_total', 'Throttled credential POSTs of this process by outcome.',
+        'outcome', get_throttle().stats(),
+    )]
+
+
+def throttle_credentials(scope, template_name, form_class):
+    """
+    Refuse POSTs to the wrapped view with 429 once the client IP or the
+    submitted email has used up its bucket. The refusal re-renders
+    ``template_name`` with an empty ``form_class`` and a ``Retry-After``.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'POST' or not getattr(settings, 'LOGIN_THROTTLE_ENABLED', True):
+                return view(request, *args, **kwargs)
+            throttle = get_throttle()
+            email = request.POST.get('email', '')
+            retry_after = throttle.check(scope, request, email)
+            if retry_after is None:
+                return view(request, *args, **kwargs)
+            logger.info("Throttled %s attempt from %s", scope, throttle.client_ip(request))
+            messages.error(request, f'Too many attempts. Please try again in {retry_after} seconds.')
+            response = render(request, template_name,
+                              {'form': form_class(initial={'email': email}), 'throttled': True}, status=429)
+            response['Retry-After'] = str(retry_after)
+            return response
+        return wrapper
+    return decorator
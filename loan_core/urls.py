@@ -11,4 +11,10 @@ urlpatterns = [
     path('submit-loan/', views.submit_loan_api, name='submit_loan_api'),
     path('check-application-status/', views.check_application_status, name='check_application_status'),
     path('realtime_data/', views.realtime_data, name='realtime_data'),
+    path('events/', views.loan_events, name='loan_events'),
+    path('what-if/', views.what_if_scores, name='what_if_scores'),
+    path('products/<slug:slug>/schedule/', views.product_schedule, name='product_schedule'),
+    path('internal/db-pool/', views.db_pool_status, name='db_pool_status'),
+    path('analytics/portfolio/', views.portfolio_analytics, name='portfolio_analytics'),
+    path('metrics/', views.metrics, name='metrics'),
     ]
@@ -1,35 +1,52 @@
+import asyncio
+from decimal import Decimal
+import hmac
+import json
+
+from django.conf import settings
 from django.shortcuts import render, redirect
 from django.contrib.auth import authenticate, login
-from django.http import JsonResponse
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib import messages
-from django.contrib.auth.models import User
 from django.contrib.auth.decorators import login_required
-from django.db import IntegrityError
+from django.contrib.admin.views.decorators import staff_member_required
+from django.db import IntegrityError, connections, transaction
 from django.views.decorators.csrf import csrf_exempt
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from .amortization import MAX_SCHEDULE_TERM, get_schedule
+from .caching import cached_dashboard_payload
+from .dbpool import pool_stats
+from .events import application_event, get_broker
+from .idempotency import idempotent
+from .instrumentation import render_metrics
 from .forms import CustomLoginForm, LoanApplicationForm, UserRegistrationForm
 from .models import LoanApplication
+from .products import get_product_index
+from .rollups import parse_month, portfolio_summary
+from .routers import replica_reads
+from .throttling import throttle_credentials
+from .whatif import ScenarioError, score_scenarios
 from django.views.decorators.http import require_POST
 from django.core.exceptions import ObjectDoesNotExist
+@throttle_credentials('login', 'loan_core/login.html', CustomLoginForm)
 def login_view(request):
     if request.method == 'POST':
         form = CustomLoginForm(request.POST)
         if form.is_valid():
             email = form.cleaned_data['email']
             password = form.cleaned_data['password']
-            try:
-                user_obj = User.objects.get(email=email)
-                user = authenticate(request, username=user_obj.username, password=password)
-                if user:
-                    login(request, user)
-                    return redirect('home')
-                messages.error(request, 'Invalid login credentials')
-            except User.DoesNotExist:
-                messages.error(request, 'No user found with that email address')
+            user = authenticate(request, email=email, password=password)
+            if user:
+                login(request, user)
+                return redirect('home')
+            messages.error(request, 'Invalid login credentials')
     else:
         form = CustomLoginForm()
     return render(request, 'loan_core/login.html', {'form': form})
 
+@throttle_credentials('register', 'loan_core/register.html', UserRegistrationForm)
 def register_view(request):
     if request.method == 'POST':
         form = UserRegistrationForm(request.POST)
@@ -104,44 +121,7 @@ def apply_for_loan(request):
 
     return render(request, 'loan_core/apply_for_loan.html', context)
 @login_required
-@csrf_exempt # Be cautious with csrf_exempt in production, consider csrf_protect or specific handling
-@require_POST
-def submit_loan_api(request):
-    # This view handles the AJAX POST submission of a *new* application.
-    # It should check for existing pending applications before saving.
-
-    # Check existing pending application before processing the new form
-    existing_pending = LoanApplication.objects.filter(user=request.user, status="pending").first()
-    if existing_pending:
-        return JsonResponse({
-            "status": "error",
-            "message": "You already have a pending application. Please wait for processing."
-        }, status=400) # Use 400 Bad Request for client error
-
-    form = LoanApplicationForm(request.POST)
-    if not form.is_valid():
-        # Extract all form errors into a single message string
-        error_messages = []
-        for field, errors in form.errors.items():
-            for error in errors:
-                 error_messages.append(f"{field}: {error}") # Include field name for clarity
-        message = "Form errors: " + ", ".join(error_messages) if error_messages else "Invalid form data."
-
-        return JsonResponse({
-            "status": "error",
-            "message": message
-        }, status=400) # Use 400 Bad Request for client error
-
-    # If no pending application and form is valid, save the new application
-    loan = form.save(commit=False)
-    loan.user = request.user
-    loan.status = "pending" # New applications start as pending
-    loan.save()
-
-    # Return success response
-    return JsonResponse({"status": "success", "message": "Application submitted successfully!"}) # Add message to success response
-
-@login_required
+@replica_reads
 def view_recommendations(request):
     """
     View to display loan recommendations for users with approved loan applications.
@@ -159,59 +139,10 @@ def view_recommendations(request):
             )
             return redirect('apply_for_loan')
             
-        # If approved, calculate risk score and get recommendations
-        risk_score = calculate_risk_score(loan_application)
-        recommendations = get_recommendations(risk_score)
-        
-        # For the frontend data setup - prepare the recommendation data
-        recommendation_data = []
-        
-        for i, rec in enumerate(recommendations):
-            # Add classification details based on recommendation position
-            recommendation_level = "Best Match"
-            badge_class = "badge-best"
-            rating_class = "best"
-            
-            if i == 1:
-                recommendation_level = "Good Option"
-                badge_class = "badge-good"
-                rating_class = "good"
-            elif i > 1:
-                recommendation_level = "Basic Option"
-                badge_class = "badge-basic"
-                rating_class = "basic"
-                
-            # Calculate monthly payment (simple calculation)
-            monthly_payment = (rec['amount'] * (1 + rec['interest_rate']/100)) / rec['term']
-            
-            # Create a structured recommendation object
-            recommendation = {
-                'productId': f"loan-{i+1}",
-                'productName': rec['name'],
-                'loanAmount': rec['amount'],
-                'interestRate': rec['interest_rate'],
-                'termMonths': rec['term'],
-                'monthlyPayment': monthly_payment,
-                'processingFeePercentage': 1.5,  # Example processing fee
-                'recommendationLevel': recommendation_level,
-                'badgeClass': badge_class,
-                'ratingClass': rating_class,
-                'isBestRate': i == 0,  # Best rate for first recommendation
-                'features': [
-                    "Quick approval process",
-                    "No collateral required",
-                    "Flexible repayment options",
-                    "No hidden charges"
-                ],
-                'eligibilityRequirements': [
-                    "Nigerian citizen or resident",
-                    "Aged 18 years and above",
-                    "Steady source of income",
-                    "Valid government ID"
-                ]
-            }
-            recommendation_data.append(recommendation)
-        
+        # If approved, rank catalog products for the score stored at submission
+        risk_score = loan_application.risk_score
+        recommendation_data = get_product_index().cards(risk_score)
+
         # User data for the profile section
         user_data = {
             'monthlyIncome': loan_application.monthly_income,
@@ -241,15 +172,16 @@ def view_recommendations(request):
         return redirect('apply_for_loan')
 
 @login_required
+@replica_reads
 def home(request):
     try:
         loan = LoanApplication.objects.filter(user=request.user).latest('created_at')
-        risk = calculate_risk_score(loan)
-        recs = get_recommendations(risk)
+        risk = loan.risk_score
+        best = get_product_index().best(risk)
     except LoanApplication.DoesNotExist:
         loan = None
         risk = 0
-        recs = []
+        best = None
 
     data = {
         'firstName': request.user.first_name or '',
@@ -264,27 +196,26 @@ def home(request):
         'lastLogin': request.user.last_login.strftime("%Y-%m-%dT%H:%M:%S") if request.user.last_login else '',
         'location': 'Lagos, Nigeria',
 'recommendedLoan': {
-    'amount': recs[0].get('amount', 0) if recs else 0,
-    'interestRate': recs[0].get('interest_rate', 0) if recs else 0,
-    'term': recs[0].get('term', 0) if recs else 0
+    'amount': best.max_amount if best else 0,
+    'interestRate': best.interest_rate if best else 0,
+    'term': best.term_months if best else 0
 },
         'activities': []
     }
     return render(request, 'loan_core/home.html', {'user_data': data})
 
-@login_required
-def realtime_data(request):
+async def build_realtime_data(user):
     try:
-        loan_application = LoanApplication.objects.filter(user=request.user).latest('created_at')
-        risk_score = calculate_risk_score(loan_application)
+        loan_application = await LoanApplication.objects.filter(user=user).alatest('created_at')
+        risk_score = loan_application.risk_score
     except LoanApplication.DoesNotExist:
         loan_application = None
         risk_score = 0
 
     user_data = {
-        'firstName': request.user.first_name or '',
-        'lastName': request.user.last_name or '',
-        'email': request.user.email,
+        'firstName': user.first_name or '',
+        'lastName': user.last_name or '',
+        'email': user.email,
         'loanAmount': loan_application.amount if loan_application else 0,
         'loanPurpose': loan_application.purpose if loan_application else '',
         'employmentStatus': loan_application.employment_type if loan_application else '',
@@ -292,7 +223,7 @@ def realtime_data(request):
         'creditScore': risk_score,
         'loanStatus': loan_application.status if loan_application else 'none',
         'loanApplicationDate': loan_application.created_at.strftime("%Y-%m-%d") if loan_application else '',
-        'lastLogin': request.user.last_login.strftime("%Y-%m-%dT%H:%M:%S") if request.user.last_login else '',
+        'lastLogin': user.last_login.strftime("%Y-%m-%dT%H:%M:%S") if user.last_login else '',
         'location': 'Lagos, Nigeria',
         'recommendedLoan': {
             'amount': 2500000,
@@ -301,82 +232,27 @@ def realtime_data(request):
         },
         'activities': []
     }
-    return JsonResponse(user_data)
-
-def calculate_risk_score(application):
-    if not application:
-        return 0
-
-    score = 50
-    scores = {'employed': 20, 'self-employed': 15, 'unemployed': -10, 'retired': 5}
-    score += scores.get(application.employment_type, 0)
-
-    inc = application.monthly_income or 0
-    if inc > 500000:
-        score += 15
-    elif inc > 200000:
-        score += 10
-    elif inc > 100000:
-        score += 5
-    elif inc < 50000:
-        score -= 10
-
-    amt = application.amount or 0
-    ratio = inc / amt if inc and amt else 0
-    if ratio > 5:
-        score -= 20
-    elif ratio > 3:
-        score -= 10
-    elif ratio > 1:
-        score -= 5
-    else:
-        score += 5
-
-    if application.existing_debt:
-        score -= 15
-
-    return max(1, min(100, score))
-
-def get_recommendations(risk_score):
-    if risk_score >= 80:
-        return [{
-            "name": "Personal Loan (Low Interest Rate)",
-            "amount": 5000000,
-            "interest_rate": 5,
-            "term": 36
-        }]
-    elif risk_score >= 65:
-        return [{
-            "name": "Small Business Loan",
-            "amount": 2000000,
-            "interest_rate": 10,
-            "term": 24
-        }]
-    elif risk_score >= 50:
-        return [{
-            "name": "Emergency Loan",
-            "amount": 1000000,
-            "interest_rate": 15,
-            "term": 18
-        }]
-    elif risk_score >= 35:
-        return [{
-            "name": "Micro Loan (20-25%)",
-            "amount": 500000,
-            "interest_rate": 22,
-            "term": 12
-        }]
-    else:
-        return [{
-            "name": "Basic Micro Loan",
-            "amount": 200000,
-            "interest_rate": 28,
-            "term": 6
-        }]
+    return user_data
+
+@login_required
+async def realtime_data(request):
+    # Dashboards poll this endpoint; serve the cached payload and let
+    # unchanged clients revalidate with a bodyless 304.
+    user = await request.auser()
+    payload = await cached_dashboard_payload(user, build_realtime_data)
+    last_modified = int(payload['last_modified'])
+    response = get_conditional_response(request, etag=payload['etag'], last_modified=last_modified)
+    if response is None:
+        response = HttpResponse(payload['body'], content_type='application/json')
+    response.headers['ETag'] = payload['etag']
+    response.headers['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
 
 @login_required
 @csrf_exempt
 @require_POST
+@idempotent
 def submit_loan_api(request):
     form = LoanApplicationForm(request.POST)
     if not form.is_valid():
@@ -387,28 +263,198 @@ def submit_loan_api(request):
             "message": message
         }, status=400)
 
-    # check existing pending
-    existing = LoanApplication.objects.filter(user=request.user, status="pending").first()
-    if existing:
+    loan = form.save(commit=False)
+    loan.user = request.user
+    loan.status = "pending"
+    try:
+        # one_pending_application_per_user rejects a second pending row, so
+        # concurrent submits cannot both get through.
+        with transaction.atomic():
+            loan.save()
+    except IntegrityError:
         return JsonResponse({
             "status": "error",
             "message": "You already have a pending application. Please wait for approval or rejection."
         }, status=400)
 
-    loan = form.save(commit=False)
-    loan.user = request.user
-    loan.status = "pending"
-    loan.save()
-
     return JsonResponse({"status": "success"})
 
 @login_required
-def check_application_status(request):
+@replica_reads
+async def check_application_status(request):
     """
     AJAX endpoint: has the user already got a pending loan?
     """
-    has_pending = LoanApplication.objects.filter(
-        user=request.user, status='pending'
-    ).exists()
+    user = await request.auser()
+    has_pending = await LoanApplication.objects.filter(
+        user=user, status='pending'
+    ).aexists()
     return JsonResponse({'already_applied': has_pending})
 
+
+def sse_message(event):
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+async def event_stream(subscription, initial=None, heartbeat=15):
+    """Yield SSE frames for ``subscription`` until the client goes away."""
+    try:
+        if initial is not None:
+            yield sse_message(initial)
+        while True:
+            try:
+                event = await subscription.get(heartbeat)
+            except asyncio.TimeoutError:
+                # Comment frames keep proxies from closing an idle stream.
+                yield ': heartbeat\n\n'
+                continue
+            yield sse_message(event)
+    finally:
+        # Django cancels the iterator when the client disconnects.
+        subscription.close()
+
+
+@login_required
+async def loan_events(request):
+    """
+    Server-Sent Events stream of the user's loan status changes.
+
+    Holds the connection open, so it must be served through
+    ``loan_management.asgi``.
+    """
+    user = await request.auser()
+    subscription = get_broker().subscribe(user.pk)
+    try:
+        latest = await LoanApplication.objects.filter(user=user).order_by('-created_at').afirst()
+    except Exception:
+        subscription.close()
+        raise
+    response = StreamingHttpResponse(
+        event_stream(
+            subscription,
+            initial=application_event(latest) if latest else None,
+            heartbeat=getattr(settings, 'SSE_HEARTBEAT_SECONDS', 15),
+        ),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@login_required
+@csrf_exempt
+@require_POST
+def what_if_scores(request):
+    """
+    Score a grid of amount/duration/income variations of a profile without
+    saving anything. Expects a JSON body, see ``whatif.score_scenarios``.
+    """
+    try:
+        data = json.loads(request.body)
+        if not isinstance(data, dict):
+            raise ScenarioError("Expected a JSON object.")
+        return JsonResponse(score_scenarios(data))
+    except json.JSONDecodeError:
+        return JsonResponse({"status": "error", "message": "Invalid JSON."}, status=400)
+    except ScenarioError as e:
+        return JsonResponse({"status": "error", "message": str(e)}, status=400)
+
+
+SCHEDULE_PAGE_SIZE = 24
+MAX_SCHEDULE_PAGE_SIZE = 120
+
+
+def _int_param(request, name, default, minimum, maximum):
+    try:
+        value = int(request.GET.get(name, default))
+    except ValueError:
+        raise ValueError(f"{name} must be an integer.")
+    if not minimum <= value <= maximum:
+        raise ValueError(f"{name} must be between {minimum} and {maximum}.")
+    return value
+
+
+@login_required
+def product_schedule(request, slug):
+    """
+    Paged amortization schedule for a catalog product. ``amount`` (up to
+    the product's cap) and ``term`` default to the product's own; pages hold
+    ``page_size`` months.
+    """
+    product = get_product_index().get(slug)
+    if product is None:
+        return JsonResponse({"error": "Unknown product."}, status=404)
+    try:
+        amount = Decimal(request.GET.get('amount', product.max_amount))
+        if not 0 < amount <= product.max_amount:
+            raise ValueError(f"amount must be above 0 and at most {product.max_amount}.")
+        term = _int_param(request, 'term', product.term_months, 1, MAX_SCHEDULE_TERM)
+        page_size = _int_param(request, 'page_size', SCHEDULE_PAGE_SIZE, 1, MAX_SCHEDULE_PAGE_SIZE)
+        num_pages = -(-term // page_size)
+        page = _int_param(request, 'page', 1, 1, num_pages)
+    except (ArithmeticError, ValueError) as e:
+        message = str(e) if isinstance(e, ValueError) else "amount must be a number."
+        return JsonResponse({"error": message}, status=400)
+
+    schedule = get_schedule(amount, product.interest_rate, term)
+    start = (page - 1) * page_size
+    return JsonResponse({
+        'product': product.slug,
+        'amount': schedule.amount,
+        'interestRate': product.interest_rate,
+        'term': term,
+        'monthlyPayment': schedule.payment,
+        'totalInterest': schedule.total_interest,
+        'page': page,
+        'numPages': num_pages,
+        'next': page + 1 if page < num_pages else None,
+        'rows': schedule.rows(start, start + page_size),
+    })
+
+
+@staff_member_required
+def db_pool_status(request):
+    """
+    Internal: connection pool statistics of the worker serving this request,
+    per database alias (``null`` for unpooled aliases). ``?reset=1`` also
+    resets the cumulative counters.
+    """
+    reset = request.GET.get('reset') == '1'
+    return JsonResponse({alias: pool_stats(alias, reset=reset) for alias in connections})
+
+
+@staff_member_required
+@replica_reads
+def portfolio_analytics(request):
+    """
+    Approval rates, exposure and income mix by employment type, month and
+    status, served from the portfolio rollups. Optional ``since``/``until``
+    (``YYYY-MM``, inclusive) and ``employment_type`` narrow it down.
+    """
+    employment_type = request.GET.get('employment_type') or None
+    if employment_type and employment_type not in dict(LoanApplication.EMPLOYMENT_CHOICES):
+        return JsonResponse({"error": "Unknown employment_type."}, status=400)
+    try:
+        since, until = (parse_month(request.GET[name]) if request.GET.get(name) else None
+                        for name in ('since', 'until'))
+    except ValueError:
+        return JsonResponse({"error": "since and until must look like YYYY-MM."}, status=400)
+    return JsonResponse(portfolio_summary(since, until, employment_type))
+
+
+def metrics(request):
+    """
+    This worker's request metrics in the Prometheus text format, for a
+    scraper presenting ``Authorization: Bearer <METRICS_TOKEN>`` or a staff
+    session.
+    """
+    if not getattr(settings, 'REQUEST_METRICS_ENABLED', True):
+        raise Http404
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    authorized = bool(token) and hmac.compare_digest(
+        request.headers.get('Authorization', '').encode(), f'Bearer {token}'.encode()
+    )
+    if not authorized and not (request.user.is_active and request.user.is_staff):
+        return HttpResponse("Forbidden", status=403, content_type='text/plain')
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
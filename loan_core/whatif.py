@@ -0,0 +1,136 @@
+"""
+"What-if" scenarios for the apply page.
+
+A scenario is a base applicant profile plus values or ranges for
+``monthly_income``, ``amount`` and ``duration``. The whole income x amount
+grid is scored in one ``scoring.score_grid`` call, each distinct score is
+looked up once in the product index, and monthly payments for every
+(income, amount, duration) cell come out of one ``payment_arrays`` call.
+Nothing is saved, so trying variations never touches the pending check.
+"""
+from decimal import Decimal
+
+from django.conf import settings
+import numpy as np
+
+from .amortization import MAX_SCHEDULE_TERM, payment_arrays
+from .models import LoanApplication
+from .products import get_product_index
+from .scoring import score_grid
+
+AXES = ('monthly_income', 'amount', 'duration')
+
+
+class ScenarioError(ValueError):
+    pass
+
+
+def _field_maximum(name):
+    field = LoanApplication._meta.get_field(name)
+    return Decimal(10) ** (field.max_digits - field.decimal_places) - Decimal(10) ** -field.decimal_places
+
+
+# The largest value each axis may take: what the application could store,
+# and the longest term a schedule is computed for.
+MAXIMUMS = {
+    'monthly_income': _field_maximum('monthly_income'),
+    'amount': _field_maximum('amount'),
+    'duration': MAX_SCHEDULE_TERM,
+}
+
+
+def _number(value, name, integer, maximum):
+    try:
+        number = Decimal(str(value))
+        if not number.is_finite() or number <= 0:
+            raise ScenarioError(f"{name} must be a positive number.")
+        if number > maximum:
+            raise ScenarioError(f"{name} must be at most {maximum}.")
+        if integer:
+            if number != number.to_integral_value():
+                raise ScenarioError(f"{name} must be a whole number of months.")
+            return int(number)
+        return number.quantize(Decimal('0.01'))
+    except ArithmeticError:
+        raise ScenarioError(f"{name} must be a number.")
+
+
+def parse_axis(spec, name, max_cells):
+    """
+    ``spec`` is a single value, a list of values, or
+    ``{"min": ..., "max": ..., "steps": n}`` for ``n`` evenly spaced values.
+    """
+    integer, maximum = name == 'duration', MAXIMUMS[name]
+    if isinstance(spec, dict):
+        low = _number(spec.get('min'), f'{name}.min', integer, maximum)
+        high = _number(spec.get('max'), f'{name}.max', integer, maximum)
+        try:
+            steps = int(spec.get('steps', 10))
+        except (TypeError, ValueError, OverflowError):
+            raise ScenarioError(f"{name}.steps must be an integer.")
+        if high < low or not 1 <= steps <= max_cells:
+            raise ScenarioError(f"{name} needs min <= max and 1 to {max_cells} steps.")
+        values = np.linspace(float(low), float(high), steps)
+        spec = np.rint(values).astype(int).tolist() if integer else np.round(values, 2).tolist()
+    elif not isinstance(spec, list):
+        spec = [spec]
+    elif len(spec) > max_cells:
+        raise ScenarioError(f"{name} has more than {max_cells} values.")
+    values = [_number(value, name, integer, maximum) for value in spec]
+    if not values:
+        raise ScenarioError(f"{name} needs at least one value.")
+    return list(dict.fromkeys(values))
+
+
+def score_scenarios(data, max_cells=None):
+    """Score every combination described by ``data``; raises ``ScenarioError``."""
+    max_cells = max_cells or getattr(settings, 'WHAT_IF_MAX_CELLS', 2500)
+    employment_type = data.get('employment_type')
+    if not isinstance(employment_type, str) or employment_type not in dict(LoanApplication.EMPLOYMENT_CHOICES):
+        raise ScenarioError("employment_type is not a valid choice.")
+    existing_debt = data.get('existing_debt', False)
+    if not isinstance(existing_debt, bool):
+        raise ScenarioError("existing_debt must be true or false.")
+    missing = [axis for axis in AXES if axis not in data]
+    if missing:
+        raise ScenarioError(f"Missing {', '.join(missing)}.")
+    incomes, amounts, durations = (parse_axis(data[axis], axis, max_cells) for axis in AXES)
+    cells = len(incomes) * len(amounts) * len(durations)
+    if cells > max_cells:
+        raise ScenarioError(f"The grid has {cells} cells; at most {max_cells} are allowed.")
+
+    scores = score_grid(employment_type, existing_debt, incomes, amounts)
+    index = get_product_index()
+    distinct, inverse = np.unique(scores.ravel(), return_inverse=True)
+    best = [index.best(int(score)) for score in distinct]
+    rates = np.array([product.interest_rate if product else 0 for product in best], dtype=np.float64)
+    rate_grid = rates[inverse].reshape(scores.shape)
+    payments = payment_arrays(
+        np.array(amounts, dtype=np.float64)[None, :, None],
+        rate_grid[:, :, None],
+        np.array(durations)[None, None, :],
+    )
+    payments = np.round(payments, 2).tolist()
+    products = [best[i] for i in inverse.tolist()]
+    score_list = scores.ravel().tolist()
+
+    results = []
+    for i, income in enumerate(incomes):
+        for j, amount in enumerate(amounts):
+            product = products[i * len(amounts) + j]
+            for k, duration in enumerate(durations):
+                results.append({
+                    'monthly_income': income,
+                    'amount': amount,
+                    'duration': duration,
+                    'score': score_list[i * len(amounts) + j],
+                    'product': product and product.slug,
+                    'productName': product and product.name,
+                    'monthlyPayment': payments[i][j][k] if product else None,
+                })
+    return {
+        'monthly_income': incomes,
+        'amount': amounts,
+        'duration': durations,
+        'cells': results,
+    }
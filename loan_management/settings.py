@@ -9,6 +9,7 @@ https://docs.djangoproject.com/en/5.2/topics/settings/
 For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
+import copy
 import os
 from pathlib import Path
 
@@ -40,6 +41,8 @@ INSTALLED_APPS = [
     'django.contrib.humanize',
 ]
 MIDDLEWARE = [
+    'loan_core.instrumentation.request_metrics_middleware',
+    'loan_core.profiling.RequestProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -48,13 +51,14 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'loan_core.routers.replica_pin_middleware',
 ]
 
 ROOT_URLCONF = 'loan_management.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'loan_core.instrumentation.TimedDjangoTemplates',
         'DIRS': [BASE_DIR / "templates"],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -82,9 +86,162 @@ DATABASES = {
         'PASSWORD': os.environ.get('PG_PASSWORD','oreoluwa'),
         'HOST': os.environ.get('PG_HOST',    'loan-management-backend-g77a.onrender.com'),
         'PORT': os.environ.get('PG_PORT',    '5432'),
+        # Ping a connection before handing it out (pooled or persistent).
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {},
     }
 }
 
+# Connection pooling (psycopg_pool, one pool per worker process)
+# With DB_POOL=true each worker keeps between DB_POOL_MIN_SIZE and
+# DB_POOL_MAX_SIZE connections open; requests wait up to DB_POOL_TIMEOUT
+# seconds for a free one. Connections are replaced after DB_POOL_MAX_LIFETIME
+# seconds, and idle ones above the minimum closed after DB_POOL_MAX_IDLE.
+# Without the pool, DB_CONN_MAX_AGE keeps one persistent connection per thread.
+
+if os.environ.get('DB_POOL', 'false').lower() == 'true':
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+        'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+        'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        'max_lifetime': float(os.environ.get('DB_POOL_MAX_LIFETIME', 30 * 60)),
+        'max_idle': float(os.environ.get('DB_POOL_MAX_IDLE', 5 * 60)),
+    }
+else:
+    DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('DB_CONN_MAX_AGE', 0))
+
+# Read replicas (loan_core.routers)
+# DB_REPLICA_HOSTS is a comma-separated list of hot standbys of the default
+# database. Views marked @replica_reads read from a replica lagging at most
+# DATABASE_REPLICA_MAX_LAG seconds (checked every
+# DATABASE_REPLICA_LAG_CHECK_INTERVAL seconds); after any POST the client
+# reads from the primary for DATABASE_REPLICA_STICKY_SECONDS.
+
+DATABASE_REPLICAS = []
+for index, host in enumerate(filter(None, os.environ.get('DB_REPLICA_HOSTS', '').split(',')), start=1):
+    DATABASES[f'replica{index}'] = {
+        **copy.deepcopy(DATABASES['default']),
+        'HOST': host.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{index}')
+
+DATABASE_ROUTERS = ['loan_core.routers.ReplicaRouter']
+DATABASE_REPLICA_MAX_LAG = float(os.environ.get('DATABASE_REPLICA_MAX_LAG', 2))
+DATABASE_REPLICA_LAG_CHECK_INTERVAL = float(os.environ.get('DATABASE_REPLICA_LAG_CHECK_INTERVAL', 5))
+DATABASE_REPLICA_STICKY_SECONDS = int(os.environ.get('DATABASE_REPLICA_STICKY_SECONDS', 10))
+
+# Cache
+# Local memory by default; set REDIS_URL (requires the ``redis`` package) to
+# share cached dashboard payloads across gunicorn workers.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'loan-management',
+    }
+}
+if os.environ.get('REDIS_URL'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['REDIS_URL'],
+    }
+
+# Seconds a cached /realtime_data/ payload may live before it is rebuilt.
+DASHBOARD_CACHE_TIMEOUT = int(os.environ.get('DASHBOARD_CACHE_TIMEOUT', 60))
+
+# Sessions and authenticated users
+# With a shared cache (REDIS_URL) sessions are read from the cache and
+# written through to the database (cached_db), and the user behind a session
+# is cached for USER_CACHE_TIMEOUT seconds, so an authenticated request
+# needs neither the django_session nor the auth_user query. Both stay off on
+# the per-process locmem cache, where other workers could serve a stale
+# entry; set SESSION_ENGINE / USER_CACHE_TIMEOUT to choose explicitly.
+# "manage.py purge_sessions" deletes expired sessions in batches.
+
+SESSION_ENGINE = os.environ.get('SESSION_ENGINE', 'django.contrib.sessions.backends.cached_db'
+                                if os.environ.get('REDIS_URL') else 'django.contrib.sessions.backends.db')
+USER_CACHE_TIMEOUT = int(os.environ.get('USER_CACHE_TIMEOUT', 60 if os.environ.get('REDIS_URL') else 0))
+
+# Loan events (Server-Sent Events on /events/)
+# The in-process broker only reaches streams held by the same worker; point
+# LOAN_EVENTS_BROKER at another backend to fan out across processes.
+# run_decision_worker needs both this and REDIS_URL for its decisions to
+# reach dashboards and streams served by the web workers.
+
+LOAN_EVENTS_BROKER = os.environ.get('LOAN_EVENTS_BROKER', 'loan_core.events.InProcessBroker')
+SSE_HEARTBEAT_SECONDS = int(os.environ.get('SSE_HEARTBEAT_SECONDS', 15))
+
+# Idempotency-Key replay for submit-loan/
+# LocalIdempotencyStore is per process; use the database store when several
+# workers must see each other's keys. A key is reserved while its request
+# runs (retries get 409); a reservation older than IDEMPOTENCY_LOCK_TIMEOUT
+# seconds is treated as abandoned.
+
+IDEMPOTENCY_STORE = os.environ.get('IDEMPOTENCY_STORE', 'loan_core.idempotency.LocalIdempotencyStore')
+IDEMPOTENCY_TTL = int(os.environ.get('IDEMPOTENCY_TTL', 24 * 60 * 60))
+IDEMPOTENCY_MAX_ENTRIES = int(os.environ.get('IDEMPOTENCY_MAX_ENTRIES', 10000))
+IDEMPOTENCY_LOCK_TIMEOUT = int(os.environ.get('IDEMPOTENCY_LOCK_TIMEOUT', 60))
+
+# Decision worker (manage.py run_decision_worker)
+# Queued applications scoring at least DECISION_AUTO_APPROVE_SCORE are
+# approved, those below DECISION_AUTO_REJECT_SCORE rejected, the rest stay
+# pending for manual review.
+
+DECISION_AUTO_APPROVE_SCORE = int(os.environ.get('DECISION_AUTO_APPROVE_SCORE', 80))
+DECISION_AUTO_REJECT_SCORE = int(os.environ.get('DECISION_AUTO_REJECT_SCORE', 35))
+
+AUTHENTICATION_BACKENDS = [
+    'loan_core.backends.EmailBackend',
+    'loan_core.backends.UsernameBackend',
+]
+
+# Loan product recommendations: how many ranked products to show.
+RECOMMENDATION_LIMIT = int(os.environ.get('RECOMMENDATION_LIMIT', 3))
+# Seconds a worker serves its product index before checking the catalog again.
+PRODUCT_CATALOG_CHECK_INTERVAL = float(os.environ.get('PRODUCT_CATALOG_CHECK_INTERVAL', 5))
+# Largest income x amount x duration grid one /what-if/ call may score.
+WHAT_IF_MAX_CELLS = int(os.environ.get('WHAT_IF_MAX_CELLS', 2500))
+# Amortization schedules kept per worker, keyed by (amount, rate, term).
+AMORTIZATION_CACHE_SIZE = int(os.environ.get('AMORTIZATION_CACHE_SIZE', 4096))
+
+# Login/registration throttling (loan_core.throttling)
+# Limits as (attempts, window in seconds), per client IP and per submitted
+# email, counted in the LOGIN_THROTTLE_CACHE cache; each window admits half
+# the attempts, so no span of that many seconds exceeds the limit. Set
+# LOGIN_THROTTLE_PROXY_COUNT to the number of proxies appending to
+# X-Forwarded-For (1 behind the Heroku router).
+
+LOGIN_THROTTLE_ENABLED = os.environ.get('LOGIN_THROTTLE_ENABLED', 'true').lower() == 'true'
+LOGIN_THROTTLE_IP_RATE = tuple(int(n) for n in os.environ.get('LOGIN_THROTTLE_IP_RATE', '30/60').split('/'))
+LOGIN_THROTTLE_EMAIL_RATE = tuple(int(n) for n in os.environ.get('LOGIN_THROTTLE_EMAIL_RATE', '10/300').split('/'))
+LOGIN_THROTTLE_CACHE = 'default'
+LOGIN_THROTTLE_PROXY_COUNT = int(os.environ.get('LOGIN_THROTTLE_PROXY_COUNT', 0))
+
+# Request instrumentation (loan_core.instrumentation)
+# Per-view wall, SQL and template timings, sent as Server-Timing headers and
+# collected per worker for /metrics/ (Prometheus text; scrape it with
+# "Authorization: Bearer $METRICS_TOKEN", staff sessions work too).
+# REQUEST_METRICS_ENABLED=false drops the middleware altogether;
+# SERVER_TIMING_HEADER=false keeps the metrics but hides the header.
+
+REQUEST_METRICS_ENABLED = os.environ.get('REQUEST_METRICS_ENABLED', 'true').lower() == 'true'
+SERVER_TIMING_HEADER = os.environ.get('SERVER_TIMING_HEADER', 'true').lower() == 'true'
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Request profiling (loan_core.profiling)
+# cProfile runs around a PROFILING_SAMPLE_RATE fraction of requests (0 = none)
+# and around requests sending a signed X-Debug-Profile header, minted with
+# "manage.py profiles token" and valid for PROFILING_TOKEN_MAX_AGE seconds.
+# Profiles land in PROFILING_DIR, keeping the newest PROFILING_MAX_FILES;
+# inspect them with "manage.py profiles list|summary".
+
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'true').lower() == 'true'
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', '0'))
+PROFILING_TOKEN_MAX_AGE = int(os.environ.get('PROFILING_TOKEN_MAX_AGE', '3600'))
+PROFILING_DIR = os.environ.get('PROFILING_DIR', '')
+PROFILING_MAX_FILES = int(os.environ.get('PROFILING_MAX_FILES', '200'))
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 